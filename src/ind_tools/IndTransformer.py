@@ -14,29 +14,33 @@ class IndTransformer(TrajectoryProcessor):
     def convertLocalToNorth(self,
 
             tracksDf:pd.DataFrame,
-            tracksMeta: pd.DataFrame
+            tracksMeta: pd.DataFrame,
+            inplace: bool = False
         ) -> Tuple[List[int], pd.DataFrame]:
         """ 
-        converts north-south trajectories into south-north. It does a 180 rotation on local x, y coordinates. Cannot call it repeatedly on the same dataframe
+        converts north-south trajectories into south-north. It does a 180 rotation on local x, y coordinates. Cannot call it repeatedly on the same dataframe. With inplace, tracksDf is updated instead of a copy.
         """    
         return self.baseTransformer.convertTracksToNorth(
             tracksDf, 
             xCol=self.localXCol, 
             yCol=self.localYCol, 
-            tracksMeta=tracksMeta
+            tracksMeta=tracksMeta,
+            inplace=inplace
         )
     
     def convertSceneTracksToNorth(self,
             tracksDf:pd.DataFrame,
-            tracksMeta: pd.DataFrame = None
+            tracksMeta: pd.DataFrame = None,
+            inplace: bool = False
         ) -> Tuple[List[int], pd.DataFrame]:
         """ 
-        converts north-south trajectories into south-north. It does a 180 rotation on local x, y coordinates. Cannot call it repeatedly on the same dataframe
+        converts north-south trajectories into south-north. It does a 180 rotation on local x, y coordinates. Cannot call it repeatedly on the same dataframe. With inplace, tracksDf is updated instead of a copy.
         """
         return self.baseTransformer.convertTracksToNorth(
             tracksDf, 
             xCol="sceneX", 
             yCol="sceneY", 
-            tracksMeta=tracksMeta
+            tracksMeta=tracksMeta,
+            inplace=inplace
         )
 
@@ -13,7 +13,14 @@ class ColMapper:
             localXCol='localX',
             localYCol='localY',
             verticalDirectionCol='verticalDirection',
-            horizontalDirectionCol='horizontalDirection'
+            horizontalDirectionCol='horizontalDirection',
+            frameCol='frame',
+            xAccelerationCol='xAcceleration',
+            yAccelerationCol='yAcceleration',
+            accelerationCol='acceleration',
+            jerkCol='jerk',
+            headingCol='heading',
+            yawRateCol='yawRate'
         ):
         
         self.idCol = idCol
@@ -33,4 +40,13 @@ class ColMapper:
         self.verticalDirectionCol = verticalDirectionCol
         self.horizontalDirectionCol = horizontalDirectionCol
 
+        self.frameCol = frameCol
+
+        self.xAccelerationCol = xAccelerationCol
+        self.yAccelerationCol = yAccelerationCol
+        self.accelerationCol = accelerationCol
+        self.jerkCol = jerkCol
+        self.headingCol = headingCol
+        self.yawRateCol = yawRateCol
+
         pass
\ No newline at end of file
@@ -3,8 +3,12 @@ from typing import *
 import math
 from .ColMapper import ColMapper
 from .TrajectoryProcessor import TrajectoryProcessor
+from .MappedTrackStore import MappedTrackStore
 import numpy as np
-from itertools import product
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
 # InfluenceGrid = List[List[int]]
 InfluenceGrid = np.ndarray
@@ -101,33 +105,294 @@ class InfluenceAnalyzer(TrajectoryProcessor):
         return np.zeros((w, h))        
         
 
-    def getInfluenceHeatMap(self,
+    def getDiskSpans(self, radius: int) -> List[Tuple[int, int]]:
+        """
+        The disk of the given radius as row spans: for every row offset i, the disk covers column offsets -m..m where i^2 + m^2 <= radius^2.
+        """
+        spans = []
+        for i in range(-radius, radius + 1):
+            m = int(math.sqrt(radius ** 2 - i ** 2))
+            while (m + 1) ** 2 + i ** 2 <= radius ** 2:
+                m += 1
+            while m > 0 and m ** 2 + i ** 2 > radius ** 2:
+                m -= 1
+            spans.append((i, m))
+        return spans
+
+    def getInfluenceStencils(self) -> List[Tuple[List[Tuple[int, int]], int]]:
+        """disk spans and points of every influence radius"""
+        return [
+            (self.getDiskSpans(int(k * self.unitMultiplier)), self.influencePoints[k]) 
+            for k in self.influencePoints
+        ]
+
+    def getCountGrid(self, tracksDf: pd.DataFrame, shape: Tuple[int, int], pad: int) -> np.ndarray:
+        """
+        Number of rows in every grid cell. The grid is padded by pad cells on each side so that points just outside the grid still spread their influence into it.
+        """
+        w, h = shape
+        X = tracksDf[self.localXCol].to_numpy(dtype=float)
+        Y = tracksDf[self.localYCol].to_numpy(dtype=float)
+        finite = np.isfinite(X) & np.isfinite(Y)
+
+        # same as int(), truncates towards zero
+        gridX = np.trunc(X[finite] * self.unitMultiplier).astype(np.int64) + w // 2 + pad
+        gridY = np.trunc(Y[finite] * self.unitMultiplier).astype(np.int64) + pad
+
+        paddedW = w + 2 * pad
+        paddedH = h + 2 * pad
+        inside = (gridX >= 0) & (gridX < paddedW) & (gridY >= 0) & (gridY < paddedH)
+        flat = gridX[inside] * paddedH + gridY[inside]
+        return np.bincount(flat, minlength=paddedW * paddedH).reshape(paddedW, paddedH).astype(float)
+
+    def accumulateInfluence(self, grid: InfluenceGrid, tracksDf: pd.DataFrame) -> InfluenceGrid:
+        """
+        Adds the influence of all the rows to the grid (same points as updateInfluencePoints on every row). The rows are binned into a count grid first and the counts are spread with the disk stencils, one prefix sum per disk row. Influence falling outside the grid is dropped.
+
+        Returns
+        -------
+        InfluenceGrid
+            the updated grid
+        """
+        stencils = self.getInfluenceStencils()
+        w, h = grid.shape
+        pad = max([len(spans) // 2 for spans, _ in stencils] + [0])
+
+        counts = self.getCountGrid(tracksDf, grid.shape, pad)
+        grid += self.influencePoints[0.5] * counts[pad:pad + w, pad:pad + h]
+
+        # prefix[:, k] is the sum of the first k columns
+        prefix = np.zeros((counts.shape[0], counts.shape[1] + 1))
+        np.cumsum(counts, axis=1, out=prefix[:, 1:])
+
+        for spans, point in stencils:
+            for i, m in spans:
+                rows = prefix[pad + i:pad + i + w]
+                grid += point * (rows[:, pad + m + 1:pad + m + 1 + h] - rows[:, pad - m:pad - m + h])
+        
+        return grid
+
+    def getInfluenceGrid(self,
             tracksDf: pd.DataFrame,
             size: Tuple[float, float]
-        ) -> InfluenceGrid:
+        ) -> Tuple[InfluenceGrid, np.ndarray, np.ndarray]:
+        """
+        Returns
+        -------
+        Tuple[InfluenceGrid, np.ndarray, np.ndarray]
+            the grid indexed by [x, y] and the X, Y axis coordinates in grid units
+        """
 
         grid = self.generateGrid(size)
-        for index, row in tracksDf.iterrows():
-            self.updateInfluencePoints(row, grid, self.influencePoints)
-        
+        self.accumulateInfluence(grid, tracksDf)
+
         w, h = grid.shape
-        # transform to a dataframe
         X = np.arange(-w // 2, w // 2, 1)
         Y = np.arange(0, h, 1)
-        Z = np.log([
-            grid[i+w // 2, j] for i, j in product(X, Y)
-        ])
-        Z = [
-            grid[i+w // 2, j] for i, j in product(X, Y)
-        ]
+        return grid, X, Y
+
+    def gridToHeatMap(self, grid: InfluenceGrid, X: np.ndarray, Y: np.ndarray) -> pd.DataFrame:
+        """Density with Y as the index and X as the columns"""
+        return pd.DataFrame(grid.T, index=pd.Index(Y, name="Y"), columns=pd.Index(X, name="X"))
+
+    def getInfluenceHeatMap(self,
+            tracksDf: pd.DataFrame,
+            size: Tuple[float, float]
+        ) -> pd.DataFrame:
+
+        grid, X, Y = self.getInfluenceGrid(tracksDf, size)
+        return self.gridToHeatMap(grid, X, Y)
+
+    def getInfluenceAccumulator(self,
+            size: Tuple[float, float]
+        ) -> "InfluenceAccumulator":
+        return InfluenceAccumulator(self, size)
+
+    def accumulateRecordings(self,
+            recordings: Dict[str, Union[pd.DataFrame, str, MappedTrackStore]],
+            size: Tuple[float, float],
+            nJobs: int = 1,
+            checkpointDir: str = None,
+            chunkSize: int = None
+        ) -> "InfluenceAccumulator":
+        """
+        Builds one partial grid per recording, on a process pool if nJobs > 1, and merges them by summing.
+
+        Parameters
+        ----------
+        recordings : Dict[str, Union[pd.DataFrame, str]]
+            tracks of every recording by a recording key, either as a dataframe, a csv path or a MappedTrackStore. Csv files and mapped stores are read in chunks of chunkSize rows.
+        size : Tuple[float, float]
+            The size of the grid in meter, meter
+        nJobs : int
+            number of worker processes. The workers run serially whatever the nJobs of the analyzer.
+        checkpointDir : str
+            partial grids are saved here, one npz per key. Recordings with a saved partial grid built with the same size and influence settings are not processed again, so a long job can resume. Checkpoints of other settings are rebuilt and overwritten.
+        chunkSize : int
+            rows per chunk when reading csv files
+
+        Returns
+        -------
+        InfluenceAccumulator
+            the merged grid
+        """
+        total = self.getInfluenceAccumulator(size)
+        pending = []
+        for key, recording in recordings.items():
+            checkpoint = InfluenceAccumulator.getCheckpointPath(checkpointDir, key)
+            partial = None
+            if checkpoint is not None and os.path.exists(checkpoint):
+                partial = InfluenceAccumulator.loadCheckpoint(self, checkpoint, key, size)
+            if partial is not None:
+                total.merge(partial)
+            else:
+                pending.append((key, recording))
+
+        worker = self.getSerialCopy() if nJobs > 1 else self
+        jobArgs = [(worker, size, key, recording, checkpointDir, chunkSize) for key, recording in pending]
+        if nJobs > 1 and len(jobArgs) > 1:
+            with ProcessPoolExecutor(max_workers=nJobs) as executor:
+                partials = list(executor.map(_accumulateRecording, *zip(*jobArgs)))
+        else:
+            partials = [_accumulateRecording(*args) for args in jobArgs]
+
+        for partial in partials:
+            total.merge(partial)
+        return total
+
+
+class InfluenceAccumulator:
+    """
+    A partial influence grid. Tracks can be ingested in chunks as rows are independent, partial grids built in other processes are merged by summing, and a partial grid can be saved to disk and loaded to resume.
+    """
+
+    def __init__(self,
+            analyzer: InfluenceAnalyzer,
+            size: Tuple[float, float]
+        ):
+        self.analyzer = analyzer
+        self.size = size
+        self.grid = analyzer.generateGrid(size)
+        self.numRows = 0
+        self.keys = set()
+
+    def ingest(self, tracksDf: pd.DataFrame, key: str = None) -> "InfluenceAccumulator":
+        self.analyzer.accumulateInfluence(self.grid, tracksDf)
+        self.numRows += len(tracksDf)
+        if key is not None:
+            self.keys.add(key)
+        return self
+
+    def merge(self, other: "InfluenceAccumulator") -> "InfluenceAccumulator":
+        if self.grid.shape != other.grid.shape:
+            raise ValueError(f"cannot merge grids of shape {self.grid.shape} and {other.grid.shape}")
+        overlap = self.keys & other.keys
+        if len(overlap) > 0:
+            raise ValueError(f"recordings {sorted(overlap)} are already in the grid")
+
+        self.grid += other.grid
+        self.numRows += other.numRows
+        self.keys |= other.keys
+        return self
+
+    def toGrid(self) -> Tuple[InfluenceGrid, np.ndarray, np.ndarray]:
+        w, h = self.grid.shape
+        return self.grid, np.arange(-w // 2, w // 2, 1), np.arange(0, h, 1)
+
+    def toHeatMap(self) -> pd.DataFrame:
+        return self.analyzer.gridToHeatMap(*self.toGrid())
+
+    def save(self, path: str):
+        """Saves the grid with the influence settings of the analyzer. The file is written next to its final path and renamed, so an interrupted save never leaves a broken checkpoint behind."""
+        tmpPath = f"{path}.tmp"
+        with open(tmpPath, "wb") as f:
+            np.savez(
+                f,
+                grid=self.grid,
+                size=np.asarray(self.size, dtype=float),
+                numRows=self.numRows,
+                keys=np.asarray(sorted(self.keys), dtype=str),
+                influencePoints=self.getInfluenceSettings(self.analyzer),
+                unitMultiplier=self.analyzer.unitMultiplier
+            )
+        os.replace(tmpPath, path)
+
+    @staticmethod
+    def getInfluenceSettings(analyzer: InfluenceAnalyzer) -> np.ndarray:
+        """(radius, points) rows of the influence points of the analyzer"""
+        return np.asarray(sorted(analyzer.influencePoints.items()), dtype=float).reshape(-1, 2)
+
+    @staticmethod
+    def load(analyzer: InfluenceAnalyzer, path: str) -> "InfluenceAccumulator":
+        """Loads a saved grid. Raises ValueError if it was built with other influence settings than the analyzer's."""
+        with np.load(path) as data:
+            if "unitMultiplier" not in data or "influencePoints" not in data:
+                raise ValueError(f"{path} has no influence settings")
+            if float(data["unitMultiplier"]) != float(analyzer.unitMultiplier):
+                raise ValueError(f"{path} was built with unitMultiplier {data['unitMultiplier']}, the analyzer has {analyzer.unitMultiplier}")
+            if not np.array_equal(data["influencePoints"], InfluenceAccumulator.getInfluenceSettings(analyzer)):
+                raise ValueError(f"{path} was built with other influence points")
+            accumulator = InfluenceAccumulator(analyzer, tuple(data["size"]))
+            if accumulator.grid.shape != data["grid"].shape:
+                raise ValueError(f"{path} was built with a different grid resolution")
+            accumulator.grid += data["grid"]
+            accumulator.numRows = int(data["numRows"])
+            accumulator.keys = set(data["keys"].tolist())
+        return accumulator
+
+    @staticmethod
+    def loadCheckpoint(
+            analyzer: InfluenceAnalyzer,
+            path: str,
+            key: str,
+            size: Tuple[float, float]
+        ) -> Optional["InfluenceAccumulator"]:
+        """the checkpoint of the key, None if it was built for another key, size or influence settings"""
+        try:
+            accumulator = InfluenceAccumulator.load(analyzer, path)
+        except ValueError:
+            return None
+        if accumulator.keys != {str(key)} or not np.allclose(accumulator.size, size):
+            return None
+        return accumulator
+
+    @staticmethod
+    def getCheckpointPath(checkpointDir: str, key: str) -> Optional[str]:
+        """a readable prefix of the key and a hash of it, so keys that only differ in special characters get different files"""
+        if checkpointDir is None:
+            return None
+        safeKey = re.sub(r"[^A-Za-z0-9_.-]", "_", str(key))[:64]
+        digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(checkpointDir, f"{safeKey}-{digest}.npz")
+
 
-        df1 = pd.DataFrame(list(product(X, Y)), columns=["X", "Y"])
-        dfz = pd.DataFrame(Z, columns=["Density"])
-        df2 = pd.concat([
-                    df1,
-                    dfz
-                ], axis=1)
-        dfH = df2.pivot("Y", "X", "Density")
+def _accumulateRecording(
+        analyzer: InfluenceAnalyzer,
+        size: Tuple[float, float],
+        key: str,
+        recording: Union[pd.DataFrame, str, MappedTrackStore],
+        checkpointDir: str,
+        chunkSize: int
+    ) -> InfluenceAccumulator:
+    """worker of InfluenceAnalyzer.accumulateRecordings"""
 
-        return dfH
+    accumulator = analyzer.getInfluenceAccumulator(size)
+    usecols = [analyzer.localXCol, analyzer.localYCol]
+    if isinstance(recording, pd.DataFrame):
+        accumulator.ingest(recording)
+    elif isinstance(recording, MappedTrackStore):
+        for chunk in recording.iterChunks(usecols, 1_000_000 if chunkSize is None else chunkSize):
+            accumulator.ingest(chunk)
+    else:
+        if chunkSize is None:
+            accumulator.ingest(pd.read_csv(recording, usecols=usecols))
+        else:
+            for chunk in pd.read_csv(recording, usecols=usecols, chunksize=chunkSize):
+                accumulator.ingest(chunk)
+    accumulator.keys.add(str(key))
 
+    checkpoint = InfluenceAccumulator.getCheckpointPath(checkpointDir, key)
+    if checkpoint is not None:
+        os.makedirs(checkpointDir, exist_ok=True)
+        accumulator.save(checkpoint)
+    return accumulator
@@ -0,0 +1,116 @@
+import pandas as pd
+import numpy as np
+from typing import *
+from shapely.geometry import box
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+from .ColMapper import ColMapper
+from .TrackStore import TrackStore
+from .TrajectoryProcessor import TrajectoryProcessor
+from .TrajectoryUtils import TrajectoryUtils
+
+class InteractionFinder(TrajectoryProcessor):
+    """Finds pairs of tracks whose paths meet, e.g., pedestrian-vehicle interactions. It is TrajectoryUtils.doPathsIntersect and minPathDistance for all the pairs at once: the spline of every track is built once, pairs are pruned by lifetime overlap and by an STRtree bounding box query, and only the surviving pairs get the exact tests.
+    """
+
+    def __init__(self,
+            colMapper: ColMapper
+        ):
+
+        super().__init__(colMapper)
+
+
+    def getLifeTimes(self,
+            tracksDf: Union[pd.DataFrame, TrackStore]
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ids, initial frames and final frames of the tracks"""
+        store = self.getTrackStore(tracksDf)
+        return store.ids, store.first(self.frameCol), store.last(self.frameCol)
+
+
+    def getCandidatePairs(self,
+            splines1: pd.Series,
+            splines2: pd.Series,
+            maxDistance: float = 0
+        ) -> Tuple[np.ndarray, np.ndarray]:
+        """(position in splines1, position in splines2) of the pairs whose bounding boxes are within maxDistance"""
+        tree = STRtree(list(splines2.values))
+        if maxDistance > 0:
+            queries = [box(*spline.buffer(maxDistance).bounds) for spline in splines1.values]
+        else:
+            queries = list(splines1.values)
+        return TrajectoryUtils.queryTree(tree, queries)
+
+
+    def getPathInteractions(self,
+            tracksDf: Union[pd.DataFrame, TrackStore],
+            otherDf: Union[pd.DataFrame, TrackStore] = None,
+            xCol: str = None,
+            yCol: str = None,
+            maxDistance: float = 0,
+            minLen: float = 1,
+            timeOverlap: bool = True,
+        ) -> pd.DataFrame:
+        """Pairs of tracks whose paths intersect or are within maxDistance.
+
+        Args:
+            tracksDf (Union[pd.DataFrame, TrackStore]): multiple tracks, e.g., pedestrians
+            otherDf (Union[pd.DataFrame, TrackStore], optional): tracks to pair with, e.g., vehicles. Pairs are taken within tracksDf if None. Defaults to None.
+            xCol (str, optional): Defaults to the mapped xCol.
+            yCol (str, optional): Defaults to the mapped yCol.
+            maxDistance (float, optional): pairs with a path distance above this are dropped. 0 keeps intersecting paths only. Defaults to 0.
+            minLen (float, optional): minimum spline size. Defaults to 1 (same as doPathsIntersect).
+            timeOverlap (bool, optional): drops pairs that are not in the scene at the same time (initialFrame to finalFrame). Defaults to True.
+
+        Returns:
+            pd.DataFrame: one row per pair with trackId1 (from tracksDf), trackId2, overlapStart, overlapEnd (frames, overlapStart > overlapEnd when the lifetimes do not overlap), intersects and distance
+        """
+        xCol = self.xCol if xCol is None else xCol
+        yCol = self.yCol if yCol is None else yCol
+        samePool = otherDf is None
+
+        store1 = self.getTrackStore(tracksDf)
+        store2 = store1 if samePool else self.getTrackStore(otherDf)
+
+        splines1 = TrajectoryUtils.dfToSplinesForAll(store1.df, self.idCol, xCol, yCol, minLen)
+        splines2 = splines1 if samePool else TrajectoryUtils.dfToSplinesForAll(store2.df, self.idCol, xCol, yCol, minLen)
+        ids1, initialFrames1, finalFrames1 = self.getLifeTimes(store1)
+        ids2, initialFrames2, finalFrames2 = self.getLifeTimes(store2)
+
+        idx1, idx2 = self.getCandidatePairs(splines1, splines2, maxDistance)
+
+        if samePool: # each unordered pair once, no track with itself
+            keep = idx1 < idx2
+            idx1 = idx1[keep]
+            idx2 = idx2[keep]
+
+        overlapStarts = np.maximum(initialFrames1[idx1], initialFrames2[idx2])
+        overlapEnds = np.minimum(finalFrames1[idx1], finalFrames2[idx2])
+        if timeOverlap:
+            keep = overlapStarts <= overlapEnds
+            idx1 = idx1[keep]
+            idx2 = idx2[keep]
+            overlapStarts = overlapStarts[keep]
+            overlapEnds = overlapEnds[keep]
+
+        # exact tests on the survivors only
+        prepared = {}
+        intersects = np.empty(len(idx1), dtype=bool)
+        distances = np.empty(len(idx1), dtype=float)
+        for k, (i, j) in enumerate(zip(idx1, idx2)):
+            if i not in prepared:
+                prepared[i] = prep(splines1.iat[i])
+            intersects[k] = prepared[i].intersects(splines2.iat[j])
+            distances[k] = 0 if intersects[k] else splines1.iat[i].distance(splines2.iat[j])
+
+        keep = distances <= maxDistance
+        order = np.lexsort((idx2[keep], idx1[keep]))
+
+        return pd.DataFrame({
+            "trackId1": ids1[idx1[keep]][order],
+            "trackId2": ids2[idx2[keep]][order],
+            "overlapStart": overlapStarts[keep][order],
+            "overlapEnd": overlapEnds[keep][order],
+            "intersects": intersects[keep][order],
+            "distance": distances[keep][order],
+        })
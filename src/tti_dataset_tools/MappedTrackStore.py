@@ -0,0 +1,288 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import *
+from .TrackStore import TrackStore
+from .TrajectoryUtils import TrajectoryUtils
+
+
+class MappedTrackStore:
+    """Tracks stored on disk, one memory-mapped array per column, with the start and end offset of every track. Rows of a track are contiguous and ordered by frame, same as TrackStore.
+
+    Nothing is read until it is touched: a track or a chunk of tracks is paged in as a DataFrame (or a TrackStore for the TrajectoryProcessors), and results are written back as new mapped columns. So datasets larger than the memory can be built recording by recording with append and processed chunk by chunk.
+
+    Only numeric and bool columns are mapped. The track id column is rebuilt from the offset table; ids keep their dtype (numbers or strings).
+    """
+
+    metaFile = "meta.json"
+
+    def __init__(self,
+            directory: str,
+            mode: str = "r+"
+        ):
+        """Opens a store created by MappedTrackStore.create.
+
+        Args:
+            directory (str): directory of the store, with meta.json, the id and size tables and one .bin file per column
+            mode (str, optional): "r" for read only, "r+" to write columns. Defaults to "r+".
+        """
+        self.directory = directory
+        self.mode = mode
+        with open(os.path.join(directory, self.metaFile)) as f:
+            meta = json.load(f)
+
+        self.idCol = meta["idCol"]
+        self.frameCol = meta["frameCol"]
+        self.dtypes = {col: np.dtype(dtype) for col, dtype in meta["dtypes"].items()}
+        self.ids = self._loadIds(os.path.join(directory, "ids.npy"))
+        self.sizes = np.load(os.path.join(directory, "sizes.npy"))
+        self.ends = np.cumsum(self.sizes)
+        self.starts = self.ends - self.sizes
+        self._positions = {trackId: i for i, trackId in enumerate(self.ids)}
+        self._columns = {}
+
+    def __getstate__(self):
+        # maps are reopened on use, pickling them would copy the data to the other process
+        state = self.__dict__.copy()
+        state["_columns"] = {}
+        return state
+
+    @staticmethod
+    def create(
+            directory: str,
+            idCol: str,
+            frameCol: str = None,
+            idDtype = None
+        ) -> "MappedTrackStore":
+        """Creates an empty store. Tracks are added with append.
+
+        Args:
+            directory (str): created if missing, must not have a store yet
+            idCol (str): track id column
+            frameCol (str, optional): rows of a track are ordered by this column. Defaults to None.
+            idDtype (optional): dtype of the ids of the empty store, e.g., np.int64. The first append sets it to the dtype of its ids. Defaults to object.
+        """
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, MappedTrackStore.metaFile)):
+            raise FileExistsError(f"{directory} already has a store")
+
+        MappedTrackStore._saveIds(os.path.join(directory, "ids.npy"), np.empty(0, dtype=object if idDtype is None else idDtype))
+        np.save(os.path.join(directory, "sizes.npy"), np.empty(0, dtype=np.int64))
+        MappedTrackStore._writeMeta(directory, idCol, frameCol, {})
+        return MappedTrackStore(directory)
+
+    @staticmethod
+    def fromDfs(
+            directory: str,
+            dfs: Iterable[pd.DataFrame],
+            idCol: str,
+            frameCol: str = None,
+            columns: List[str] = None
+        ) -> "MappedTrackStore":
+        """Creates a store from tracks tables read one at a time, e.g., one per recording or site"""
+        store = MappedTrackStore.create(directory, idCol, frameCol)
+        for tracksDf in dfs:
+            store.append(tracksDf, columns)
+        return store
+
+    @staticmethod
+    def _writeMeta(directory: str, idCol: str, frameCol: Optional[str], dtypes: Dict[str, np.dtype]):
+        with open(os.path.join(directory, MappedTrackStore.metaFile), "w") as f:
+            json.dump({
+                "idCol": idCol,
+                "frameCol": frameCol,
+                "dtypes": {col: np.dtype(dtype).str for col, dtype in dtypes.items()}
+            }, f, indent=2)
+
+    @staticmethod
+    def _saveIds(path: str, ids: np.ndarray):
+        """numeric ids as they are, string ids as a fixed width unicode array, so loading needs no pickle"""
+        if ids.dtype == object: # strings, checked by append
+            ids = np.asarray(ids, dtype=str) if len(ids) > 0 else np.empty(0, dtype="<U1")
+        np.save(path, ids, allow_pickle=False)
+
+    @staticmethod
+    def _loadIds(path: str) -> np.ndarray:
+        ids = np.load(path, allow_pickle=False)
+        if ids.dtype.kind == "U":
+            return ids.astype(object) # same as the ids of a TrackStore of a string id column
+        return ids
+
+    def _saveMeta(self):
+        self._writeMeta(self.directory, self.idCol, self.frameCol, self.dtypes)
+        self._saveIds(os.path.join(self.directory, "ids.npy"), self.ids)
+        np.save(os.path.join(self.directory, "sizes.npy"), self.sizes)
+
+    def _getColumnPath(self, col: str) -> str:
+        return os.path.join(self.directory, f"{col}.bin")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, trackId) -> bool:
+        return trackId in self._positions
+
+    def numRows(self) -> int:
+        return int(self.sizes.sum())
+
+    @property
+    def columns(self) -> List[str]:
+        """mapped columns, without the id column"""
+        return list(self.dtypes.keys())
+
+    def append(self, tracksDf: pd.DataFrame, columns: List[str] = None) -> "MappedTrackStore":
+        """Adds the tracks of a table at the end of the store. Every track must be complete in the table and not in the store yet.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            columns (List[str], optional): columns to store. The store columns if it has any, otherwise all numeric and bool columns. Defaults to None.
+        """
+        if columns is None:
+            columns = self.columns if len(self.dtypes) > 0 else [
+                col for col in tracksDf.columns
+                if col != self.idCol and (pd.api.types.is_numeric_dtype(tracksDf[col]) or pd.api.types.is_bool_dtype(tracksDf[col]))
+            ]
+        if len(self.dtypes) > 0 and set(columns) != set(self.columns):
+            raise ValueError(f"the store has columns {self.columns}, got {columns}")
+
+        store = TrackStore(tracksDf, self.idCol, self.frameCol)
+        if store.ids.dtype == object and not all(isinstance(trackId, str) for trackId in store.ids):
+            raise TypeError("track ids must be numbers or strings")
+        if len(self.ids) > 0 and len(store.ids) > 0 and (self.ids.dtype == object) != (store.ids.dtype == object):
+            raise TypeError(f"the store has ids of dtype {self.ids.dtype}, got {store.ids.dtype}")
+        duplicates = [trackId for trackId in store.ids if trackId in self._positions]
+        if len(duplicates) > 0:
+            raise ValueError(f"tracks {duplicates[:10]} are already in the store")
+
+        for col in columns:
+            values = store.column(col)
+            dtype = self.dtypes.get(col, values.dtype)
+            with open(self._getColumnPath(col), "ab") as f:
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            self.dtypes[col] = np.dtype(dtype)
+
+        self.ids = np.concatenate((self.ids, store.ids)) if len(self.ids) > 0 else store.ids
+        self.sizes = np.concatenate((self.sizes, store.sizes)).astype(np.int64)
+        self.ends = np.cumsum(self.sizes)
+        self.starts = self.ends - self.sizes
+        for trackId in store.ids:
+            self._positions[trackId] = len(self._positions)
+
+        self._columns = {} # maps have a new length
+        self._saveMeta()
+        return self
+
+    def column(self, col: str) -> np.memmap:
+        """the mapped column. Nothing is read until it is indexed."""
+        if col not in self.dtypes:
+            raise KeyError(f"{col} is not in the store")
+        if col not in self._columns:
+            numRows = self.numRows()
+            if numRows == 0:
+                return np.empty(0, dtype=self.dtypes[col])
+            self._columns[col] = np.memmap(self._getColumnPath(col), dtype=self.dtypes[col], mode=self.mode, shape=(numRows,))
+        return self._columns[col]
+
+    def addColumn(self, col: str, dtype=float, fill=np.nan) -> np.memmap:
+        """Creates a new mapped column filled with fill and returns it for writing"""
+        if self.mode == "r":
+            raise ValueError("the store is opened read only")
+        if col in self.dtypes:
+            raise ValueError(f"{col} is already in the store")
+
+        numRows = self.numRows()
+        if numRows == 0:
+            open(self._getColumnPath(col), "wb").close()
+        else:
+            values = np.memmap(self._getColumnPath(col), dtype=dtype, mode="w+", shape=(numRows,))
+            values[:] = fill
+            values.flush()
+        self.dtypes[col] = np.dtype(dtype)
+        self._saveMeta()
+        self._columns.pop(col, None)
+        return self.column(col)
+
+    def getTrackPositions(self, trackIds: Iterable) -> np.ndarray:
+        """positions in the offset table of the tracks, in the order of trackIds"""
+        return np.asarray([self._positions[trackId] for trackId in trackIds], dtype=np.int64)
+
+    def getRows(self, positions: np.ndarray) -> np.ndarray:
+        """row numbers of the tracks at the positions, track after track"""
+        positions = np.asarray(positions, dtype=np.int64)
+        return TrajectoryUtils.expandRanges(self.starts[positions], self.ends[positions])
+
+    def getTracksAt(self, positions: np.ndarray, columns: List[str] = None) -> pd.DataFrame:
+        """pages in the tracks at the positions as one table. The index is the row number in the store."""
+        columns = self.columns if columns is None else [col for col in columns if col != self.idCol]
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) > 0 and np.all(np.diff(positions) == 1):
+            rows = slice(self.starts[positions[0]], self.ends[positions[-1]]) # one contiguous read
+            index = pd.RangeIndex(rows.start, rows.stop)
+        else:
+            rows = self.getRows(positions)
+            index = pd.Index(rows)
+
+        data = {self.idCol: np.repeat(self.ids[positions], self.sizes[positions])}
+        for col in columns:
+            data[col] = np.asarray(self.column(col)[rows])
+        return pd.DataFrame(data, index=index)
+
+    def getTracks(self, trackIds: Iterable, columns: List[str] = None) -> pd.DataFrame:
+        """pages in the tracks in the order of trackIds, see getTracksAt"""
+        return self.getTracksAt(self.getTrackPositions(trackIds), columns)
+
+    def getTrack(self, trackId, columns: List[str] = None) -> pd.DataFrame:
+        """pages in one track, ordered by frame"""
+        return self.getTracksAt([self._positions[trackId]], columns)
+
+    def getTrackStore(self, trackIds: Iterable = None, columns: List[str] = None) -> TrackStore:
+        """pages in the tracks (all if None) as a TrackStore, which TrajectoryProcessors take in place of a DataFrame"""
+        positions = np.arange(len(self)) if trackIds is None else self.getTrackPositions(trackIds)
+        return TrackStore(self.getTracksAt(positions, columns), self.idCol, self.frameCol)
+
+    def iterChunks(self, columns: List[str] = None, maxRows: int = 1_000_000) -> Iterator[pd.DataFrame]:
+        """Yields consecutive whole tracks, about maxRows rows at a time. A track longer than maxRows is a chunk by itself."""
+        chunkStart = 0
+        while chunkStart < len(self):
+            # last track that ends within maxRows of the chunk start, at least one track
+            chunkEnd = np.searchsorted(self.ends, self.starts[chunkStart] + maxRows, side="right")
+            chunkEnd = max(chunkEnd, chunkStart + 1)
+            yield self.getTracksAt(np.arange(chunkStart, chunkEnd), columns)
+            chunkStart = chunkEnd
+
+    def writeColumn(self, col: str, rows: Union[np.ndarray, pd.Index], values: np.ndarray, dtype=float):
+        """Writes values at the store rows (e.g., the index of a paged in chunk), creating the column if needed"""
+        if col not in self.dtypes:
+            self.addColumn(col, dtype)
+        self.column(col)[np.asarray(rows)] = values
+
+    def apply(self,
+            func: Callable[[pd.DataFrame], pd.DataFrame],
+            outputCols: List[str],
+            columns: List[str] = None,
+            maxRows: int = 1_000_000
+        ) -> "MappedTrackStore":
+        """Runs func chunk by chunk and writes its output columns back as mapped columns. func gets whole tracks and must return a table with the same index, e.g., a TrajectoryTransformer method that adds columns in place.
+
+        Args:
+            func (Callable[[pd.DataFrame], pd.DataFrame]): gets a chunk of whole tracks indexed by store row. Returns a table with the output columns or None if it adds them to the chunk in place.
+            outputCols (List[str]): columns of the func result to store
+            columns (List[str], optional): columns to page in. All if None. Defaults to None.
+            maxRows (int, optional): rows per chunk. Defaults to 1_000_000.
+        """
+        for chunk in self.iterChunks(columns, maxRows):
+            result = func(chunk)
+            if result is None: # in place
+                result = chunk
+            for col in outputCols:
+                values = result[col].to_numpy()
+                dtype = values.dtype if pd.api.types.is_numeric_dtype(values.dtype) or values.dtype == bool else float
+                self.writeColumn(col, result.index, values, dtype)
+        self.flush()
+        return self
+
+    def flush(self):
+        """writes the changes of the mapped columns to disk"""
+        for values in self._columns.values():
+            values.flush()
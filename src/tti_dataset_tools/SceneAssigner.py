@@ -0,0 +1,99 @@
+import pandas as pd
+import numpy as np
+from typing import *
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+from .ColMapper import ColMapper
+from .TrajectoryProcessor import TrajectoryProcessor
+from .TrajectoryUtils import TrajectoryUtils
+
+class SceneAssigner(TrajectoryProcessor):
+    """Assigns tracks to the scenes their splines intersect. Scene polygons are built once and indexed in an STRtree, so a track is only tested against the scenes near it.
+    """
+
+    def __init__(self,
+            colMapper: ColMapper,
+            sceneConfigs: Dict[Any, Dict[str, float]],
+            boxWidth: float,
+            boxHeight: float
+        ):
+        """
+        Args:
+            colMapper (ColMapper): column names of the tracks
+            sceneConfigs (Dict[Any, Dict[str, float]]): scene config by scene id. Each config has centerX, centerY, angle and roadWidth.
+            boxWidth (float): width of the scene rectangle
+            boxHeight (float): height of the scene rectangle
+        """
+        
+        super().__init__(colMapper)
+
+        self.sceneIds = list(sceneConfigs.keys())
+        self.roadWidths = np.asarray([sceneConfigs[sceneId]["roadWidth"] for sceneId in self.sceneIds])
+        self.scenePolygons = [
+            TrajectoryUtils.scenePolygon(sceneConfigs[sceneId], boxWidth, boxHeight) 
+            for sceneId in self.sceneIds
+        ]
+        self.preparedPolygons = [prep(polygon) for polygon in self.scenePolygons]
+        self.tree = STRtree(self.scenePolygons)
+
+
+    def getSceneMapping(self,
+            tracksDf: pd.DataFrame,
+            xCol: str = None,
+            yCol: str = None,
+            minLen: float = 1
+        ) -> pd.DataFrame:
+        """Same test as TrajectoryUtils.getDfIfDfIntersect for every (scene, track) pair, but splines are built once and only the candidates from the tree are tested.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            xCol (str, optional): Defaults to the mapped xCol.
+            yCol (str, optional): Defaults to the mapped yCol.
+            minLen (float, optional): minimum spline size. Defaults to 1.
+
+        Returns:
+            pd.DataFrame: one row per intersecting (track, scene) with idCol, sceneId and roadWidth columns, ordered by scene
+        """
+        xCol = self.xCol if xCol is None else xCol
+        yCol = self.yCol if yCol is None else yCol
+
+        splines = TrajectoryUtils.dfToSplinesForAll(tracksDf, self.idCol, xCol, yCol, minLen)
+        trackIdx, sceneIdx = TrajectoryUtils.queryTree(self.tree, list(splines.values))
+
+        hits = np.asarray([
+            self.preparedPolygons[j].intersects(splines.iat[i]) 
+            for i, j in zip(trackIdx, sceneIdx)
+        ], dtype=bool)
+        trackIdx = trackIdx[hits]
+        sceneIdx = sceneIdx[hits]
+
+        byScene = np.lexsort((trackIdx, sceneIdx))
+        trackIdx = trackIdx[byScene]
+        sceneIdx = sceneIdx[byScene]
+
+        return pd.DataFrame({
+            self.idCol: splines.index.to_numpy()[trackIdx],
+            "sceneId": pd.Index(self.sceneIds).take(sceneIdx),
+            "roadWidth": self.roadWidths[sceneIdx]
+        })
+    
+
+    def assign(self,
+            tracksDf: pd.DataFrame,
+            xCol: str = None,
+            yCol: str = None,
+            minLen: float = 1,
+            mapping: pd.DataFrame = None
+        ) -> pd.DataFrame:
+        """Joins the scene mapping back to the tracks. A track in several scenes has its rows repeated for each scene, like concatenating getDfIfDfIntersect results.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            mapping (pd.DataFrame, optional): result of getSceneMapping. Built if not given.
+
+        Returns:
+            pd.DataFrame: rows of the tracks in any scene with sceneId and roadWidth
+        """
+        if mapping is None:
+            mapping = self.getSceneMapping(tracksDf, xCol, yCol, minLen)
+        return tracksDf.merge(mapping, on=self.idCol, how="inner")
@@ -0,0 +1,299 @@
+import numpy as np
+import pandas as pd
+from typing import *
+from concurrent.futures import ProcessPoolExecutor
+from .TrackStore import TrackStore
+from .TrackParallel import getTrackChunks
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # python < 3.8
+    shared_memory = None
+
+
+class SharedTrackTable:
+    """Columns of a tracks table published as shared memory blocks, with the track offset table, so worker processes read them as NumPy views instead of getting a pickled copy of the frame.
+
+    Rows are grouped by track and ordered by frame, same as TrackStore. Results come back through output columns allocated in shared memory before the jobs start: every job writes the rows of its own tracks and the owner copies them back in the original row order.
+
+        with SharedTrackTable.publish(tracksDf, idCol, [xCol, yCol], frameCol) as table:
+            table.addOutput("speed")
+            table.map(computeSpeed, nJobs=8) # computeSpeed(table, firstTrack, lastTrack) is a module level function
+            table.collectOutputs(tracksDf)
+
+    The process that publishes the table owns the blocks and frees them on close (or at the end of the with block). Requires python >= 3.8.
+    """
+
+    def __init__(self,
+            spec: Dict[str, Any],
+            isOwner: bool = False
+        ):
+        """Use publish to create a table and attach to open one in a worker"""
+        if shared_memory is None:
+            raise ImportError("SharedTrackTable needs multiprocessing.shared_memory (python >= 3.8)")
+
+        self.spec = spec
+        self.isOwner = isOwner
+        self.idCol = spec["idCol"]
+        self.frameCol = spec["frameCol"]
+        self.order = None # position in the original frame of every row, only known to the owner
+
+        self._blocks: Dict[str, "shared_memory.SharedMemory"] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        for name, (blockName, dtype, shape) in spec["arrays"].items():
+            self._attachArray(name, blockName, dtype, shape)
+        self._setTrackTable()
+
+    def _setTrackTable(self):
+        self.starts = self._arrays.get("__starts__")
+        self.ends = self._arrays.get("__ends__")
+        self.ids = self._arrays["__ids__"] if "__ids__" in self._arrays else np.asarray(self.spec["ids"], dtype=object)
+
+    @staticmethod
+    def publish(
+            tracksDf: pd.DataFrame,
+            idCol: str,
+            columns: List[str] = None,
+            frameCol: str = None
+        ) -> "SharedTrackTable":
+        """Copies the columns of tracksDf into shared memory, grouped by track and ordered by frame.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            idCol (str): track id column. Shared as a column if it is numeric, otherwise the ids are sent with the spec (one per track).
+            columns (List[str], optional): numeric columns to share, e.g., the coordinates. The frame column is always shared. Defaults to all numeric and bool columns.
+            frameCol (str, optional): rows of a track are ordered by this column. Rows keep their order within a track if None. Defaults to None.
+
+        Returns:
+            SharedTrackTable: the owner of the blocks
+        """
+        if columns is None:
+            columns = [
+                col for col in tracksDf.columns
+                if col != idCol and (pd.api.types.is_numeric_dtype(tracksDf[col]) or pd.api.types.is_bool_dtype(tracksDf[col]))
+            ]
+        columns = [col for col in columns if col != idCol]
+        if frameCol is not None and frameCol in tracksDf and frameCol not in columns:
+            columns.insert(0, frameCol)
+
+        # group only the id and frame columns, the shared columns are taken once straight into the blocks
+        store = TrackStore(tracksDf[[c for c in (idCol, frameCol) if c is not None and c in tracksDf]], idCol, frameCol)
+
+        arrays = {
+            "__starts__": store.starts.astype(np.int64),
+            "__ends__": store.ends.astype(np.int64),
+        }
+        spec = {"idCol": idCol, "frameCol": frameCol, "numRows": store.numRows(), "arrays": {}, "outputs": [], "ids": None}
+        if pd.api.types.is_numeric_dtype(store.ids.dtype):
+            arrays["__ids__"] = store.ids
+            arrays[idCol] = np.repeat(store.ids, store.sizes)
+        else:
+            spec["ids"] = list(store.ids)
+
+        table = SharedTrackTable(spec, isOwner=True)
+        try:
+            for name, values in arrays.items():
+                table._createArray(name, values.dtype, values.shape)[:] = values
+            for col in columns:
+                values = tracksDf[col].to_numpy()
+                shared = table._createArray(col, values.dtype, values.shape)
+                if store.isSorted:
+                    shared[:] = values
+                else:
+                    np.take(values, store.order, out=shared)
+        except Exception:
+            table.close()
+            raise
+
+        table._setTrackTable()
+        table.order = store.order
+        return table
+
+    @staticmethod
+    def attach(spec: Dict[str, Any]) -> "SharedTrackTable":
+        """Opens a published table from its spec (see getSpec), e.g., in a worker process"""
+        return SharedTrackTable(spec)
+
+    def _createArray(self, name: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        if dtype.hasobject:
+            raise TypeError(f"{name} has dtype {dtype}, only numeric and bool columns can be shared")
+        size = max(1, int(np.prod(shape)) * dtype.itemsize) # blocks cannot be empty
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self._blocks[name] = block
+        self._arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        self.spec["arrays"][name] = (block.name, dtype.str, tuple(shape))
+        return self._arrays[name]
+
+    def _attachArray(self, name: str, blockName: str, dtype: str, shape: Tuple[int, ...]):
+        block = shared_memory.SharedMemory(name=blockName)
+        self._blocks[name] = block
+        self._arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    def getSpec(self) -> Dict[str, Any]:
+        """block names, dtypes and shapes of the table. It is small and picklable, send it to the workers instead of the data."""
+        return self.spec
+
+    # region access
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def numRows(self) -> int:
+        return self.spec["numRows"]
+
+    @property
+    def columns(self) -> List[str]:
+        """rowwise columns"""
+        return [name for name, values in self._arrays.items() if not name.startswith("__") and values.shape[:1] == (self.numRows(),)]
+
+    def column(self, col: str) -> np.ndarray:
+        """the shared column in table order. A view, writes are seen by all processes."""
+        return self._arrays[col]
+
+    def getTrackRows(self, firstTrack: int, lastTrack: int) -> slice:
+        """rows of the tracks in [firstTrack, lastTrack)"""
+        if lastTrack <= firstTrack:
+            return slice(0, 0)
+        return slice(int(self.starts[firstTrack]), int(self.ends[lastTrack - 1]))
+
+    def getTrackAt(self, position: int, columns: List[str] = None) -> Dict[str, np.ndarray]:
+        """views of the columns of one track"""
+        rows = self.getTrackRows(position, position + 1)
+        columns = self.columns if columns is None else columns
+        return {col: self._arrays[col][rows] for col in columns}
+
+    def toDataFrame(self, firstTrack: int = 0, lastTrack: int = None, columns: List[str] = None) -> pd.DataFrame:
+        """the tracks in [firstTrack, lastTrack) as a DataFrame in table order, e.g., to call a TrajectoryProcessor in a worker. The frame copies the columns."""
+        lastTrack = len(self) if lastTrack is None else lastTrack
+        rows = self.getTrackRows(firstTrack, lastTrack)
+        columns = self.columns if columns is None else columns
+        data = {}
+        if self.idCol not in self._arrays:
+            sizes = self.ends[firstTrack:lastTrack] - self.starts[firstTrack:lastTrack]
+            data[self.idCol] = np.repeat(self.ids[firstTrack:lastTrack], sizes)
+        for col in columns:
+            data[col] = self._arrays[col][rows]
+        return pd.DataFrame(data, index=pd.RangeIndex(rows.start, rows.stop))
+
+    def toOriginalOrder(self, values: np.ndarray) -> np.ndarray:
+        """values in table order put back in the order of the published frame. Owner only."""
+        if self.order is None:
+            raise ValueError("only the table that published the frame knows its row order")
+        original = np.empty_like(values)
+        original[self.order] = values
+        return original
+
+    # endregion
+
+    # region outputs
+
+    def addOutput(self, col: str, dtype=float, fill=np.nan, shape: Tuple[int, ...] = None) -> np.ndarray:
+        """Allocates a shared output column (one value per row by default) before the jobs start. Owner only, as the spec sent to the workers must have it.
+
+        Args:
+            col (str): name of the output column, must not be in the table
+            dtype (optional): numeric or bool dtype of the output. Defaults to float.
+            fill (_type_, optional): initial value. Defaults to np.nan.
+            shape (Tuple[int, ...], optional): e.g., (len(table),) for one value per track. Defaults to (numRows,).
+
+        Returns:
+            np.ndarray: the shared array
+        """
+        if not self.isOwner:
+            raise ValueError("outputs are allocated by the owner before the jobs start")
+        if col in self._arrays:
+            raise ValueError(f"{col} is already in the table")
+        shape = (self.numRows(),) if shape is None else tuple(shape)
+        values = self._createArray(col, dtype, shape)
+        values[...] = fill
+        if len(values) == self.numRows():
+            self.spec["outputs"].append(col)
+        return values
+
+    def collectOutputs(self, tracksDf: pd.DataFrame, columns: List[str] = None):
+        """Writes rowwise output columns into the published frame in its row order. Owner only.
+
+        Args:
+            tracksDf (pd.DataFrame): the published frame
+            columns (List[str], optional): output columns to write. Defaults to all the rowwise columns added with addOutput.
+        """
+        if columns is None:
+            columns = self.spec["outputs"]
+        for col in columns:
+            tracksDf[col] = self.toOriginalOrder(self._arrays[col])
+
+    # endregion
+
+    # region jobs
+
+    def map(self,
+            func: Callable,
+            nJobs: int,
+            args: Tuple = (),
+            numChunks: int = None
+        ) -> List[Any]:
+        """Runs func(table, firstTrack, lastTrack, *args) on contiguous chunks of whole tracks on a process pool. Workers attach to the blocks, so only the spec and the small return values are pickled.
+
+        Args:
+            func (Callable): a module level function. It writes its rows into the output columns and may return something small, e.g., per track statistics.
+            nJobs (int): worker processes
+            args (Tuple, optional): extra arguments for func. Defaults to ().
+            numChunks (int, optional): chunks of tracks, more than nJobs balances uneven tracks. Defaults to nJobs.
+
+        Returns:
+            List[Any]: return values of func in track order
+        """
+        bounds = getTrackChunks(self.ends, nJobs if numChunks is None else numChunks)
+        if nJobs <= 1 or len(bounds) <= 1:
+            return [func(self, first, last, *args) for first, last in bounds]
+
+        spec = self.getSpec()
+        with ProcessPoolExecutor(max_workers=nJobs) as executor:
+            return list(executor.map(
+                _runSharedJob,
+                [spec] * len(bounds),
+                [func] * len(bounds),
+                [first for first, _ in bounds],
+                [last for _, last in bounds],
+                [args] * len(bounds)
+            ))
+
+    # endregion
+
+    # region lifetime
+
+    def close(self):
+        """Releases the views of this process. The owner also frees the blocks."""
+        self._arrays = {}
+        self.starts = self.ends = self.ids = None
+        for block in self._blocks.values():
+            block.close()
+            if self.isOwner:
+                block.unlink()
+        self._blocks = {}
+
+    def __enter__(self) -> "SharedTrackTable":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        raise TypeError("send table.getSpec() to the other process and attach to it there")
+
+    # endregion
+
+
+_attachedTables: Dict[Tuple, SharedTrackTable] = {} # per worker process, so chunks of the same table do not attach again
+
+
+def _runSharedJob(spec: Dict[str, Any], func: Callable, firstTrack: int, lastTrack: int, args: Tuple):
+    """worker of SharedTrackTable.map"""
+    key = tuple(sorted((name, blockName) for name, (blockName, _, _) in spec["arrays"].items()))
+    if key not in _attachedTables:
+        for table in _attachedTables.values():
+            table.close()
+        _attachedTables.clear()
+        _attachedTables[key] = SharedTrackTable.attach(spec)
+    return func(_attachedTables[key], firstTrack, lastTrack, *args)
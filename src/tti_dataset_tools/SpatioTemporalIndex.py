@@ -0,0 +1,245 @@
+import pandas as pd
+import numpy as np
+from typing import *
+from .ColMapper import ColMapper
+from .TrajectoryProcessor import TrajectoryProcessor
+from .TrajectoryUtils import TrajectoryUtils
+
+class SpatioTemporalIndex(TrajectoryProcessor):
+    """Rows of a tracks table bucketed by frame and hashed into a uniform grid of cellSize inside each frame, for "who is near (x, y) at frame f" queries.
+    Queries are batched over many (frame, x, y) probes and answer row positions in the indexed frame (use tracksDf.iloc or .take), nothing is copied. Columns come from the ColMapper, so the same index works on pedestrians and on other agents.
+    Rows with a missing x or y are not indexed.
+    """
+
+    def __init__(self,
+            colMapper: ColMapper,
+            tracksDf: pd.DataFrame,
+            cellSize: float = 2,
+            xCol: str = None,
+            yCol: str = None
+        ):
+        """
+        Args:
+            colMapper (ColMapper): _description_
+            tracksDf (pd.DataFrame): rows to index
+            cellSize (float, optional): side of a grid cell. About the usual query radius works best. Defaults to 2.
+            xCol (str, optional): Defaults to the mapped xCol.
+            yCol (str, optional): Defaults to the mapped yCol.
+        """
+
+        super().__init__(colMapper)
+        self.xCol = self.xCol if xCol is None else xCol
+        self.yCol = self.yCol if yCol is None else yCol
+        self.cellSize = cellSize
+
+        frames = tracksDf[self.frameCol].to_numpy()
+        X = tracksDf[self.xCol].to_numpy(dtype=float)
+        Y = tracksDf[self.yCol].to_numpy(dtype=float)
+        positions = np.flatnonzero(~(np.isnan(X) | np.isnan(Y)))
+
+        self.frameValues = np.unique(frames[positions])
+        self.minX = X[positions].min() if len(positions) > 0 else 0
+        self.minY = Y[positions].min() if len(positions) > 0 else 0
+
+        frameCodes = np.searchsorted(self.frameValues, frames[positions])
+        cellXs, cellYs = self.getCells(X[positions], Y[positions])
+        self.numCellsX = int(cellXs.max()) + 1 if len(positions) > 0 else 1
+        self.numCellsY = int(cellYs.max()) + 1 if len(positions) > 0 else 1
+
+        keys = self.getKeys(frameCodes, cellXs, cellYs)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+
+        self.positions = positions[order] # row position in tracksDf of every indexed row, grouped by (frame, cell)
+        self.X = X[self.positions]
+        self.Y = Y[self.positions]
+        self.cellKeys, self.cellStarts = np.unique(keys, return_index=True)
+        self.cellEnds = np.append(self.cellStarts[1:], len(keys))
+
+        # rows of a frame are contiguous, a probe whose ring has more cells than its frame has rows scans the frame instead
+        self.frameSizes = np.bincount(frameCodes, minlength=len(self.frameValues))
+        self.frameEnds = np.cumsum(self.frameSizes)
+        self.frameStarts = self.frameEnds - self.frameSizes
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def getCells(self, X: np.ndarray, Y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        cellXs = np.floor((X - self.minX) / self.cellSize).astype(np.int64)
+        cellYs = np.floor((Y - self.minY) / self.cellSize).astype(np.int64)
+        return cellXs, cellYs
+
+    def getKeys(self, frameCodes: np.ndarray, cellXs: np.ndarray, cellYs: np.ndarray) -> np.ndarray:
+        return (frameCodes.astype(np.int64) * self.numCellsY + cellYs) * self.numCellsX + cellXs
+
+    def isFrameScanned(self, frameCodes: np.ndarray, ringSize: int) -> np.ndarray:
+        return self.frameSizes[frameCodes] <= (2 * ringSize + 1) ** 2
+
+    def getProbeDistanceOrder(self, probes: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        """same as np.lexsort((distances, probes)), two plain sorts are several times faster"""
+        order = np.argsort(distances)
+        return order[np.argsort(probes[order], kind="stable")]
+
+    def getProbes(self,
+            probeDf: pd.DataFrame,
+            xCol: str = None,
+            yCol: str = None
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(frames, X, Y) of the rows of a tracks table, e.g., pedestrians to query against an index of other agents"""
+        xCol = self.xCol if xCol is None else xCol
+        yCol = self.yCol if yCol is None else yCol
+        return (
+            probeDf[self.frameCol].to_numpy(),
+            probeDf[xCol].to_numpy(dtype=float),
+            probeDf[yCol].to_numpy(dtype=float)
+        )
+
+    def getCandidates(self,
+            frames: np.ndarray,
+            X: np.ndarray,
+            Y: np.ndarray,
+            ringSize: int,
+            probeIdx: np.ndarray = None,
+            scanFrames: bool = False
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(probe, index position, distance) of the rows in the (2 * ringSize + 1)^2 cells around every probe at the probe frame, or of all the rows of the frame if it has fewer rows than cells or scanFrames is True"""
+        if probeIdx is None:
+            probeIdx = np.arange(len(X))
+        frames = np.asarray(frames)[probeIdx]
+        X = np.asarray(X, dtype=float)[probeIdx]
+        Y = np.asarray(Y, dtype=float)[probeIdx]
+
+        frameCodes = np.searchsorted(self.frameValues, frames)
+        frameCodes = np.minimum(frameCodes, max(len(self.frameValues) - 1, 0))
+        known = (len(self.frameValues) > 0) & ~(np.isnan(X) | np.isnan(Y))
+        known &= self.frameValues[frameCodes] == frames if len(self.frameValues) > 0 else False
+        probeIdx, frameCodes, X, Y = probeIdx[known], frameCodes[known], X[known], Y[known]
+        wholeFrame = self.isFrameScanned(frameCodes, ringSize) | scanFrames
+        frameProbes = np.flatnonzero(wholeFrame)
+        cellProbes = np.flatnonzero(~wholeFrame)
+        cellXs, cellYs = self.getCells(X[cellProbes], Y[cellProbes])
+
+        offsets = np.arange(-ringSize, ringSize + 1)
+        offsetXs = np.tile(offsets, len(offsets))
+        offsetYs = np.repeat(offsets, len(offsets))
+        numOffsets = len(offsetXs)
+
+        cellXs = (cellXs[:, None] + offsetXs[None, :]).ravel()
+        cellYs = (cellYs[:, None] + offsetYs[None, :]).ravel()
+        probes = np.repeat(cellProbes, numOffsets)
+        inside = (cellXs >= 0) & (cellXs < self.numCellsX) & (cellYs >= 0) & (cellYs < self.numCellsY)
+        probes, cellXs, cellYs = probes[inside], cellXs[inside], cellYs[inside]
+
+        keys = self.getKeys(frameCodes[probes], cellXs, cellYs)
+        cells = np.minimum(np.searchsorted(self.cellKeys, keys), max(len(self.cellKeys) - 1, 0))
+        found = self.cellKeys[cells] == keys if len(self.cellKeys) > 0 else np.zeros(len(keys), dtype=bool)
+        probes, cells = probes[found], cells[found]
+
+        probes = np.concatenate((frameProbes, probes))
+        starts = np.concatenate((self.frameStarts[frameCodes[frameProbes]], self.cellStarts[cells]))
+        ends = np.concatenate((self.frameEnds[frameCodes[frameProbes]], self.cellEnds[cells]))
+        rows = TrajectoryUtils.expandRanges(starts, ends)
+        probes = np.repeat(probes, ends - starts)
+
+        distances = np.sqrt((self.X[rows] - X[probes]) ** 2 + (self.Y[rows] - Y[probes]) ** 2)
+        return probeIdx[probes], rows, distances
+
+    def queryRadius(self,
+            frames: np.ndarray,
+            X: np.ndarray,
+            Y: np.ndarray,
+            radius: float
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows within radius of every probe at the probe frame.
+
+        Args:
+            frames (np.ndarray): frame of every probe
+            X (np.ndarray): x of every probe
+            Y (np.ndarray): y of every probe
+            radius (float): _description_
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (probe number, row position in the indexed frame, distance) of every hit, ordered by probe
+        """
+        ringSize = int(np.ceil(radius / self.cellSize))
+        probes, rows, distances = self.getCandidates(frames, X, Y, ringSize)
+        hits = distances <= radius
+        probes, rows, distances = probes[hits], rows[hits], distances[hits]
+
+        order = np.argsort(probes, kind="stable")
+        return probes[order], self.positions[rows[order]], distances[order]
+
+    def queryKNearest(self,
+            frames: np.ndarray,
+            X: np.ndarray,
+            Y: np.ndarray,
+            k: int,
+            maxDistance: float = np.inf
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """k nearest rows of every probe at the probe frame. The cells around a probe are searched in growing rings, starting from its own cell, until the k-th candidate is closer than the searched ring, so a probe in a sparse frame costs more than one in a crowded frame. Probes still pending once the ring is as large as the grid (e.g., far outside it) scan their whole frame.
+
+        Args:
+            frames (np.ndarray): frame of every probe
+            X (np.ndarray): x of every probe
+            Y (np.ndarray): y of every probe
+            k (int): _description_
+            maxDistance (float, optional): rows further than this are not returned. Defaults to np.inf.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (probe number, row position in the indexed frame, distance) of up to k hits per probe, ordered by probe and distance
+        """
+        frames = np.asarray(frames)
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        frameCodes = np.minimum(np.searchsorted(self.frameValues, frames), max(len(self.frameValues) - 1, 0))
+        if len(self.frameValues) > 0:
+            frameSizes = np.where(self.frameValues[frameCodes] == frames, self.frameSizes[frameCodes], 0)
+        else:
+            frameSizes = np.zeros(len(frames), dtype=int)
+        maxRingSize = max(self.numCellsX, self.numCellsY)
+
+        # distance from a probe to the border of its cell, everything closer than ringSize * cellSize + margin has been searched
+        cellXs, cellYs = self.getCells(X, Y)
+        offsetXs = X - self.minX - cellXs * self.cellSize
+        offsetYs = Y - self.minY - cellYs * self.cellSize
+        margins = np.minimum(np.minimum(offsetXs, self.cellSize - offsetXs), np.minimum(offsetYs, self.cellSize - offsetYs))
+
+        results = []
+        pending = np.arange(len(frames))
+        ringSize = 0
+        while len(pending) > 0:
+            scanFrames = ringSize >= maxRingSize
+            probes, rows, distances = self.getCandidates(frames, X, Y, ringSize, pending, scanFrames)
+            hits = distances <= maxDistance
+            probes, rows, distances = probes[hits], rows[hits], distances[hits]
+
+            order = self.getProbeDistanceOrder(probes, distances)
+            probes, rows, distances = probes[order], rows[order], distances[order]
+            rank = np.arange(len(probes)) - np.searchsorted(probes, probes, side="left")
+            nearest = rank < k
+            probes, rows, distances = probes[nearest], rows[nearest], distances[nearest]
+
+            # a probe is done when its k-th candidate is inside the searched ring (nothing unsearched can be closer), or when nothing is left to search
+            searched = ringSize * self.cellSize + margins[pending]
+            counts = np.bincount(probes, minlength=len(frames))[pending]
+            kthDistances = np.full(len(frames), np.inf)
+            kthDistances[probes[rank[nearest] == k - 1]] = distances[rank[nearest] == k - 1]
+            done = (counts >= k) & (kthDistances[pending] <= searched)
+            done |= frameSizes[pending] <= (2 * ringSize + 1) ** 2
+            done |= np.isnan(X[pending]) | np.isnan(Y[pending])
+            done |= (searched >= maxDistance) | scanFrames
+
+            isDone = np.zeros(len(frames), dtype=bool)
+            isDone[pending[done]] = True
+            keep = isDone[probes]
+            results.append((probes[keep], rows[keep], distances[keep]))
+
+            pending = pending[~done]
+            ringSize = max(1, 2 * ringSize)
+
+        probes = np.concatenate([result[0] for result in results]) if len(results) > 0 else np.empty(0, dtype=int)
+        rows = np.concatenate([result[1] for result in results]) if len(results) > 0 else np.empty(0, dtype=int)
+        distances = np.concatenate([result[2] for result in results]) if len(results) > 0 else np.empty(0)
+
+        order = self.getProbeDistanceOrder(probes, distances)
+        return probes[order], self.positions[rows[order]], distances[order]
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+from typing import *
+from .ColMapper import ColMapper
+from .TrajectoryProcessor import TrajectoryProcessor
+from .TrackClass import TrackClass
+
+
+class SyntheticTrackGenerator(TrajectoryProcessor):
+    """Synthetic recordings of a mid-block crosswalk for benchmarks and examples.
+
+    Pedestrians cross the road along y, starting on either sidewalk (y = 0 or y = roadWidth) near the crosswalk (x = 0) and drifting sideways a little. Cars and trucks drive along x in one lane per direction and cross the whole scene. Positions are a constant velocity path plus a random walk, so tracks are smooth but not straight.
+
+    Columns follow the ColMapper: the id, frame, x and y columns and "class". Tracks arrive at arrivalRate per second, so the number of tracks visible in a frame does not grow with the number of tracks.
+    """
+
+    def __init__(self,
+            colMapper: ColMapper,
+            seed: int = 0,
+            roadWidth: float = 10,
+            sceneLength: float = 60,
+            arrivalRate: float = 2
+        ):
+        """
+        Args:
+            colMapper (ColMapper): _description_
+            seed (int, optional): _description_. Defaults to 0.
+            roadWidth (float, optional): length of the crosswalk in meter. Defaults to 10.
+            sceneLength (float, optional): length of the road in the scene in meter. Defaults to 60.
+            arrivalRate (float, optional): new tracks per second. Defaults to 2.
+        """
+        super().__init__(colMapper)
+        self.rng = np.random.default_rng(seed)
+        self.roadWidth = roadWidth
+        self.sceneLength = sceneLength
+        self.arrivalRate = arrivalRate
+
+    def generate(self,
+            numTracks: int,
+            fps: float = None,
+            pedestrianRatio: float = 0.6,
+            noise: float = 0.05
+        ) -> pd.DataFrame:
+        """
+        Args:
+            numTracks (int): _description_
+            fps (float, optional): Defaults to the ColMapper fps.
+            pedestrianRatio (float, optional): the rest are cars (85%) and trucks or buses. Defaults to 0.6.
+            noise (float, optional): standard deviation of the random walk in meter per second. Defaults to 0.05.
+
+        Returns:
+            pd.DataFrame: rows grouped by track and ordered by frame. About 9 seconds per pedestrian and 6 per vehicle, so 10^6 tracks at 25 fps are close to 2 * 10^8 rows; use a lower fps for the large sizes.
+        """
+        fps = self.fps if fps is None else fps
+        rng = self.rng
+
+        isPedestrian = rng.random(numTracks) < pedestrianRatio
+        isTruck = ~isPedestrian & (rng.random(numTracks) < 0.15)
+        goesForward = rng.random(numTracks) < 0.5 # NORTH for pedestrians, EAST for vehicles
+
+        speed = np.where(
+            isPedestrian,
+            np.clip(rng.normal(1.35, 0.25, numTracks), 0.6, 2.5),
+            np.clip(rng.normal(10, 2, numTracks), 4, 18) * np.where(isTruck, 0.8, 1)
+        )
+        drift = np.where(isPedestrian, rng.normal(0, 0.1, numTracks), rng.normal(0, 0.005, numTracks)) # heading off the main axis in radian
+
+        # pedestrians wait on the sidewalk up to 2 seconds before crossing
+        wait = np.where(isPedestrian, rng.uniform(0, 2, numTracks), 0)
+        distance = np.where(isPedestrian, self.roadWidth, self.sceneLength)
+        duration = distance / speed + wait
+        sizes = np.maximum(np.ceil(duration * fps).astype(np.int64), 2)
+
+        laneOffset = self.roadWidth / 4
+        startX = np.where(isPedestrian, rng.normal(0, 1, numTracks), np.where(goesForward, -self.sceneLength / 2, self.sceneLength / 2))
+        startY = np.where(isPedestrian, np.where(goesForward, 0, self.roadWidth), np.where(goesForward, laneOffset, self.roadWidth - laneOffset))
+        sign = np.where(goesForward, 1, -1)
+        velX = np.where(isPedestrian, np.sin(drift), np.cos(drift) * sign) * speed
+        velY = np.where(isPedestrian, np.cos(drift) * sign, np.sin(drift)) * speed
+
+        ends = np.cumsum(sizes)
+        starts = ends - sizes
+        numRows = int(ends[-1]) if numTracks > 0 else 0
+        codes = np.repeat(np.arange(numTracks), sizes)
+        step = np.arange(numRows) - np.repeat(starts, sizes)
+        moving = np.maximum(step / fps - wait[codes], 0)
+
+        X = startX[codes] + velX[codes] * moving + self.getRandomWalk(numRows, starts, sizes, noise / np.sqrt(fps))
+        Y = startY[codes] + velY[codes] * moving + self.getRandomWalk(numRows, starts, sizes, noise / np.sqrt(fps))
+
+        classes = np.where(isPedestrian, TrackClass.Pedestrian.value, np.where(isTruck, TrackClass.Truck_Bus.value, TrackClass.Car.value))
+        startFrames = np.sort(rng.integers(0, max(1, int(numTracks / self.arrivalRate * fps)), numTracks))
+
+        return pd.DataFrame({
+            self.idCol: codes,
+            self.frameCol: startFrames[codes] + step,
+            self.xCol: X,
+            self.yCol: Y,
+            "class": classes[codes],
+        })
+
+    def getRandomWalk(self, numRows: int, starts: np.ndarray, sizes: np.ndarray, scale: float) -> np.ndarray:
+        """random walk of every track starting at 0"""
+        steps = self.rng.normal(0, scale, numRows)
+        if numRows > 0:
+            steps[starts] = 0
+        walk = np.cumsum(steps)
+        return walk - np.repeat(walk[starts], sizes)
+
+    def generateRecordings(self,
+            numRecordings: int,
+            numTracks: int,
+            fps: float = None,
+            pedestrianRatio: float = 0.6
+        ) -> List[pd.DataFrame]:
+        """numTracks tracks per recording, ids are unique across the recordings"""
+        recordings = []
+        firstId = 0
+        for _ in range(numRecordings):
+            tracksDf = self.generate(numTracks, fps, pedestrianRatio)
+            tracksDf[self.idCol] += firstId
+            firstId += numTracks
+            recordings.append(tracksDf)
+        return recordings
@@ -0,0 +1,171 @@
+import functools
+import inspect
+import numpy as np
+import pandas as pd
+from typing import *
+from concurrent.futures import ProcessPoolExecutor
+from .TrackStore import TrackStore
+
+
+def getTrackChunks(trackEnds: np.ndarray, numChunks: int) -> List[Tuple[int, int]]:
+    """Splits consecutive tracks into about numChunks contiguous chunks with about the same number of rows.
+
+    Args:
+        trackEnds (np.ndarray): end row (exclusive) of every track, in row order
+        numChunks (int): _description_
+
+    Returns:
+        List[Tuple[int, int]]: first and last (exclusive) track of every chunk
+    """
+    numTracks = len(trackEnds)
+    if numTracks == 0:
+        return []
+    numChunks = max(1, min(numChunks, numTracks))
+    targets = np.arange(1, numChunks) * trackEnds[-1] / numChunks
+    cuts = np.unique(np.searchsorted(trackEnds, targets, side="left") + 1) # chunks end after the track reaching the target
+    cuts = cuts[(cuts > 0) & (cuts < numTracks)]
+    trackBounds = np.concatenate(([0], cuts, [numTracks]))
+    return [(int(first), int(last)) for first, last in zip(trackBounds[:-1], trackBounds[1:])]
+
+
+def getChunkBounds(store: TrackStore, numChunks: int) -> List[Tuple[int, int]]:
+    """Splits the rows of a store into about numChunks contiguous chunks of whole tracks with about the same number of rows"""
+    return [(int(store.starts[first]), int(store.ends[last - 1])) for first, last in getTrackChunks(store.ends, numChunks)]
+
+
+def _runChunk(processor, methodName: str, chunkDf: pd.DataFrame, chunkPositions: np.ndarray, rowwise: bool, writes: Optional[List[str]], args: Tuple, kwargs: Dict):
+    """worker of runByTrackChunks. Runs the method serially on one chunk."""
+    processor.nJobs = 1
+    result = getattr(processor, methodName)(chunkDf, *args, **kwargs)
+
+    if result is None: # the method updated the chunk in place, send back the columns it writes, the same for every chunk
+        return None, chunkDf[list(chunkDf.columns) if writes is None else writes], None
+
+    rowPositions = None
+    if rowwise and chunkDf.index.is_unique:
+        rowPositions = _getRowPositions(result, chunkDf, chunkPositions)
+    return result, None, rowPositions
+
+
+def _getRowPositions(result, chunkDf: pd.DataFrame, chunkPositions: np.ndarray) -> Optional[np.ndarray]:
+    """position in the original frame of every row of a rowwise result, recursively for tuples"""
+    if isinstance(result, tuple):
+        return tuple(_getRowPositions(item, chunkDf, chunkPositions) for item in result)
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        indexer = chunkDf.index.get_indexer(result.index)
+        if np.all(indexer >= 0):
+            return chunkPositions[indexer]
+    return None
+
+
+def _combine(results: List, rowPositions: List, rowwise: bool, keepIndex: bool):
+    first = results[0]
+    if isinstance(first, tuple):
+        return tuple(
+            _combine([result[i] for result in results], [None if positions is None else positions[i] for positions in rowPositions], rowwise, keepIndex)
+            for i in range(len(first))
+        )
+
+    if any(result is None for result in results): # e.g., a chunk with bad tracks
+        return None
+
+    if isinstance(first, (pd.DataFrame, pd.Series)):
+        combined = pd.concat(results, ignore_index=not (rowwise or keepIndex))
+        if rowwise and all(positions is not None for positions in rowPositions):
+            order = np.argsort(np.concatenate(rowPositions), kind="stable")
+            combined = combined.take(order)
+        return combined
+
+    if isinstance(first, (list, np.ndarray)):
+        return [item for result in results for item in result]
+
+    return results
+
+
+def runByTrackChunks(
+        processor,
+        methodName: str,
+        tracksDf: pd.DataFrame,
+        args: Tuple = (),
+        kwargs: Dict = None,
+        rowwise: bool = True,
+        keepIndex: bool = False,
+        writes: List[str] = None
+    ):
+    """
+    Runs processor.methodName on contiguous chunks of whole tracks on a process pool and combines the results as if the method had run on the whole frame:
+        - methods that update tracksDf in place get the written columns back in the original row order
+        - frames and series are concatenated. Rowwise results are put back in the original row order, other results (one row per track) keep the track order.
+        - lists are concatenated, tuples are combined item by item
+        - None from any chunk is None
+    Falls back to a serial call if the processor has nJobs <= 1 or tracksDf has fewer than minParallelRows rows.
+
+    Args:
+        keepIndex (bool, optional): non rowwise results keep the index of the chunks, e.g., rows selected from tracksDf in track order. Defaults to False.
+        writes (List[str], optional): columns an in-place method writes. All the columns are sent back if None. Defaults to None.
+    """
+    kwargs = {} if kwargs is None else kwargs
+    if isinstance(tracksDf, TrackStore) or processor.nJobs <= 1 or len(tracksDf) < processor.minParallelRows:
+        return getattr(processor, methodName)(tracksDf, *args, **kwargs)
+
+    store = processor.getTrackStore(tracksDf)
+    bounds = getChunkBounds(store, processor.nJobs)
+    if len(bounds) <= 1:
+        return getattr(processor, methodName)(tracksDf, *args, **kwargs)
+
+    chunks = [store.df.iloc[start:end] for start, end in bounds]
+    chunkPositions = [store.order[start:end] for start, end in bounds]
+
+    with ProcessPoolExecutor(max_workers=processor.nJobs) as executor:
+        outputs = list(executor.map(
+            _runChunk,
+            [processor] * len(chunks),
+            [methodName] * len(chunks),
+            chunks,
+            chunkPositions,
+            [rowwise] * len(chunks),
+            [writes] * len(chunks),
+            [args] * len(chunks),
+            [kwargs] * len(chunks)
+        ))
+
+    results = [output[0] for output in outputs]
+    if all(result is None for result in results):
+        writtenDf = pd.concat([output[1] for output in outputs])
+        for col in writtenDf.columns:
+            tracksDf[col] = store.toOriginalOrder(writtenDf[col].to_numpy())
+        return None
+
+    return _combine(results, [output[2] for output in outputs], rowwise, keepIndex)
+
+
+def byTrackChunks(
+        rowwise: bool = True,
+        keepIndex: bool = False,
+        writes: Callable[[Any], List[str]] = None,
+        serialIf: str = None
+    ):
+    """
+    Lets a TrajectoryProcessor method taking a tracks frame as its first argument run on a process pool by track chunks when the processor has nJobs > 1. See runByTrackChunks.
+
+    Args:
+        rowwise (bool, optional): the result has one row per input row (put back in the input order). Otherwise rows are per track and keep the track order. Defaults to True.
+        keepIndex (bool, optional): a non rowwise result keeps the index of the chunks. Defaults to False.
+        writes (Callable[[Any], List[str]], optional): columns written by an in-place method, given the processor. Defaults to all the columns.
+        serialIf (str, optional): a bool argument of the method that makes it run serially when True, e.g., "inplace" for methods that update the caller's frame and also return a result. Defaults to None.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, tracksDf, *args, **kwargs):
+            if getattr(self, "nJobs", 1) <= 1 or isinstance(tracksDf, TrackStore) or len(tracksDf) < self.minParallelRows:
+                return method(self, tracksDf, *args, **kwargs)
+            if serialIf is not None:
+                bound = signature.bind(self, tracksDf, *args, **kwargs)
+                bound.apply_defaults()
+                if bound.arguments[serialIf]:
+                    return method(self, tracksDf, *args, **kwargs)
+            return runByTrackChunks(self, method.__name__, tracksDf, args, kwargs, rowwise, keepIndex, None if writes is None else writes(self))
+        return wrapper
+    return decorator
@@ -0,0 +1,231 @@
+import json
+import logging
+import numpy as np
+import pandas as pd
+from typing import *
+from .ColMapper import ColMapper
+from .TrajectoryProcessor import TrajectoryProcessor
+
+
+class TrackSchema(TrajectoryProcessor):
+    """Compact dtypes for tracks and meta tables, driven by the ColMapper:
+        - string track ids become int codes. The ids are kept by the schema, so tracks and meta tables compacted with the same schema share the codes.
+        - "class" and the direction columns (TrackDirection values) become categoricals
+        - coordinates and kinematics become float32 if the float32 values are within tolerance of the originals
+
+    restore converts a compact table back to the original dtypes and ids, e.g., before exporting it. Float32 columns come back as float64 with float32 precision.
+
+        schema = TrackSchema(colMapper)
+        tracksDf = schema.compact(tracksDf)
+        tracksMeta = schema.compact(tracksMeta)
+        schema.getMemoryReport()
+        schema.toCsv(tracksDf, path)
+    """
+
+    idKind = "id"
+    categoryKind = "category"
+    floatKind = "float32"
+
+    def __init__(self,
+            colMapper: ColMapper,
+            floatCols: List[str] = None,
+            categoryCols: List[str] = None,
+            tolerance: float = 1e-3
+        ):
+        """
+        Args:
+            colMapper (ColMapper): column names of the tracks
+            floatCols (List[str], optional): columns to store as float32. Defaults to the coordinate and kinematics columns of the ColMapper.
+            categoryCols (List[str], optional): Defaults to "class" and the direction columns.
+            tolerance (float, optional): largest absolute change allowed by the float32 conversion, e.g., 1 mm for coordinates in meter. Defaults to 1e-3.
+        """
+        super().__init__(colMapper)
+        if floatCols is None:
+            floatCols = [
+                self.xCol, self.yCol, self.xVelCol, self.yVelCol, self.speedCol,
+                self.displacementXCol, self.displacementYCol, self.localXCol, self.localYCol,
+                self.xAccelerationCol, self.yAccelerationCol, self.accelerationCol, self.jerkCol,
+                self.headingCol, self.yawRateCol,
+            ]
+        if categoryCols is None:
+            categoryCols = ["class", self.verticalDirectionCol, self.horizontalDirectionCol]
+
+        self.floatCols = floatCols
+        self.categoryCols = categoryCols
+        self.tolerance = tolerance
+
+        self.columns: Dict[str, Dict[str, Any]] = {} # kind and original dtype of every converted column
+        self.ids: Dict[str, np.ndarray] = {} # original id of every code by id column
+        self.memoryReport: pd.DataFrame = None
+
+    # region compaction
+
+    def compact(self, tracksDf: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """Converts the columns of the schema that tracksDf has. Float columns that would lose more than the tolerance are kept. The memory saved is in getMemoryReport.
+
+        Args:
+            tracksDf (pd.DataFrame): tracks or a meta table
+            inplace (bool, optional): converts the columns of tracksDf instead of a shallow copy. Defaults to False.
+
+        Returns:
+            pd.DataFrame: the compact table
+        """
+        compactDf = tracksDf if inplace else tracksDf.copy(deep=False)
+        before = tracksDf.memory_usage(deep=True, index=False)
+        originalDtypes = tracksDf.dtypes
+
+        if self.idCol in compactDf and self.isStringLike(compactDf[self.idCol]):
+            self.replaceColumn(compactDf, self.idCol, self.encodeIds(self.idCol, compactDf[self.idCol]))
+            self.addColumn(self.idCol, self.idKind, originalDtypes[self.idCol])
+
+        for col in self.categoryCols:
+            if col in compactDf and self.isStringLike(compactDf[col]):
+                self.replaceColumn(compactDf, col, compactDf[col].astype("category"))
+                self.addColumn(col, self.categoryKind, originalDtypes[col])
+
+        for col in self.floatCols:
+            if col in compactDf and compactDf[col].dtype == np.float64:
+                values = compactDf[col].to_numpy()
+                compactValues = values.astype(np.float32)
+                if self.isWithinTolerance(values, compactValues):
+                    self.replaceColumn(compactDf, col, compactValues)
+                    self.addColumn(col, self.floatKind, originalDtypes[col])
+                else:
+                    logging.info(f"TrackSchema: {col} is kept as float64, float32 changes it by more than {self.tolerance}")
+
+        compactDf.attrs["originalDtypes"] = {
+            col: originalDtypes[col] for col in self.columns
+            if col in compactDf and originalDtypes[col] != compactDf[col].dtype
+        }
+        after = compactDf.memory_usage(deep=True, index=False)
+        self.memoryReport = pd.DataFrame({
+            "originalDtype": originalDtypes.astype(str),
+            "compactDtype": compactDf.dtypes.astype(str),
+            "originalBytes": before,
+            "compactBytes": after,
+        })
+        self.memoryReport["savedBytes"] = self.memoryReport["originalBytes"] - self.memoryReport["compactBytes"]
+        self.memoryReport.index.name = "column"
+        logging.info(f"TrackSchema: {self.getSavedBytes() / 2 ** 20:.1f} MB saved of {before.sum() / 2 ** 20:.1f} MB")
+        return compactDf
+
+    @staticmethod
+    def isStringLike(series: pd.Series) -> bool:
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return False
+        return pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)
+
+    @staticmethod
+    def replaceColumn(df: pd.DataFrame, col: str, values):
+        # a new column instead of an update, so a shallow copy does not write into the original frame
+        position = df.columns.get_loc(col)
+        del df[col]
+        df.insert(position, col, values)
+
+    def addColumn(self, col: str, kind: str, originalDtype):
+        if col not in self.columns:
+            self.columns[col] = {"kind": kind, "dtype": originalDtype}
+
+    def isWithinTolerance(self, values: np.ndarray, compactValues: np.ndarray) -> bool:
+        with np.errstate(all="ignore"):
+            finite = np.isfinite(values)
+            if not np.array_equal(finite, np.isfinite(compactValues)): # out of the float32 range
+                return False
+            if not np.array_equal(values[~finite], compactValues[~finite].astype(np.float64), equal_nan=True):
+                return False
+            errors = np.abs(values[finite] - compactValues[finite].astype(np.float64))
+        return len(errors) == 0 or errors.max() <= self.tolerance
+
+    def encodeIds(self, col: str, values: pd.Series) -> np.ndarray:
+        """int code of every id. New ids get the next codes."""
+        known = self.ids.get(col, np.empty(0, dtype=object))
+        codes = pd.Index(known).get_indexer(values)
+        unknown = codes < 0
+        if unknown.any():
+            newIds = pd.unique(values[unknown])
+            known = np.concatenate((known, np.asarray(newIds, dtype=object)))
+            self.ids[col] = known
+            codes = pd.Index(known).get_indexer(values)
+        self.ids[col] = known
+        return codes.astype(self.getCodeDtype(len(known)))
+
+    @staticmethod
+    def getCodeDtype(numCodes: int) -> np.dtype:
+        if numCodes < 2 ** 31:
+            return np.dtype(np.int32)
+        return np.dtype(np.int64)
+
+    # endregion
+
+    # region restoration
+
+    def restore(self, compactDf: pd.DataFrame) -> pd.DataFrame:
+        """A copy of a table compacted by this schema with the original ids and dtypes. Columns which are not in their compact dtype are left as they are."""
+        restoredDf = compactDf.copy(deep=False)
+        originalDtypes = compactDf.attrs.get("originalDtypes", {}) # of this table, the schema keeps the dtypes of the first table
+        for col, column in self.columns.items():
+            if col not in restoredDf or not self.isCompact(restoredDf[col], column["kind"]):
+                continue
+            if column["kind"] == self.idKind:
+                values = self.ids[col][restoredDf[col].to_numpy()]
+            else:
+                values = restoredDf[col].to_numpy()
+            dtype = originalDtypes.get(col, column["dtype"])
+            self.replaceColumn(restoredDf, col, pd.Series(values, index=restoredDf.index).astype(dtype))
+        restoredDf.attrs.pop("originalDtypes", None)
+        return restoredDf
+
+    def isCompact(self, series: pd.Series, kind: str) -> bool:
+        if kind == self.idKind:
+            return pd.api.types.is_integer_dtype(series.dtype)
+        if kind == self.categoryKind:
+            return isinstance(series.dtype, pd.CategoricalDtype)
+        return series.dtype == np.float32
+
+    def decodeIds(self, codes: Iterable[int], col: str = None) -> np.ndarray:
+        """original ids of codes, e.g., track ids from a compact table"""
+        col = self.idCol if col is None else col
+        return self.ids[col][np.asarray(codes, dtype=np.int64)]
+
+    def encodeId(self, trackId, col: str = None) -> int:
+        """code of an original id, e.g., to look up a track in a compact table"""
+        col = self.idCol if col is None else col
+        code = pd.Index(self.ids[col]).get_indexer([trackId])[0]
+        if code < 0:
+            raise KeyError(f"{trackId} is not in the schema")
+        return int(code)
+
+    def toCsv(self, compactDf: pd.DataFrame, path: str, **kwargs):
+        """exports a compact table in the original representation"""
+        self.restore(compactDf).to_csv(path, index=False, **kwargs)
+
+    # endregion
+
+    # region report and persistence
+
+    def getMemoryReport(self) -> pd.DataFrame:
+        """bytes per column before and after the last compact"""
+        return self.memoryReport
+
+    def getSavedBytes(self) -> int:
+        return 0 if self.memoryReport is None else int(self.memoryReport["savedBytes"].sum())
+
+    def toDict(self) -> Dict[str, Any]:
+        """the conversions and the id codes, to restore tables compacted in another session"""
+        return {
+            "columns": {col: {"kind": column["kind"], "dtype": str(column["dtype"])} for col, column in self.columns.items()},
+            "ids": {col: ids.tolist() for col, ids in self.ids.items()},
+        }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.toDict(), f, indent=2, default=str)
+
+    def load(self, path: str) -> "TrackSchema":
+        with open(path) as f:
+            state = json.load(f)
+        self.columns = {col: {"kind": column["kind"], "dtype": pd.api.types.pandas_dtype(column["dtype"])} for col, column in state["columns"].items()}
+        self.ids = {col: np.asarray(ids, dtype=object) for col, ids in state["ids"].items()}
+        return self
+
+    # endregion
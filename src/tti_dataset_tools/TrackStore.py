@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+from typing import *
+
+
+class TrackStore:
+    """Tracks of a frame grouped once by (track, frame) with the start and end offset of every track, so a track is an O(1) slice instead of a boolean scan over the whole frame.
+
+    Tracks are kept in the order of appearance (same as unique()). If the frame is already grouped and ordered, it is used as is and track views share its memory. Otherwise the store keeps one sorted copy, so columns added to the original frame later are not visible through the store.
+    """
+
+    def __init__(self,
+            tracksDf: pd.DataFrame,
+            idCol: str,
+            frameCol: str = None
+        ):
+        """
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            idCol (str): track id column
+            frameCol (str, optional): rows of a track are ordered by this column. Rows keep their order if None or missing.
+        """
+        self.idCol = idCol
+        self.frameCol = frameCol
+
+        codes, uniqueIds = pd.factorize(tracksDf[idCol])
+        if frameCol is not None and frameCol in tracksDf:
+            order = np.lexsort((tracksDf[frameCol].to_numpy(), codes))
+        else:
+            order = np.argsort(codes, kind="stable")
+
+        self.isSorted = bool(np.all(order == np.arange(len(order))))
+        self.df = tracksDf if self.isSorted else tracksDf.take(order)
+        self.order = order # position in the original frame of every row of self.df
+
+        self.sizes = np.bincount(codes, minlength=len(uniqueIds))
+        self.ends = np.cumsum(self.sizes)
+        self.starts = self.ends - self.sizes
+        self.ids = np.asarray(uniqueIds)
+        self.codes = np.repeat(np.arange(len(self.ids)), self.sizes) # track number of every row of self.df
+
+        self._positions = {trackId: i for i, trackId in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, trackId) -> bool:
+        return trackId in self._positions
+
+    def numRows(self) -> int:
+        return len(self.df)
+
+    def getPosition(self, trackId) -> int:
+        return self._positions[trackId]
+
+    def getTrack(self, trackId) -> pd.DataFrame:
+        return self.getTrackAt(self._positions[trackId])
+
+    def getTrackAt(self, position: int) -> pd.DataFrame:
+        return self.df.iloc[self.starts[position]:self.ends[position]]
+
+    def iterTracks(self) -> Iterator[Tuple[Any, pd.DataFrame]]:
+        """Yields (trackId, trackDf) without rescanning the frame"""
+        for position, trackId in enumerate(self.ids):
+            yield trackId, self.getTrackAt(position)
+
+    def column(self, col: str) -> np.ndarray:
+        """values of a column in store order"""
+        return self.df[col].to_numpy()
+
+    def first(self, col: str) -> np.ndarray:
+        """value of the first row of every track"""
+        return self.column(col)[self.starts]
+
+    def last(self, col: str) -> np.ndarray:
+        """value of the last row of every track"""
+        return self.column(col)[self.ends - 1]
+
+    def firstRows(self) -> pd.DataFrame:
+        return self.df.iloc[self.starts]
+
+    def lastRows(self) -> pd.DataFrame:
+        return self.df.iloc[self.ends - 1]
+
+    def broadcast(self, trackValues: np.ndarray) -> np.ndarray:
+        """repeats one value per track to all the rows of the track, in store order"""
+        return np.repeat(np.asarray(trackValues), self.sizes)
+
+    def toOriginalOrder(self, values: np.ndarray) -> np.ndarray:
+        """reorders values computed in store order to the row order of the original frame"""
+        if self.isSorted:
+            return values
+        values = np.asarray(values)
+        originalValues = np.empty_like(values)
+        originalValues[self.order] = values
+        return originalValues
+
+    def toSeries(self, values: np.ndarray, name: str = None) -> pd.Series:
+        """values in store order as a series aligned with the original frame index"""
+        return pd.Series(values, index=self.df.index, name=name)
@@ -0,0 +1,315 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from typing import *
+from shapely.geometry import box
+from .ColMapper import ColMapper
+from .TrajectoryProcessor import TrajectoryProcessor
+from .TrajectoryUtils import TrajectoryUtils
+from .TrajectoryTransformer import TrajectoryTransformer
+from .TrajectoryMetaBuilder import TrajectoryMetaBuilder
+from .InfluenceAnalyzer import InfluenceAnalyzer
+from .SyntheticTrackGenerator import SyntheticTrackGenerator
+from .TrackClass import TrackClass
+from .patterns.RegularKnotsModel import RegularKnotsModel
+
+
+class BenchmarkCase:
+    """A timed call. prepare builds the arguments of run from the generated tracks and is not timed."""
+
+    def __init__(self,
+            name: str,
+            prepare: Callable[[pd.DataFrame], Tuple],
+            run: Callable,
+            description: str = ""
+        ):
+        self.name = name
+        self.prepare = prepare
+        self.run = run
+        self.description = description
+
+
+class TrajectoryBenchmark(TrajectoryProcessor):
+    """
+    Times the hot paths on synthetic crosswalk recordings (see SyntheticTrackGenerator) of growing size and reports the throughput and the peak memory of every call. A report saved as a baseline is compared with later runs to catch regressions:
+
+        python -m tti_dataset_tools.TrajectoryBenchmark --tracks 1000 10000 --fps 25 --save-baseline benchmarks/baseline.json
+        python -m tti_dataset_tools.TrajectoryBenchmark --tracks 1000 10000 --fps 25 --baseline benchmarks/baseline.json
+
+    Timings depend on the machine, so a baseline is only comparable with runs on the machine (and environment) that saved it. Save one per machine, e.g., before starting a change; baselines are not committed.
+
+    Not imported by the package, so importing tti_dataset_tools does not load the benchmark and its CLI.
+
+    Time is the best of repeat runs. Peak memory is measured in one more run with tracemalloc (Python and NumPy allocations), so it does not slow the timed runs down.
+    """
+
+    reportColumns = ["benchmark", "size", "numTracks", "numRows", "fps", "seconds", "rowsPerSecond", "tracksPerSecond", "peakMemoryMB"]
+    keyColumns = ["benchmark", "size", "fps"] # size is the number of generated tracks, numTracks the tracks of the call (e.g., only pedestrians)
+
+    def __init__(self,
+            colMapper: ColMapper,
+            repeat: int = 3,
+            seed: int = 0
+        ):
+        super().__init__(colMapper)
+        self.repeat = repeat
+        self.seed = seed
+        self.roadWidth = 10
+        self.sceneLength = 60
+
+    def getColMapper(self, fps: float) -> ColMapper:
+        colMapper = copy.copy(self.colMapper)
+        colMapper.fps = fps
+        return colMapper
+
+    def getCases(self, fps: float) -> List[BenchmarkCase]:
+        colMapper = self.getColMapper(fps)
+        transformer = TrajectoryTransformer(colMapper)
+        metaBuilder = TrajectoryMetaBuilder(colMapper)
+        influenceAnalyzer = InfluenceAnalyzer(colMapper)
+        knotsModel = RegularKnotsModel(colMapper)
+
+        rect = box(-self.sceneLength / 4, -1, self.sceneLength / 4, self.roadWidth + 1)
+        yBreakpoints = [self.roadWidth / 4, self.roadWidth / 2, 3 * self.roadWidth / 4]
+        yTolerance = 1 / fps + 0.1 # a pedestrian walks at most 2.5 m/s
+
+        def withLocal(tracksDf: pd.DataFrame) -> pd.DataFrame:
+            tracksDf = tracksDf.copy()
+            transformer.translateAllToLocalSource(tracksDf)
+            return tracksDf
+
+        def withNorthPedestrians(tracksDf: pd.DataFrame) -> pd.DataFrame:
+            pedDf = withLocal(tracksDf[tracksDf["class"] == TrackClass.Pedestrian.value])
+            tracksMeta = metaBuilder.build([pedDf], self.localXCol, self.localYCol)
+            _, pedDf = transformer.convertTracksToNorth(pedDf, self.localXCol, self.localYCol, tracksMeta)
+            return pedDf
+
+        def withAxisVelocities(tracksDf: pd.DataFrame) -> pd.DataFrame:
+            tracksDf = tracksDf.copy()
+            transformer.deriveAxisVelocities(tracksDf)
+            return tracksDf
+
+        def withMeta(tracksDf: pd.DataFrame) -> Tuple:
+            tracksDf = withLocal(tracksDf)
+            tracksMeta = metaBuilder.build([tracksDf], self.localXCol, self.localYCol)
+            return tracksDf, self.localXCol, self.localYCol, tracksMeta
+
+        return [
+            BenchmarkCase(
+                "dfToSplinesForAll",
+                lambda df: (df, self.idCol, self.xCol, self.yCol),
+                TrajectoryUtils.dfToSplinesForAll,
+                "TrajectoryUtils.dfToSplines for every track"
+            ),
+            BenchmarkCase(
+                "clipAllByRect",
+                lambda df: (df, self.idCol, self.xCol, self.yCol, rect),
+                TrajectoryUtils.clipAllByRect,
+                "TrajectoryUtils.clipByRect for every track"
+            ),
+            BenchmarkCase(
+                "getVelocitySeriesForAll",
+                lambda df: (df, self.xCol),
+                transformer.getVelocitySeriesForAll
+            ),
+            BenchmarkCase(
+                "deriveSpeed",
+                lambda df: (withAxisVelocities(df),),
+                transformer.deriveSpeed
+            ),
+            BenchmarkCase(
+                "getInfluenceHeatMap",
+                lambda df: (withNorthPedestrians(df), (5, self.roadWidth + 2)),
+                influenceAnalyzer.getInfluenceHeatMap,
+                "pedestrians in local coordinates"
+            ),
+            BenchmarkCase(
+                "getKnotData",
+                lambda df: (withNorthPedestrians(df), yBreakpoints, yTolerance),
+                lambda pedDf, yBreakpoints, yTolerance: knotsModel.getKnotData(pedDf, yBreakpoints, yTolerance, plot=False, ignoreBads=True),
+                "pedestrians in local coordinates"
+            ),
+            BenchmarkCase(
+                "TrajectoryMetaBuilder.build",
+                lambda df: ([df], self.xCol, self.yCol),
+                metaBuilder.build
+            ),
+            BenchmarkCase(
+                "convertTracksToNorth",
+                withMeta,
+                transformer.convertTracksToNorth,
+                "local coordinates with a prebuilt meta"
+            ),
+        ]
+
+    # region measurement
+
+    def measure(self, case: BenchmarkCase, tracksDf: pd.DataFrame) -> Dict[str, float]:
+        """best time of repeat runs and the peak memory of one more run"""
+        args = case.prepare(tracksDf)
+        inputDfs = [args[0]] if isinstance(args[0], pd.DataFrame) else args[0]
+        numRows = sum(len(df) for df in inputDfs)
+        numTracks = sum(df[self.idCol].nunique() for df in inputDfs)
+
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            case.run(*args)
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            case.run(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        seconds = min(times)
+        return {
+            "benchmark": case.name,
+            "numTracks": numTracks,
+            "numRows": numRows,
+            "seconds": seconds,
+            "rowsPerSecond": numRows / seconds if seconds > 0 else np.inf,
+            "tracksPerSecond": numTracks / seconds if seconds > 0 else np.inf,
+            "peakMemoryMB": peak / 2 ** 20,
+        }
+
+    def run(self,
+            numTracksList: List[int] = [1000, 10000],
+            fpsList: List[float] = None,
+            names: List[str] = None
+        ) -> pd.DataFrame:
+        """
+        Args:
+            numTracksList (List[int], optional): sizes of the generated recordings. Defaults to [1000, 10000].
+            fpsList (List[float], optional): Defaults to the ColMapper fps.
+            names (List[str], optional): benchmarks to run, all if None. Defaults to None.
+
+        Returns:
+            pd.DataFrame: one row per benchmark, size and fps with the reportColumns. size is the number of generated tracks.
+        """
+        fpsList = [self.fps] if fpsList is None else fpsList
+        rows = []
+        for fps in fpsList:
+            cases = [case for case in self.getCases(fps) if names is None or case.name in names]
+            for numTracks in numTracksList:
+                generator = SyntheticTrackGenerator(self.getColMapper(fps), seed=self.seed, roadWidth=self.roadWidth, sceneLength=self.sceneLength)
+                tracksDf = generator.generate(numTracks)
+                logging.info(f"TrajectoryBenchmark: {numTracks} tracks, {len(tracksDf)} rows at {fps} fps")
+                for case in cases:
+                    result = self.measure(case, tracksDf)
+                    result["size"] = numTracks
+                    result["fps"] = fps
+                    rows.append(result)
+                    logging.info(f"TrajectoryBenchmark: {case.name} {result['seconds']:.3f}s")
+                del tracksDf
+
+        return pd.DataFrame(rows, columns=self.reportColumns)
+
+    # endregion
+
+    # region baseline
+
+    @staticmethod
+    def getEnvironment() -> Dict[str, str]:
+        return {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        }
+
+    @staticmethod
+    def saveBaseline(report: pd.DataFrame, path: str):
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "environment": TrajectoryBenchmark.getEnvironment(),
+                "results": report.to_dict(orient="records"),
+            }, f, indent=2)
+
+    @staticmethod
+    def loadBaseline(path: str) -> pd.DataFrame:
+        with open(path) as f:
+            return pd.DataFrame(json.load(f)["results"])
+
+    @staticmethod
+    def compare(report: pd.DataFrame, baseline: pd.DataFrame, tolerance: float = 0.2, minSeconds: float = 0.01, minMemoryMB: float = 1) -> pd.DataFrame:
+        """
+        Joins the report with the baseline runs of the same benchmark, size and fps.
+
+        Args:
+            tolerance (float, optional): a run slower than the baseline by more than this fraction is a regression, faster by more is an improvement. Defaults to 0.2.
+            minSeconds (float, optional): time differences of calls faster than this in both runs are noise and not compared. Defaults to 0.01.
+            minMemoryMB (float, optional): memory differences of calls with a smaller peak in both runs are noise and not compared. Defaults to 1.
+
+        Returns:
+            pd.DataFrame: the report with baselineSeconds, baselinePeakMemoryMB, timeRatio (run / baseline), memoryRatio and status (ok, regression, improvement or new)
+        """
+        baseline = baseline[TrajectoryBenchmark.keyColumns + ["seconds", "peakMemoryMB"]].rename(columns={
+            "seconds": "baselineSeconds",
+            "peakMemoryMB": "baselinePeakMemoryMB",
+        })
+        compared = report.merge(baseline, on=TrajectoryBenchmark.keyColumns, how="left")
+        compared["timeRatio"] = compared["seconds"] / compared["baselineSeconds"]
+        compared["memoryRatio"] = compared["peakMemoryMB"] / compared["baselinePeakMemoryMB"]
+
+        timed = (compared["seconds"] >= minSeconds) | (compared["baselineSeconds"] >= minSeconds)
+        measured = (compared["peakMemoryMB"] >= minMemoryMB) | (compared["baselinePeakMemoryMB"] >= minMemoryMB)
+        compared["status"] = "ok"
+        compared.loc[(timed & (compared["timeRatio"] > 1 + tolerance)) | (measured & (compared["memoryRatio"] > 1 + tolerance)), "status"] = "regression"
+        compared.loc[(compared["status"] == "ok") & timed & (compared["timeRatio"] < 1 / (1 + tolerance)), "status"] = "improvement"
+        compared.loc[compared["baselineSeconds"].isna(), "status"] = "new"
+        return compared
+
+    # endregion
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks the trajectory hot paths on synthetic tracks")
+    parser.add_argument("--tracks", type=int, nargs="+", default=[1000, 10000], help="number of tracks, e.g., 1000 10000 100000 1000000")
+    parser.add_argument("--fps", type=float, nargs="+", default=[25])
+    parser.add_argument("--benchmarks", nargs="+", default=None, help="names of the benchmarks to run, all by default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=None, help="baseline json saved on this machine to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="time differences of faster calls are not compared")
+    parser.add_argument("--min-memory-mb", type=float, default=1, help="memory differences of calls with a smaller peak are not compared")
+    parser.add_argument("--save-baseline", default=None, help="saves the report as a baseline json")
+    parser.add_argument("--csv", default=None, help="saves the report as csv")
+    args = parser.parse_args(argv)
+
+    colMapper = ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", args.fps[0])
+    benchmark = TrajectoryBenchmark(colMapper, repeat=args.repeat, seed=args.seed)
+    report = benchmark.run(args.tracks, args.fps, args.benchmarks)
+
+    if args.baseline is not None:
+        report = TrajectoryBenchmark.compare(report, TrajectoryBenchmark.loadBaseline(args.baseline), args.tolerance, args.min_seconds, args.min_memory_mb)
+    if args.save_baseline is not None:
+        TrajectoryBenchmark.saveBaseline(report[TrajectoryBenchmark.reportColumns], args.save_baseline)
+    if args.csv is not None:
+        report.to_csv(args.csv, index=False)
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+    if "status" in report and (report["status"] == "regression").any():
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import *
+from .ColMapper import ColMapper
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    pyarrow = None
+
+
+class TrajectoryCache:
+    """On-disk cache of raw and derived tracks tables in a columnar format, so a session starts from the binary tables instead of re-reading the CSVs and re-running the transformers.
+
+    A cached table is found by a key made of the fingerprints of its source files (path, size and modification time), the ColMapper settings and the processing parameters. Changing any of them misses the cache and recomputes. Tables are stored column by column, so a load reads only the requested columns.
+
+    Parquet is used if pyarrow is installed, npz otherwise. Feather can be chosen explicitly.
+    """
+
+    formats = ["parquet", "feather", "npz"]
+
+    def __init__(self,
+            cacheDir: str,
+            colMapper: ColMapper = None,
+            fmt: str = None
+        ):
+        """
+        Args:
+            cacheDir (str): directory of the cached tables. Created if missing.
+            colMapper (ColMapper, optional): its settings are part of every key. Defaults to None.
+            fmt (str, optional): parquet, feather or npz. Defaults to parquet if pyarrow is installed, npz otherwise.
+        """
+        if fmt is None:
+            fmt = "npz" if pyarrow is None else "parquet"
+        if fmt not in self.formats:
+            raise ValueError(f"fmt must be one of {self.formats}, got {fmt}")
+        if fmt != "npz" and pyarrow is None:
+            raise ImportError(f"{fmt} cache needs pyarrow. Install it or use fmt='npz'")
+
+        self.cacheDir = cacheDir
+        self.colMapper = colMapper
+        self.fmt = fmt
+        os.makedirs(cacheDir, exist_ok=True)
+
+    @staticmethod
+    def getFingerprint(path: str) -> Dict[str, Any]:
+        stat = os.stat(path)
+        return {
+            "path": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns
+        }
+
+    @staticmethod
+    def getColMapperSettings(colMapper: Optional[ColMapper]) -> Dict[str, Any]:
+        if colMapper is None:
+            return {}
+        return dict(sorted(vars(colMapper).items()))
+
+    def getKey(self,
+            name: str,
+            sources: List[str] = None,
+            params: Dict[str, Any] = None
+        ) -> str:
+        """
+        Args:
+            name (str): name of the table, e.g., "pedDf"
+            sources (List[str], optional): files the table is computed from. Defaults to None.
+            params (Dict[str, Any], optional): processing parameters. Values must be json serializable or have a stable str. Defaults to None.
+
+        Returns:
+            str: key of the table
+        """
+        content = {
+            "name": name,
+            "sources": [self.getFingerprint(source) for source in (sources or [])],
+            "colMapper": self.getColMapperSettings(self.colMapper),
+            "params": params or {}
+        }
+        digest = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return f"{self.getSafeName(name)}-{digest}"
+
+    @staticmethod
+    def getSafeName(name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", str(name))
+
+    def getPath(self, key: str) -> str:
+        return os.path.join(self.cacheDir, f"{key}.{self.fmt}")
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self.getPath(key))
+
+    def save(self, key: str, df: pd.DataFrame) -> str:
+        """writes the table under the key. The file is written next to its final path and renamed, so an interrupted save never leaves a broken table behind."""
+        path = self.getPath(key)
+        tmpPath = f"{path}.tmp"
+        if self.fmt == "parquet":
+            df.to_parquet(tmpPath, engine="pyarrow", index=True)
+        elif self.fmt == "feather":
+            indexNames = [f"__index{level}__{'' if name is None else name}" for level, name in enumerate(df.index.names)]
+            df.rename_axis(indexNames).reset_index().to_feather(tmpPath)
+        else:
+            with open(tmpPath, "wb") as f:
+                self._saveNpz(f, df)
+        os.replace(tmpPath, path)
+        return path
+
+    def load(self, key: str, columns: List[str] = None) -> Optional[pd.DataFrame]:
+        """reads the table, or only the given columns of it. None if the key is not cached."""
+        path = self.getPath(key)
+        if not os.path.exists(path):
+            return None
+        if self.fmt == "parquet":
+            return pd.read_parquet(path, engine="pyarrow", columns=columns)
+        if self.fmt == "feather":
+            return self._loadFeather(path, columns)
+        return self._loadNpz(path, columns)
+
+    def getOrCompute(self,
+            name: str,
+            compute: Callable[[], pd.DataFrame],
+            sources: List[str] = None,
+            params: Dict[str, Any] = None,
+            columns: List[str] = None
+        ) -> pd.DataFrame:
+        """Loads the table if it is cached, otherwise computes, saves and returns it.
+
+        Args:
+            name (str): name of the table
+            compute (Callable[[], pd.DataFrame]): builds the table on a miss
+            sources (List[str], optional): files the table is computed from. Defaults to None.
+            params (Dict[str, Any], optional): processing parameters. Defaults to None.
+            columns (List[str], optional): columns to return. All if None. Defaults to None.
+
+        Returns:
+            pd.DataFrame: the table, or only the given columns of it
+        """
+        key = self.getKey(name, sources, params)
+        df = self.load(key, columns)
+        if df is not None:
+            return df
+
+        df = compute()
+        self.save(key, df)
+        return df if columns is None else df[columns]
+
+    def readCsv(self,
+            path: str,
+            columns: List[str] = None,
+            **readCsvKwargs
+        ) -> pd.DataFrame:
+        """pd.read_csv through the cache. The first read parses the CSV and stores all of its columns, later reads load only the given columns."""
+        name = os.path.splitext(os.path.basename(path))[0]
+        return self.getOrCompute(
+            name,
+            lambda: pd.read_csv(path, **readCsvKwargs),
+            sources=[path],
+            params={"readCsv": readCsvKwargs},
+            columns=columns
+        )
+
+    def clear(self, name: str = None):
+        """removes the cached tables, or only the ones of a name"""
+        for fileName in os.listdir(self.cacheDir):
+            if not fileName.endswith(f".{self.fmt}"):
+                continue
+            if name is not None and not fileName.startswith(f"{self.getSafeName(name)}-"):
+                continue
+            os.remove(os.path.join(self.cacheDir, fileName))
+
+    def _loadFeather(self, path: str, columns: List[str] = None) -> pd.DataFrame:
+        allColumns = pyarrow.feather.read_table(path, memory_map=True).column_names # mapped, nothing is read
+        indexNames = [name for name in allColumns if name.startswith("__index")]
+        if columns is not None:
+            columns = indexNames + [col for col in columns if col not in indexNames]
+        df = pd.read_feather(path, columns=columns)
+        if len(indexNames) > 0:
+            df = df.set_index(indexNames)
+            df.index.names = [re.sub(r"^__index\d+__", "", name) or None for name in df.index.names]
+        return df
+
+    @staticmethod
+    def _saveNpz(f, df: pd.DataFrame):
+        """one array per column. Categoricals are stored as codes and categories, other object columns are pickled."""
+        arrays = {
+            "__columns__": np.asarray(df.columns, dtype=object),
+            "__index__": df.index.to_numpy(),
+            "__indexName__": np.asarray([df.index.name], dtype=object),
+        }
+        for i, col in enumerate(df.columns):
+            values = df.iloc[:, i]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                arrays[f"codes{i}"] = values.cat.codes.to_numpy()
+                arrays[f"categories{i}"] = values.cat.categories.to_numpy()
+                arrays[f"ordered{i}"] = np.asarray(values.cat.ordered)
+            else:
+                arrays[f"values{i}"] = values.to_numpy()
+        np.savez(f, **arrays)
+
+    @staticmethod
+    def _loadNpz(path: str, columns: List[str] = None) -> pd.DataFrame:
+        with np.load(path, allow_pickle=True) as data:
+            allColumns = data["__columns__"].tolist()
+            if columns is None:
+                columns = allColumns
+            positions = {col: i for i, col in enumerate(allColumns)}
+            missing = [col for col in columns if col not in positions]
+            if len(missing) > 0:
+                raise KeyError(f"columns {missing} are not in the cached table")
+
+            index = pd.Index(data["__index__"], name=data["__indexName__"][0])
+            loaded = {}
+            for col in columns:
+                i = positions[col]
+                if f"codes{i}" in data.files:
+                    dtype = pd.CategoricalDtype(data[f"categories{i}"], ordered=bool(data[f"ordered{i}"]))
+                    loaded[col] = pd.Categorical.from_codes(data[f"codes{i}"], dtype=dtype)
+                else:
+                    loaded[col] = data[f"values{i}"]
+            return pd.DataFrame(loaded, index=index, columns=columns)
@@ -1,9 +1,43 @@
 import numpy as np
 import pandas as pd
+from typing import *
 from .ColMapper import ColMapper
 from .TrajectoryProcessor import TrajectoryProcessor
+from .QuantileSketch import QuantileSketch
 import logging
 
+
+class CleaningCriterion:
+    """
+    Bounds on a per-track aggregate of a column. A track is rejected if its aggregate is below lower or above upper. 
+    With byIQR, the bounds are Q1 - 1.5 IQR and Q3 + 1.5 IQR of the aggregates of all the tracks instead.
+    """
+
+    def __init__(self,
+            name: str,
+            col: str,
+            agg: str = "max",
+            lower: float = None,
+            upper: float = None,
+            byIQR: bool = False
+        ):
+
+        if not byIQR and lower is None and upper is None:
+            raise ValueError(f"criterion {name} needs a bound or byIQR")
+        
+        self.name = name
+        self.col = col
+        self.agg = agg
+        self.lower = lower
+        self.upper = upper
+        self.byIQR = byIQR
+
+    def __repr__(self) -> str:
+        if self.byIQR:
+            return f"CleaningCriterion({self.name}: {self.agg}({self.col}) by IQR)"
+        return f"CleaningCriterion({self.name}: {self.lower} <= {self.agg}({self.col}) <= {self.upper})"
+
+
 class TrajectoryCleaner(TrajectoryProcessor):
 
     def __init__(self,
@@ -25,22 +59,41 @@ class TrajectoryCleaner(TrajectoryProcessor):
 
     #region outliers
     
+    def getIQRBounds(self,
+            values: Union[pd.Series, QuantileSketch]
+        ) -> Tuple[float, float]:
+        """
+        Args:
+            values (Union[pd.Series, QuantileSketch]): in-memory values, or a sketch fed with the values of the whole dataset
+        """
+
+        if isinstance(values, QuantileSketch):
+            Q1, Q3 = values.quantiles([0.25, 0.75])
+        else:
+            Q3 = np.quantile(values, 0.75)
+            Q1 = np.quantile(values, 0.25)
+        IQR = Q3 - Q1
+        lowerBoundary = Q1 - 1.5 * IQR
+        higherBoundary = Q3 + 1.5 * IQR
+
+        logging.info("IQR value is: %s" % IQR)
+        return lowerBoundary, higherBoundary
+    
 
     def getOutliersByCol(self, 
             summary: pd.DataFrame,
             col: str,
             byIQR=False,
-            returnVals=False
+            returnVals=False,
+            sketch: QuantileSketch = None
         ) -> pd.Series:
+        """
+        Args:
+            sketch (QuantileSketch, optional): IQR bounds are taken from this sketch instead of the summary, e.g. to use dataset-wide bounds on a single recording. Defaults to None.
+        """
 
         if byIQR:
-            Q3 = np.quantile(summary[col], 0.75)
-            Q1 = np.quantile(summary[col], 0.25)
-            IQR = Q3 - Q1
-            lowerBoundary = Q1 - 1.5 * IQR
-            higherBoundary = Q3 + 1.5 * IQR
-
-            logging.info("IQR value for column %s is: %s" % (col, IQR))
+            lowerBoundary, higherBoundary = self.getIQRBounds(summary[col] if sketch is None else sketch)
             logging.info(f"getOutliersByCol: using range ({lowerBoundary}, {higherBoundary})")
             
 
@@ -48,8 +101,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
             raise NotImplementedError("Not implemented non IQR yet")
 
 
-        criterion = summary[col].map(
-            lambda val: val < lowerBoundary or val > higherBoundary)
+        criterion = (summary[col] < lowerBoundary) | (summary[col] > higherBoundary)
 
         outliers = summary[criterion]
 
@@ -76,13 +128,14 @@ class TrajectoryCleaner(TrajectoryProcessor):
             tracksDf:pd.DataFrame, 
             col: str,
             byIQR=False,
-            returnVals=False
+            returnVals=False,
+            sketch: QuantileSketch = None
         ) -> pd.Series:
 
 
         maxVals = tracksDf[[self.idCol, col]].groupby([self.idCol]).max()
 
-        return self.getOutliersByCol(summary=maxVals, col=col, byIQR=byIQR, returnVals=returnVals)
+        return self.getOutliersByCol(summary=maxVals, col=col, byIQR=byIQR, returnVals=returnVals, sketch=sketch)
 
 
     def getOutliersBySpeed(self,
@@ -104,8 +157,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
         else:
             logging.info(f"getOutliersBySpeed: using range ({self.minSpeed}, {self.maxSpeed})")
             maxVals = tracksDf[[self.idCol, self.speedCol]].groupby([self.idCol]).max()
-            criterion = maxVals[self.speedCol].map(
-                lambda val: val < self.minSpeed or val > self.maxSpeed)
+            criterion = (maxVals[self.speedCol] < self.minSpeed) | (maxVals[self.speedCol] > self.maxSpeed)
 
             outliers = maxVals[criterion]
 
@@ -124,7 +176,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
         if byIQR:
             return self.getMaxOutliersByCol(
                 tracksDf,
-                col = self.displacementY,
+                col = self.displacementYCol,
                 byIQR=byIQR,
                 returnVals=returnVals
             )
@@ -135,8 +187,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
             col = self.displacementYCol
 
             maxVals = tracksDf[[self.idCol, col]].groupby([self.idCol]).max()
-            criterion = maxVals[col].map(
-                lambda val: val < self.minYDisplacement)
+            criterion = maxVals[col] < self.minYDisplacement
 
             outliers = maxVals[criterion]
 
@@ -155,7 +206,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
         if byIQR:
             return self.getMaxOutliersByCol(
                 tracksDf,
-                col = self.displacementY,
+                col = self.displacementXCol,
                 byIQR=byIQR,
                 returnVals=returnVals
             )
@@ -164,8 +215,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
         else:
             print(f"using max X displacement ({self.maxXDisplacement})")
             maxVals = tracksDf[[self.idCol, self.displacementXCol]].groupby([self.idCol]).max()
-            criterion = maxVals[self.displacementXCol].map(
-                lambda val: val > self.maxXDisplacement)
+            criterion = maxVals[self.displacementXCol] > self.maxXDisplacement
 
             outliers = maxVals[criterion]
 
@@ -185,8 +235,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
             tracksDf, 
             byIQR
         )
-        criterion = tracksDf[self.idCol].map(
-            lambda trackId: trackId not in outlierIds)
+        criterion = ~tracksDf[self.idCol].isin(outlierIds)
         
         return tracksDf[criterion].copy()
 
@@ -200,8 +249,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
             tracksDf, 
             byIQR
         )
-        criterion = tracksDf[self.idCol].map(
-            lambda trackId: trackId not in outlierIds)
+        criterion = ~tracksDf[self.idCol].isin(outlierIds)
         
         return tracksDf[criterion].copy()
     
@@ -214,8 +262,7 @@ class TrajectoryCleaner(TrajectoryProcessor):
             tracksDf, 
             byIQR
         )
-        criterion = tracksDf[self.idCol].map(
-            lambda trackId: trackId not in outlierIds)
+        criterion = ~tracksDf[self.idCol].isin(outlierIds)
         
         return tracksDf[criterion].copy()
 
@@ -225,19 +272,170 @@ class TrajectoryCleaner(TrajectoryProcessor):
             tracksDf:pd.DataFrame, 
             col:str,
             byIQR=False,
+            sketch: QuantileSketch = None
         ) -> pd.DataFrame:
 
         outlierIds = self.getMaxOutliersByCol(
             tracksDf,
             col=col,
-            byIQR=byIQR
+            byIQR=byIQR,
+            sketch=sketch
         )
-        criterion = tracksDf[self.idCol].map(
-            lambda trackId: trackId not in outlierIds)
+        criterion = ~tracksDf[self.idCol].isin(outlierIds)
         
         return tracksDf[criterion].copy()
     
     #endregion
+
+    #region cleaning plan
+
+    def getDefaultCriteria(self,
+            byIQR=False
+        ) -> List[CleaningCriterion]:
+        """Same criteria as cleanBySpeed, cleanByYDisplacement and cleanByXDisplacement"""
+
+        if byIQR:
+            return [
+                CleaningCriterion("speed", self.speedCol, "max", byIQR=True),
+                CleaningCriterion("yDisplacement", self.displacementYCol, "max", byIQR=True),
+                CleaningCriterion("xDisplacement", self.displacementXCol, "max", byIQR=True),
+            ]
+
+        return [
+            CleaningCriterion("speed", self.speedCol, "max", lower=self.minSpeed, upper=self.maxSpeed),
+            CleaningCriterion("yDisplacement", self.displacementYCol, "max", lower=self.minYDisplacement),
+            CleaningCriterion("xDisplacement", self.displacementXCol, "max", upper=self.maxXDisplacement),
+        ]
+
+    def getTrackSummary(self,
+            tracksDf: pd.DataFrame,
+            criteria: List[CleaningCriterion]
+        ) -> pd.DataFrame:
+        """All the per-track aggregates of the criteria in one groupby, one column per criterion name"""
+
+        names = [criterion.name for criterion in criteria]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if len(duplicates) > 0:
+            raise ValueError(f"criterion names must be unique, found {duplicates} more than once")
+        aggregations = {criterion.name: (criterion.col, criterion.agg) for criterion in criteria}
+        return tracksDf.groupby(self.idCol, sort=False).agg(**aggregations)
+
+    def getCriterionBounds(self,
+            summary: pd.DataFrame,
+            criterion: CleaningCriterion,
+            sketch: QuantileSketch = None
+        ) -> Tuple[float, float]:
+
+        if criterion.byIQR:
+            return self.getIQRBounds(summary[criterion.name] if sketch is None else sketch)
+        
+        lower = -np.inf if criterion.lower is None else criterion.lower
+        upper = np.inf if criterion.upper is None else criterion.upper
+        return lower, upper
+
+    def updateSketches(self,
+            tracksDf: pd.DataFrame,
+            criteria: List[CleaningCriterion],
+            sketches: Dict[str, QuantileSketch] = None,
+            k: int = 200
+        ) -> Dict[str, QuantileSketch]:
+        """
+        Feeds the per-track aggregates of the IQR criteria to one sketch per criterion. Call it on every chunk of an out-of-core dataset and merge the sketches of different workers with QuantileSketch.merge. A track must not be split across chunks, e.g. use one chunk per recording.
+
+        Args:
+            tracksDf (pd.DataFrame): a chunk of whole tracks
+            criteria (List[CleaningCriterion]): criteria
+            sketches (Dict[str, QuantileSketch], optional): sketches by criterion name to update. Defaults to new sketches.
+            k (int, optional): accuracy of new sketches. Defaults to 200.
+
+        Returns:
+            Dict[str, QuantileSketch]: sketches by criterion name
+        """
+        if sketches is None:
+            sketches = {}
+        
+        iqrCriteria = [criterion for criterion in criteria if criterion.byIQR]
+        if len(iqrCriteria) == 0:
+            return sketches
+
+        summary = self.getTrackSummary(tracksDf, iqrCriteria)
+        for criterion in iqrCriteria:
+            if criterion.name not in sketches:
+                sketches[criterion.name] = QuantileSketch(k)
+            sketches[criterion.name].update(summary[criterion.name].to_numpy())
+        
+        return sketches
+
+    def getRejections(self,
+            tracksDf: pd.DataFrame,
+            criteria: List[CleaningCriterion],
+            sketches: Dict[str, QuantileSketch] = None
+        ) -> pd.DataFrame:
+        """
+        Evaluates all the criteria together on one summary.
+
+        Args:
+            sketches (Dict[str, QuantileSketch], optional): dataset-wide sketches by criterion name from updateSketches. IQR bounds of these criteria come from the sketches instead of tracksDf. Defaults to None.
+
+        Returns:
+            pd.DataFrame: one row per (rejected track, failed criterion) with the aggregate value and the bounds
+        """
+        if len(criteria) == 0:
+            return pd.DataFrame({
+                self.idCol: pd.Series(dtype=tracksDf[self.idCol].dtype),
+                "criterion": pd.Series(dtype=object),
+                "col": pd.Series(dtype=object),
+                "value": pd.Series(dtype=float),
+                "lowerBound": pd.Series(dtype=float),
+                "upperBound": pd.Series(dtype=float),
+            })
+
+        summary = self.getTrackSummary(tracksDf, criteria)
+
+        rejections = []
+        for criterion in criteria:
+            lower, upper = self.getCriterionBounds(summary, criterion, None if sketches is None else sketches.get(criterion.name))
+            logging.info(f"{criterion}: using range ({lower}, {upper})")
+            values = summary[criterion.name]
+            failed = values[(values < lower) | (values > upper)]
+            rejections.append(pd.DataFrame({
+                self.idCol: failed.index,
+                "criterion": criterion.name,
+                "col": criterion.col,
+                "value": failed.to_numpy(),
+                "lowerBound": lower,
+                "upperBound": upper,
+            }))
+
+        return pd.concat(rejections, ignore_index=True)
+
+    def cleanByCriteria(self,
+            tracksDf: pd.DataFrame,
+            criteria: List[CleaningCriterion] = None,
+            byIQR=False,
+            sketches: Dict[str, QuantileSketch] = None
+        ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Cleans by all the criteria with one mask and one copy.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            criteria (List[CleaningCriterion], optional): Defaults to getDefaultCriteria(byIQR).
+            sketches (Dict[str, QuantileSketch], optional): dataset-wide sketches for the IQR bounds. Defaults to None.
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: cleaned tracks and the rejections from getRejections
+        """
+        if criteria is None:
+            criteria = self.getDefaultCriteria(byIQR)
+        
+        rejections = self.getRejections(tracksDf, criteria, sketches)
+        logging.info(f"cleanByCriteria: rejected {rejections[self.idCol].nunique()} tracks")
+
+        criterion = ~tracksDf[self.idCol].isin(rejections[self.idCol].unique())
+        return tracksDf[criterion].copy(), rejections
+
+    #endregion
         
 
 
@@ -1,10 +1,14 @@
 import pandas as pd
+import numpy as np
 from typing import *
 import math
+from concurrent.futures import ProcessPoolExecutor
 from .ColMapper import ColMapper
 from .TrajectoryProcessor import TrajectoryProcessor
 from .TrajectoryUtils import TrajectoryUtils
+from .TrackParallel import byTrackChunks
 from .TrackClass import TrackClass
+from .TrackDirection import TrackDirection
 
 class TrajectoryMetaBuilder(TrajectoryProcessor):
 
@@ -30,36 +34,58 @@ class TrajectoryMetaBuilder(TrajectoryProcessor):
         if len(tracksDf) == 0:
             return meta
 
-        ids = tracksDf[self.idCol].unique()
+        # first and last rows from the track offsets instead of a slice per track
+        store = self.getTrackStore(tracksDf)
+        numTracks = len(store)
 
-        for trackId in ids:
-            trackDf = tracksDf[tracksDf[self.idCol] == trackId]
-            # print(trackId, len(trackDf))
-            firstRow = trackDf.iloc[0]
-            lastRow = trackDf.iloc[-1]
+        verticalDirections = np.where(
+            store.first(yCol) > store.last(yCol), 
+            TrackDirection.SOUTH.value, 
+            TrackDirection.NORTH.value
+        )
+        horizontalDirections = np.where(
+            store.first(xCol) > store.last(xCol), 
+            TrackDirection.WEST.value, 
+            TrackDirection.EAST.value
+        )
 
-            vert, hort = TrajectoryUtils.getTrack_VH_Directions(
-                trackDf, xCol, yCol)
-
-            meta[self.idCol].append(trackId)
-            meta["initialFrame"].append(firstRow["frame"])
-            meta["finalFrame"].append(lastRow["frame"])
-            meta["numFrames"].append(len(trackDf))
-            if "class" in trackDf:
-                meta["class"].append(firstRow["class"])
-            else:
-                meta["class"].append(TrackClass.Pedestrian.value)
-            meta["horizontalDirection"].append(hort.value)
-            meta["verticalDirection"].append(vert.value)
+        meta[self.idCol] = store.ids.tolist()
+        meta["initialFrame"] = store.first(self.frameCol).tolist()
+        meta["finalFrame"] = store.last(self.frameCol).tolist()
+        meta["numFrames"] = store.sizes.tolist()
+        if "class" in tracksDf:
+            meta["class"] = store.first("class").tolist()
+        else:
+            meta["class"] = [TrackClass.Pedestrian.value] * numTracks
+        meta["horizontalDirection"] = horizontalDirections.tolist()
+        meta["verticalDirection"] = verticalDirections.tolist()
 
         return meta
+
+    @byTrackChunks(rowwise=False)
+    def getMetaDf(self, tracksDf: pd.DataFrame, xCol: str, yCol: str) -> pd.DataFrame:
+        return pd.DataFrame(self.getMetaDictForTracks(tracksDf, xCol, yCol))
     
     def build(
             self,
             dfs: List[pd.DataFrame],
             xCol: str, 
-            yCol: str
+            yCol: str,
+            nJobs: int = 1
         ):
-        metas = [pd.DataFrame(self.getMetaDictForTracks(tracksDf, xCol, yCol)) for tracksDf in dfs]
+        """
+        Args:
+            dfs (List[pd.DataFrame]): tracks of every recording
+            nJobs (int, optional): recordings are processed on a process pool if more than 1. The workers run serially whatever the nJobs of the builder. Defaults to 1.
+        """
+        if nJobs > 1 and len(dfs) > 1:
+            with ProcessPoolExecutor(max_workers=nJobs) as executor:
+                metas = list(executor.map(_buildMetaDf, [self.getSerialCopy()] * len(dfs), dfs, [xCol] * len(dfs), [yCol] * len(dfs)))
+        else:
+            metas = [self.getMetaDf(tracksDf, xCol, yCol) for tracksDf in dfs]
         return pd.concat(metas, ignore_index=True)
-        
+
+
+def _buildMetaDf(builder: TrajectoryMetaBuilder, tracksDf: pd.DataFrame, xCol: str, yCol: str) -> pd.DataFrame:
+    """worker of TrajectoryMetaBuilder.build"""
+    return builder.getMetaDf(tracksDf, xCol, yCol)
@@ -0,0 +1,255 @@
+import hashlib
+import pandas as pd
+import numpy as np
+from typing import *
+from shapely.geometry import Polygon
+from .ColMapper import ColMapper
+from .TrackStore import TrackStore
+from .TrajectoryProcessor import TrajectoryProcessor
+from .TrajectoryTransformer import TrajectoryTransformer
+from .TrajectoryCleaner import TrajectoryCleaner, CleaningCriterion
+from .TrajectoryUtils import TrajectoryUtils
+import logging
+
+
+class PipelineStage:
+    """
+    A step of a TrajectoryPipeline. Stages that only add columns per track (fused) share one grouped TrackStore, so a run of them sorts the tracks once and writes no intermediate copy.
+    """
+
+    def __init__(self,
+            name: str,
+            kind: str,
+            params: Dict[str, Any] = None,
+            fused: bool = False
+        ):
+        self.name = name
+        self.kind = kind
+        self.params = {} if params is None else params
+        self.fused = fused
+
+    def getSignature(self) -> Tuple:
+        return (self.name, self.kind, tuple(sorted((key, self.getParamSignature(value)) for key, value in self.params.items())))
+
+    @staticmethod
+    def getParamSignature(value) -> Any:
+        if isinstance(value, Polygon):
+            return value.wkt
+        if isinstance(value, (list, tuple)):
+            return tuple(PipelineStage.getParamSignature(item) for item in value)
+        if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+            return ("object", id(value)) # only the same object hits
+        return repr(value)
+
+    def __repr__(self) -> str:
+        return f"PipelineStage({self.name}: {self.kind} {self.params})"
+
+
+class TrajectoryPipeline(TrajectoryProcessor):
+    """
+    The standard preprocessing flow declared once and run in one call:
+
+        pipeline = TrajectoryPipeline(colMapper)
+        pipeline.clip(rect).translateToLocalSource().deriveAxisVelocities().deriveSpeed().smoothenSpeed()
+        pipeline.deriveDisplacements().clean(minSpeed, maxSpeed, minYDisplacement, maxXDisplacement).convertToNorth()
+        cleanDf = pipeline.run(tracksDf)
+
+    Consecutive derivation stages run on one grouped TrackStore. The output of every stage is memoized by the input, the stages before it and their parameters, so after setParams on a late stage (e.g., the cleaner bounds), run only recomputes from that stage. The input is identified by a hash of its content, so a frame edited in place runs again; pass inputKey to run to skip the hashing. Stages never write into their input, so memoized frames share the data of the stages before them; run returns a copy, so changes to the output never reach the memo.
+
+    The output rows are grouped by track and ordered by frame.
+    """
+
+    def __init__(self,
+            colMapper: ColMapper
+        ):
+
+        super().__init__(colMapper)
+        self.transformer = TrajectoryTransformer(colMapper)
+        self.stages: List[PipelineStage] = []
+        self.results: Dict[str, Any] = {} # extra outputs of the last run by stage name, e.g., rejections of the cleaner
+        self.clearMemo()
+
+    def clearMemo(self):
+        self._memoInput = None # key or fingerprint of the input of the memoized stages
+        self._memo: Dict[Tuple, Tuple[pd.DataFrame, Any]] = {}
+
+    # region declaration
+
+    def addStage(self, kind: str, params: Dict[str, Any], fused: bool = False, name: str = None) -> "TrajectoryPipeline":
+        name = kind if name is None else name
+        if name in [stage.name for stage in self.stages]:
+            raise ValueError(f"the pipeline already has a stage named {name}")
+        self.stages.append(PipelineStage(name, kind, params, fused))
+        return self
+
+    def getStage(self, name: str) -> PipelineStage:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(f"no stage named {name}")
+
+    def setParams(self, name: str, **params) -> "TrajectoryPipeline":
+        """updates the parameters of a stage. The memoized outputs of the stages before it stay valid."""
+        self.getStage(name).params.update(params)
+        return self
+
+    def clip(self, rect: Polygon, withSplits: bool = False, name: str = None) -> "TrajectoryPipeline":
+        """clips the tracks to the scene rectangle, see TrajectoryUtils.clipAllByRect"""
+        return self.addStage("clip", {"rect": rect, "withSplits": withSplits}, name=name)
+
+    def translateToLocalSource(self, name: str = None) -> "TrajectoryPipeline":
+        return self.addStage("translateToLocalSource", {}, fused=True, name=name)
+
+    def deriveAxisVelocities(self, name: str = None) -> "TrajectoryPipeline":
+        return self.addStage("deriveAxisVelocities", {}, fused=True, name=name)
+
+    def deriveSpeed(self, name: str = None) -> "TrajectoryPipeline":
+        return self.addStage("deriveSpeed", {}, fused=True, name=name)
+
+    def smoothenSpeed(self, targetFps: float = 2.5, name: str = None) -> "TrajectoryPipeline":
+        return self.addStage("smoothenSpeed", {"targetFps": targetFps}, fused=True, name=name)
+
+    def deriveDisplacements(self, localAxis: bool = False, name: str = None) -> "TrajectoryPipeline":
+        return self.addStage("deriveDisplacements", {"localAxis": localAxis}, fused=True, name=name)
+
+    def clean(self,
+            minSpeed: float = None,
+            maxSpeed: float = None,
+            minYDisplacement: float = None,
+            maxXDisplacement: float = None,
+            criteria: List[CleaningCriterion] = None,
+            byIQR: bool = False,
+            name: str = None
+        ) -> "TrajectoryPipeline":
+        """all the cleaner filters in one pass, see TrajectoryCleaner.cleanByCriteria. The rejections are in results[name]."""
+        return self.addStage("clean", {
+            "minSpeed": minSpeed,
+            "maxSpeed": maxSpeed,
+            "minYDisplacement": minYDisplacement,
+            "maxXDisplacement": maxXDisplacement,
+            "criteria": criteria,
+            "byIQR": byIQR,
+        }, name=name)
+
+    def convertToNorth(self, xCol: str = None, yCol: str = None, tracksMeta: pd.DataFrame = None, name: str = None) -> "TrajectoryPipeline":
+        """rotates SOUTH tracks, see TrajectoryTransformer.convertTracksToNorth. Defaults to the local axis. The rotated ids are in results[name]."""
+        return self.addStage("convertToNorth", {
+            "xCol": self.localXCol if xCol is None else xCol,
+            "yCol": self.localYCol if yCol is None else yCol,
+            "tracksMeta": tracksMeta,
+        }, name=name)
+
+    # endregion
+
+    # region execution
+
+    def run(self, tracksDf: pd.DataFrame, inputKey: Hashable = None) -> pd.DataFrame:
+        """Runs the stages on tracksDf, which is not modified. Stages memoized for the same input are not run again.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            inputKey (Hashable, optional): identifies the input instead of its fingerprint, e.g., a recording name and version. The caller must change it (or call clearMemo) when the data changes. Defaults to getFingerprint(tracksDf).
+
+        Returns:
+            pd.DataFrame: a copy of the output of the last stage
+        """
+        inputKey = ("fingerprint", self.getFingerprint(tracksDf)) if inputKey is None else ("key", inputKey)
+        if self._memoInput != inputKey:
+            self.clearMemo()
+            self._memoInput = inputKey
+
+        signatures = [stage.getSignature() for stage in self.stages]
+
+        # longest memoized prefix
+        df = tracksDf
+        start = 0
+        for i in range(len(self.stages), 0, -1):
+            key = tuple(signatures[:i])
+            if key in self._memo:
+                df = self._memo[key][0]
+                start = i
+                break
+        for i, stage in enumerate(self.stages[:start]):
+            self.results[stage.name] = self._memo[tuple(signatures[:i + 1])][1]
+
+        store = None
+        for i in range(start, len(self.stages)):
+            stage = self.stages[i]
+            if stage.fused:
+                if store is None:
+                    # one grouped store for the run of fused stages. A shallow copy, so new columns never reach the memoized input.
+                    store = TrackStore(df.copy(deep=False), self.idCol, self.frameCol)
+                self.runFusedStage(stage, store)
+                df = store.df
+                extra = None
+            else:
+                store = None
+                df, extra = self.runStage(stage, df)
+
+            logging.info(f"TrajectoryPipeline: {stage.name} done, {len(df)} rows")
+            self.results[stage.name] = extra
+            self._memo[tuple(signatures[:i + 1])] = (df.copy(deep=False), extra)
+
+        return df.copy() # the memo is not affected by changes to the output
+
+    @staticmethod
+    def getFingerprint(tracksDf: pd.DataFrame) -> Tuple:
+        """columns, dtypes and a hash of the index and the values of every row, in row order"""
+        rowHashes = pd.util.hash_pandas_object(tracksDf, index=True).to_numpy()
+        return (
+            tuple(tracksDf.columns),
+            tuple(str(dtype) for dtype in tracksDf.dtypes),
+            hashlib.sha1(rowHashes.tobytes()).hexdigest(),
+        )
+
+    def runFusedStage(self, stage: PipelineStage, store: TrackStore):
+        if stage.kind == "translateToLocalSource":
+            self.transformer.translateAllToLocalSource(store)
+        elif stage.kind == "deriveAxisVelocities":
+            self.transformer.deriveAxisVelocities(store)
+        elif stage.kind == "deriveSpeed":
+            self.transformer.deriveSpeed(store)
+        elif stage.kind == "smoothenSpeed":
+            self.transformer.smoothenSpeed(store, **stage.params)
+        elif stage.kind == "deriveDisplacements":
+            self.transformer.deriveDisplacements(store, **stage.params)
+        else:
+            raise ValueError(f"unknown fused stage {stage.kind}")
+
+    def runStage(self, stage: PipelineStage, tracksDf: pd.DataFrame) -> Tuple[pd.DataFrame, Any]:
+        """runs a stage that changes the rows. Returns the new frame and the extra output of the stage."""
+        params = stage.params
+        if stage.kind == "clip":
+            clippedDf = TrajectoryUtils.clipAllByRect(tracksDf, self.idCol, self.xCol, self.yCol, params["rect"], withSplits=params["withSplits"])
+            return clippedDf, None
+
+        if stage.kind == "clean":
+            cleaner = TrajectoryCleaner(self.colMapper, params["minSpeed"], params["maxSpeed"], params["minYDisplacement"], params["maxXDisplacement"])
+            criteria = params["criteria"]
+            if criteria is None:
+                criteria = self.getCleaningCriteria(cleaner, params)
+            if len(criteria) == 0:
+                return tracksDf, None
+            return cleaner.cleanByCriteria(tracksDf, criteria, params["byIQR"])
+
+        if stage.kind == "convertToNorth":
+            rotatedIds, convertedDf = self.transformer.convertTracksToNorth(tracksDf, params["xCol"], params["yCol"], params["tracksMeta"])
+            return convertedDf, rotatedIds
+
+        raise ValueError(f"unknown stage {stage.kind}")
+
+    def getCleaningCriteria(self, cleaner: TrajectoryCleaner, params: Dict[str, Any]) -> List[CleaningCriterion]:
+        """the default criteria of the cleaner, without the bounds that are not given"""
+        if params["byIQR"]:
+            return cleaner.getDefaultCriteria(byIQR=True)
+
+        criteria = []
+        if params["minSpeed"] is not None or params["maxSpeed"] is not None:
+            criteria.append(CleaningCriterion("speed", self.speedCol, "max", lower=params["minSpeed"], upper=params["maxSpeed"]))
+        if params["minYDisplacement"] is not None:
+            criteria.append(CleaningCriterion("yDisplacement", self.displacementYCol, "max", lower=params["minYDisplacement"]))
+        if params["maxXDisplacement"] is not None:
+            criteria.append(CleaningCriterion("xDisplacement", self.displacementXCol, "max", upper=params["maxXDisplacement"]))
+        return criteria
+
+    # endregion
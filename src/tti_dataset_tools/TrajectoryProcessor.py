@@ -1,7 +1,9 @@
+import copy
 import numpy as np
 import pandas as pd 
-from typing import List
+from typing import List, Union
 from .ColMapper import ColMapper
+from .TrackStore import TrackStore
 
 class TrajectoryProcessor:
 
@@ -26,17 +28,63 @@ class TrajectoryProcessor:
 
         self.verticalDirectionCol = colMapper.verticalDirectionCol
         self.horizontalDirectionCol = colMapper.horizontalDirectionCol
+
+        self.frameCol = colMapper.frameCol
+
+        self.xAccelerationCol = colMapper.xAccelerationCol
+        self.yAccelerationCol = colMapper.yAccelerationCol
+        self.accelerationCol = colMapper.accelerationCol
+        self.jerkCol = colMapper.jerkCol
+        self.headingCol = colMapper.headingCol
+        self.yawRateCol = colMapper.yawRateCol
+
+        # methods decorated with TrackParallel.byTrackChunks run on a process pool by track chunks if nJobs > 1
+        self.nJobs = 1
+        self.minParallelRows = 1_000_000
+
+    def setNJobs(self, 
+            nJobs: int, 
+            minParallelRows: int = None
+        ) -> "TrajectoryProcessor":
+        """
+        Args:
+            nJobs (int): worker processes for the per-track operations. 1 runs serially.
+            minParallelRows (int, optional): smaller frames run serially as the pool costs more than it saves. Defaults to the current value (1,000,000).
+        """
+        self.nJobs = nJobs
+        if minParallelRows is not None:
+            self.minParallelRows = minParallelRows
+        return self
+
+    def getSerialCopy(self) -> "TrajectoryProcessor":
+        """a shallow copy with nJobs = 1 to send to worker processes, so a worker does not start a pool of its own"""
+        processor = copy.copy(self)
+        processor.nJobs = 1
+        return processor
+
+    def getTrackStore(self,
+            tracksDf: Union[pd.DataFrame, TrackStore]
+        ) -> TrackStore:
+
+        if isinstance(tracksDf, TrackStore):
+            return tracksDf
+        return TrackStore(tracksDf, self.idCol, self.frameCol)
     
     def getIds(self, 
-            tracksDf:pd.DataFrame
+            tracksDf: Union[pd.DataFrame, TrackStore]
         ) -> List[int]:
 
+        if isinstance(tracksDf, TrackStore):
+            return list(tracksDf.ids)
         return list(tracksDf[self.idCol].unique())
     
     def getMeta(self,
-            tracksMeta: pd.DataFrame,
+            tracksMeta: Union[pd.DataFrame, TrackStore],
             trackId: int
         ) -> pd.Series:
+        """Pass the meta as a TrackStore to look up many tracks without scanning the meta table each time"""
 
+        if isinstance(tracksMeta, TrackStore):
+            return tracksMeta.getTrack(trackId).iloc[0]
         return tracksMeta[tracksMeta[self.idCol] == trackId].iloc[0]
 
@@ -0,0 +1,298 @@
+import functools
+import inspect
+import json
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from typing import *
+from .TrackStore import TrackStore
+from .TrajectoryProcessor import TrajectoryProcessor
+from .TrajectoryUtils import TrajectoryUtils
+
+
+class TrajectoryProfiler:
+    """
+    Records every call of the TrajectoryProcessor (and subclasses) and TrajectoryUtils methods made within it: wall time, rows and tracks of the tracks frame argument, DataFrame copies and peak memory.
+
+        with TrajectoryProfiler() as profiler:
+            with profiler.stage("clean"): # optional, groups the calls of a notebook step
+                cleaner.cleanByCriteria(tracksDf, criteria)
+            transformer.deriveSpeed(tracksDf)
+        profiler.getReport()
+        profiler.toJson("profile.json")
+
+    The methods are wrapped on entering and restored on exit, so code run outside a profiler pays nothing. Nested calls are recorded too: seconds, copies and peak memory include the nested calls, selfSeconds does not. Calls run in worker processes (nJobs > 1) are recorded as the one call that started the pool.
+
+    Counting copies patches pandas.DataFrame.copy. Peak memory uses tracemalloc, which slows Python-heavy code down; pass traceMemory=False to time only.
+    """
+
+    _active: Optional["TrajectoryProfiler"] = None
+
+    callColumns = ["stage", "method", "depth", "seconds", "selfSeconds", "rows", "tracks", "copies", "peakMemoryMB"]
+
+    def __init__(self,
+            traceMemory: bool = True,
+            countTracks: bool = True,
+            classes: List[type] = None
+        ):
+        """
+        Args:
+            traceMemory (bool, optional): records the peak memory with tracemalloc. Defaults to True.
+            countTracks (bool, optional): counts the distinct ids of the tracks frame of every call. The counting is not part of the recorded time. Defaults to True.
+            classes (List[type], optional): more classes to instrument, e.g., TrackStore. Defaults to None.
+        """
+        self.traceMemory = traceMemory
+        self.countTracks = countTracks
+        self.classes = [] if classes is None else list(classes)
+
+        self.calls: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, Any]] = []
+        self._stages: List[str] = []
+        self._patches: List[Tuple[type, str, Any]] = []
+        self._copies = 0
+        self._overhead = 0.0 # seconds spent counting, taken out of the callers' time
+        self._startedTracemalloc = False
+        self._signatures: Dict[Callable, inspect.Signature] = {}
+
+    # region lifetime
+
+    def __enter__(self) -> "TrajectoryProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if TrajectoryProfiler._active is not None:
+            raise RuntimeError("another TrajectoryProfiler is running")
+        TrajectoryProfiler._active = self
+
+        for cls in self.getInstrumentedClasses():
+            for name, attribute in list(vars(cls).items()):
+                if name.startswith("_"):
+                    continue
+                wrapped = self.wrapAttribute(cls, name, attribute)
+                if wrapped is not None:
+                    self._patches.append((cls, name, attribute))
+                    setattr(cls, name, wrapped)
+
+        originalCopy = pd.DataFrame.copy
+        self._patches.append((pd.DataFrame, "copy", originalCopy))
+
+        @functools.wraps(originalCopy)
+        def copy(df, *args, **kwargs):
+            self._copies += 1
+            return originalCopy(df, *args, **kwargs)
+        pd.DataFrame.copy = copy
+
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._startedTracemalloc = True
+
+    def stop(self):
+        for cls, name, attribute in reversed(self._patches):
+            setattr(cls, name, attribute)
+        self._patches = []
+        if self._startedTracemalloc:
+            tracemalloc.stop()
+            self._startedTracemalloc = False
+        TrajectoryProfiler._active = None
+
+    def getInstrumentedClasses(self) -> List[type]:
+        classes = [TrajectoryUtils]
+        pending = [TrajectoryProcessor]
+        while len(pending) > 0: # the processor and all its subclasses imported so far
+            cls = pending.pop()
+            if cls not in classes:
+                classes.append(cls)
+                pending.extend(cls.__subclasses__())
+        return classes + [cls for cls in self.classes if cls not in classes]
+
+    def wrapAttribute(self, cls: type, name: str, attribute: Any) -> Any:
+        """the instrumented attribute, None for attributes that are not methods"""
+        label = f"{cls.__name__}.{name}"
+        if isinstance(attribute, staticmethod):
+            return staticmethod(self.wrap(attribute.__func__, label))
+        if isinstance(attribute, classmethod):
+            return classmethod(self.wrap(attribute.__func__, label))
+        if inspect.isfunction(attribute):
+            return self.wrap(attribute, label)
+        return None
+
+    # endregion
+
+    # region recording
+
+    def wrap(self, func: Callable, label: str) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.record(label, func, args, kwargs)
+        return wrapper
+
+    def record(self, label: str, func: Callable, args: Tuple, kwargs: Dict):
+        countStart = time.perf_counter()
+        rows, tracks = self.getSize(func, args, kwargs)
+        self._overhead += time.perf_counter() - countStart
+
+        frame = self.enter(label, rows, tracks)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.exit(frame)
+
+    @staticmethod
+    def stage(name: str):
+        """Context that records the enclosed code as one call named name (e.g., a notebook step). The calls made within it are tagged with the stage. Does nothing when no profiler is running."""
+        return _Stage(name)
+
+    def enter(self, label: str, rows: Optional[int] = None, tracks: Optional[int] = None) -> Dict[str, Any]:
+        frame = {
+            "stage": self._stages[-1] if len(self._stages) > 0 else None,
+            "method": label,
+            "depth": len(self._stack),
+            "rows": rows,
+            "tracks": tracks,
+            "copies": self._copies,
+            "overhead": self._overhead,
+            "childSeconds": 0.0,
+            "childPeak": 0,
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            frame["memoryStart"] = current
+            frame["outerPeak"] = peak
+            if hasattr(tracemalloc, "reset_peak"): # python >= 3.9, otherwise the peak is since the profiler started
+                tracemalloc.reset_peak()
+        self._stack.append(frame)
+        frame["start"] = time.perf_counter()
+        return frame
+
+    def exit(self, frame: Dict[str, Any]):
+        elapsed = time.perf_counter() - frame["start"]
+        seconds = elapsed - (self._overhead - frame["overhead"])
+        self._stack.pop()
+
+        peakMemory = None
+        if "memoryStart" in frame and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], frame["childPeak"])
+            peakMemory = max(peak - frame["memoryStart"], 0) / 2 ** 20
+            if len(self._stack) > 0: # the parent lost its peak to reset_peak
+                parent = self._stack[-1]
+                parent["childPeak"] = max(parent["childPeak"], peak, frame["outerPeak"])
+
+        if len(self._stack) > 0:
+            self._stack[-1]["childSeconds"] += seconds
+
+        self.calls.append({
+            "stage": frame["stage"],
+            "method": frame["method"],
+            "depth": frame["depth"],
+            "seconds": seconds,
+            "selfSeconds": seconds - frame["childSeconds"],
+            "rows": frame["rows"],
+            "tracks": frame["tracks"],
+            "copies": self._copies - frame["copies"],
+            "peakMemoryMB": peakMemory,
+        })
+
+    def getSize(self, func: Callable, args: Tuple, kwargs: Dict) -> Tuple[Optional[int], Optional[int]]:
+        """rows and tracks of the first tracks frame (or TrackStore) argument"""
+        tracksDf = None
+        for value in list(args) + list(kwargs.values()):
+            if isinstance(value, (pd.DataFrame, TrackStore)):
+                tracksDf = value
+                break
+        if tracksDf is None:
+            return None, None
+        if isinstance(tracksDf, TrackStore):
+            return tracksDf.numRows(), len(tracksDf)
+        if not self.countTracks:
+            return len(tracksDf), None
+
+        idCol = self.getIdCol(func, args, kwargs)
+        if idCol is None or idCol not in tracksDf:
+            return len(tracksDf), None
+        return len(tracksDf), int(tracksDf[idCol].nunique())
+
+    def getIdCol(self, func: Callable, args: Tuple, kwargs: Dict) -> Optional[str]:
+        """idCol argument of TrajectoryUtils methods, idCol of the processor for the others"""
+        if len(args) > 0 and isinstance(args[0], TrajectoryProcessor):
+            return args[0].idCol
+        if "idCol" in kwargs:
+            return kwargs["idCol"]
+        if func not in self._signatures:
+            try:
+                self._signatures[func] = inspect.signature(func)
+            except (TypeError, ValueError):
+                self._signatures[func] = None
+        signature = self._signatures[func]
+        if signature is None:
+            return None
+        params = list(signature.parameters)
+        if "idCol" in params and params.index("idCol") < len(args):
+            idCol = args[params.index("idCol")]
+            return idCol if isinstance(idCol, str) else None
+        return None
+
+    # endregion
+
+    # region report
+
+    def getCalls(self) -> pd.DataFrame:
+        """one row per call in the order they finished"""
+        return pd.DataFrame(self.calls, columns=self.callColumns)
+
+    def getReport(self) -> pd.DataFrame:
+        """calls aggregated by stage and method, the slowest first"""
+        calls = self.getCalls()
+        calls["stage"] = calls["stage"].fillna("")
+        report = calls.groupby(["stage", "method"], sort=False).agg(
+            calls=("method", "size"),
+            seconds=("seconds", "sum"),
+            selfSeconds=("selfSeconds", "sum"),
+            maxSeconds=("seconds", "max"),
+            rows=("rows", lambda values: values.sum(min_count=1)),
+            tracks=("tracks", lambda values: values.sum(min_count=1)),
+            copies=("copies", "sum"),
+            peakMemoryMB=("peakMemoryMB", "max"),
+        ).reset_index()
+        report["rowsPerSecond"] = report["rows"] / report["seconds"].replace(0, np.nan)
+        return report.sort_values("seconds", ascending=False, ignore_index=True)
+
+    def toJson(self, path: str):
+        """the report and the calls"""
+        with open(path, "w") as f:
+            json.dump({
+                "report": self.getReport().to_dict(orient="records"),
+                "calls": self.getCalls().to_dict(orient="records"),
+            }, f, indent=2, default=str)
+
+    def toCsv(self, path: str, calls: bool = False):
+        """the report, or one row per call if calls is True"""
+        (self.getCalls() if calls else self.getReport()).to_csv(path, index=False)
+
+    # endregion
+
+
+class _Stage:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.frame = None
+
+    def __enter__(self):
+        profiler = TrajectoryProfiler._active
+        if profiler is not None:
+            self.profiler = profiler
+            self.frame = profiler.enter(f"stage:{self.name}")
+            self.frame["stage"] = self.name
+            profiler._stages.append(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if self.frame is not None:
+            self.profiler._stages.pop()
+            self.profiler.exit(self.frame)
+            self.frame = None
@@ -1,9 +1,14 @@
 import pandas as pd
+import numpy as np
 from typing import *
 import math
 from .ColMapper import ColMapper
 from .TrajectoryProcessor import TrajectoryProcessor
+from .TrackStore import TrackStore
+from .TrackDirection import TrackDirection
 from .TrajectoryMetaBuilder import TrajectoryMetaBuilder
+from .TrajectoryUtils import TrajectoryUtils
+from .TrackParallel import byTrackChunks
 
 class TrajectoryTransformer(TrajectoryProcessor):
 
@@ -13,6 +18,14 @@ class TrajectoryTransformer(TrajectoryProcessor):
         
         super().__init__(colMapper)
 
+    def setColumn(self, tracksDf: Union[pd.DataFrame, TrackStore], store: TrackStore, col: str, values: np.ndarray):
+        """Writes values computed in store order. A store gets a new column in its own frame, replacing any existing one, so frames sharing columns with it are never written through."""
+        if isinstance(tracksDf, TrackStore):
+            if col in tracksDf.df:
+                del tracksDf.df[col]
+            tracksDf.df[col] = values
+        else:
+            tracksDf[col] = store.toOriginalOrder(values)
     
     def translateOneToLocalSource(self, trackDf:pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
         """For a single track only. We cannot make parallel updates for multiple pedestrians as the query would require sql.
@@ -34,8 +47,9 @@ class TrajectoryTransformer(TrajectoryProcessor):
         return trackDf[self.xCol] - originX, trackDf[self.yCol] - originY
         
 
+    @byTrackChunks(writes=lambda self: [self.localXCol, self.localYCol])
     def translateAllToLocalSource(self,
-            tracksDf:pd.DataFrame
+            tracksDf: Union[pd.DataFrame, TrackStore]
         ):
         """Will group by idCol and translate based on the first row of each track. 
         We cannot make parallel updates for multiple pedestrians as the query would require sql.
@@ -50,125 +64,154 @@ class TrajectoryTransformer(TrajectoryProcessor):
         Returns:
             pd.DataFrame: _description_
         """
-        # TODO pass
-
-        allTrackIds = tracksDf[self.idCol].unique()
+        store = self.getTrackStore(tracksDf)
+        X = store.column(self.xCol)
+        Y = store.column(self.yCol)
 
-        localXSeres = []
-        localYSeres = []
-
-        for trackId in allTrackIds:
-            # print(f"translating track {trackId}")
-            trackDf = tracksDf[tracksDf[self.idCol] == trackId]
-            X, Y = self.translateOneToLocalSource(trackDf)
-            localXSeres.append(X)
-            localYSeres.append(Y)
-        
+        localX = X - store.broadcast(store.first(self.xCol))
+        localY = Y - store.broadcast(store.first(self.yCol))
 
-        tracksDf[self.localXCol] = pd.concat(localXSeres)
-        tracksDf[self.localYCol] = pd.concat(localYSeres)
+        self.__validateLocalSource(store, localX, localY)
 
-
-        for trackId in allTrackIds:
-            trackDf = tracksDf[tracksDf[self.idCol] == trackId]
-            self.__validateLocalSource(trackDf)
+        self.setColumn(tracksDf, store, self.localXCol, localX)
+        self.setColumn(tracksDf, store, self.localYCol, localY)
 
         pass
 
-    def __validateLocalSource(self, trackDf: pd.DataFrame):
-        firstRow = trackDf.iloc[0]
-        if firstRow[self.localXCol] != 0.0 or firstRow[self.localYCol] != 0.0:
-            raise Exception(f"track {firstRow[self.idCol]} has incorrect local source {firstRow[self.localXCol]}, {firstRow[self.localYCol]}")
+    def __validateLocalSource(self, store: TrackStore, localX: np.ndarray, localY: np.ndarray):
+        firstX = localX[store.starts]
+        firstY = localY[store.starts]
+        invalid = np.flatnonzero((firstX != 0.0) | (firstY != 0.0))
+        if len(invalid) > 0:
+            i = invalid[0]
+            raise Exception(f"track {store.ids[i]} has incorrect local source {firstX[i]}, {firstY[i]}")
         
 
     # derived cols
     
     
     def getTimeDerivativeForOne(self, aTrack: pd.DataFrame, onCol):
-        derivativeSeries = aTrack[onCol].rolling(window=2).apply(
-            lambda values: (values.iloc[0] - values.iloc[1]) / (1 / self.fps))
+        # previous - current, kept for backward compatibility. deriveAxisVelocities and deriveKinematics use current - previous.
+        derivativeSeries = (aTrack[onCol].shift(1) - aTrack[onCol]) / (1 / self.fps)
         derivativeSeries.iloc[0] = derivativeSeries.iloc[1]
-        # print(derivativeSeries)
         return derivativeSeries
 
     def getVelocitySeriesForOne(self, aTrack: pd.DataFrame, onCol):
         return self.getTimeDerivativeForOne(aTrack, onCol)
+
+    def getTimeDerivativeSeriesForAll(self, tracksDf: pd.DataFrame, onCol) -> pd.Series:
+        """getTimeDerivativeForOne on every track in one vectorized pass"""
+        store = self.getTrackStore(tracksDf)
+        derivative = -TrajectoryUtils.getTimeDerivative(store.column(onCol), store.starts, store.ends, self.fps)
+        return store.toSeries(derivative, name=onCol)
         
     def getVelocitySeriesForAll(self, tracksDf: pd.DataFrame, onCol):
-        individualSeres = []
-        # for trackId in tqdm(tracksDf[self.idCol].unique(), desc=f"deriving velocity on {onCol} at fps {fps}", position=0):
-        for trackId in tracksDf[self.idCol].unique():
-            aTrack = tracksDf[tracksDf[self.idCol] == trackId]
-            individualSeres.append(
-                self.getTimeDerivativeForOne(aTrack, onCol))
-
-        velSeries = pd.concat(individualSeres)
-        return velSeries
+        return self.getTimeDerivativeSeriesForAll(tracksDf, onCol)
 
     def getAccelerationSeriesForAll(self, tracksDf: pd.DataFrame, onCol):
-        individualSeres = []
-        # for trackId in tqdm(tracksDf[self.idCol].unique(), desc=f"deriving acceleration on {onCol} at fps {fps}", position=0):
-        for trackId in tracksDf[self.idCol].unique():
-            aTrack = tracksDf[tracksDf[self.idCol] == trackId]
-            individualSeres.append(
-                self.getTimeDerivativeForOne(aTrack, onCol))
-
-        accSeries = pd.concat(individualSeres)
-        return accSeries
+        return self.getTimeDerivativeSeriesForAll(tracksDf, onCol)
 
     def getAccelerationSerieFromVelocityForOne(self, velocitySeries: pd.Series):
-        seriesAcc = velocitySeries.rolling(window=2).apply(
-            lambda values: (values.iloc[0] - values.iloc[1]) / (1 / self.fps))
+        seriesAcc = (velocitySeries.shift(1) - velocitySeries) / (1 / self.fps)
         seriesAcc.iloc[0] = seriesAcc.iloc[1]
         return seriesAcc
 
-        pass
-
+    @byTrackChunks(rowwise=False, keepIndex=True) # rows grouped by track, same as the serial call
     def trimHeadAndTailForAll(self, tracksDf: pd.DataFrame):
         trimmedTracks = []
-        # for trackId in tqdm(tracksDf[self.idCol].unique(), desc=f"trimming trajectories"):
-        for trackId in tracksDf[self.idCol].unique():
-            aTrack = tracksDf[tracksDf[self.idCol] == trackId]
+        for trackId, aTrack in self.getTrackStore(tracksDf).iterTracks():
             trimmedTracks.append(aTrack.iloc[2: len(aTrack) - 2, :]) # 4 frames to exclude invalid acceleration and velocities
         
         return pd.concat(trimmedTracks)
 
         
+    @byTrackChunks(writes=lambda self: [self.xVelCol, self.yVelCol])
     def deriveAxisVelocities(self,
-            tracksDf:pd.DataFrame
+            tracksDf: Union[pd.DataFrame, TrackStore]
         ):
-        tracksDf[self.xVelCol] = self.getVelocitySeriesForAll(tracksDf, self.xCol)
-        tracksDf[self.yVelCol] = self.getVelocitySeriesForAll(tracksDf, self.yCol)
+        """x and y velocities as current - previous, the same values as deriveKinematics with the backward scheme"""
+        store = self.getTrackStore(tracksDf)
+        for velCol, onCol in [(self.xVelCol, self.xCol), (self.yVelCol, self.yCol)]:
+            velocity = TrajectoryUtils.getTimeDerivative(store.column(onCol), store.starts, store.ends, self.fps)
+            self.setColumn(tracksDf, store, velCol, velocity)
         pass
 
+    @byTrackChunks(writes=lambda self: [self.speedCol])
     def deriveSpeed(self,
-            tracksDf:pd.DataFrame
+            tracksDf: Union[pd.DataFrame, TrackStore]
         ):
+        if isinstance(tracksDf, TrackStore):
+            speed = np.sqrt(tracksDf.column(self.xVelCol) ** 2 + tracksDf.column(self.yVelCol) ** 2)
+            self.setColumn(tracksDf, tracksDf, self.speedCol, speed)
+        else:
+            tracksDf[self.speedCol] = np.sqrt(tracksDf[self.xVelCol] ** 2 + tracksDf[self.yVelCol] ** 2)
+
+    @byTrackChunks(writes=lambda self: [self.xVelCol, self.yVelCol, self.speedCol, self.xAccelerationCol, self.yAccelerationCol, self.accelerationCol, self.jerkCol, self.headingCol, self.yawRateCol])
+    def deriveKinematics(self,
+            tracksDf: Union[pd.DataFrame, TrackStore],
+            xCol: str = None,
+            yCol: str = None,
+            scheme: str = "backward"
+        ):
+        """Derives x/y velocity, speed, x/y acceleration, acceleration (rate of change of speed), jerk, heading and yaw rate of all tracks in one vectorized pass. Writes the columns named by the ColMapper.
+        Derivatives are current - previous, same as deriveAxisVelocities.
 
-        tracksDf["speed"] = tracksDf.apply(
-            lambda row: math.sqrt(row[self.xVelCol] ** 2 + row[self.yVelCol] ** 2),
-            axis=1
-        )
+        Args:
+            tracksDf (Union[pd.DataFrame, TrackStore]): multiple tracks
+            xCol (str, optional): Defaults to the mapped xCol.
+            yCol (str, optional): Defaults to the mapped yCol.
+            scheme (str, optional): finite-difference scheme, "backward", "forward" or "central". Defaults to "backward".
+        """
+        xCol = self.xCol if xCol is None else xCol
+        yCol = self.yCol if yCol is None else yCol
+
+        store = self.getTrackStore(tracksDf)
+
+        def derive(values, period=None):
+            return TrajectoryUtils.getTimeDerivative(values, store.starts, store.ends, self.fps, scheme=scheme, period=period)
+
+        xVel = derive(store.column(xCol))
+        yVel = derive(store.column(yCol))
+        speed = np.sqrt(xVel ** 2 + yVel ** 2)
+        acceleration = derive(speed)
+        heading = np.degrees(np.arctan2(yVel, xVel))
+
+        derived = {
+            self.xVelCol: xVel,
+            self.yVelCol: yVel,
+            self.speedCol: speed,
+            self.xAccelerationCol: derive(xVel),
+            self.yAccelerationCol: derive(yVel),
+            self.accelerationCol: acceleration,
+            self.jerkCol: derive(acceleration),
+            self.headingCol: heading,
+            self.yawRateCol: derive(heading, period=360),
+        }
+
+        for col, values in derived.items():
+            self.setColumn(tracksDf, store, col, values)
     
+    @byTrackChunks(writes=lambda self: ["speedSmooth"])
     def smoothenSpeed(self,
-            tracksDf:pd.DataFrame,
+            tracksDf: Union[pd.DataFrame, TrackStore],
             targetFps: float = 2.5
         ):
 
         windowSize = int(self.fps / targetFps)
         
-        allTrackIds = tracksDf[self.idCol].unique()
-        smoothSeres = []
-        for trackId in allTrackIds:
-            trackDf = tracksDf[tracksDf[self.idCol] == trackId]
-            # smoothVals = trackDf['speed'].rolling(window=windowSize, win_type='gaussian', min_periods=1, center=True).mean(std=1)
-            smoothVals = trackDf['speed'].rolling(window=windowSize, min_periods=1, center=True).mean()
-            smoothVals.fillna(0, inplace=True)
-            smoothSeres.append(smoothVals)
-        
-        # print(smoothSeres)
-        tracksDf['speedSmooth'] = pd.concat(smoothSeres)
+        # smoothVals = trackDf['speed'].rolling(window=windowSize, win_type='gaussian', min_periods=1, center=True).mean(std=1)
+        store = self.getTrackStore(tracksDf)
+        smoothVals = TrajectoryUtils.getRollingMean(store.column(self.speedCol), store.starts, store.ends, windowSize)
+        smoothVals[np.isnan(smoothVals)] = 0
+        self.setColumn(tracksDf, store, 'speedSmooth', smoothVals)
+
 
+    def resample(self,
+            tracksDf: pd.DataFrame,
+            toFps: float
+        ) -> pd.DataFrame:
+        """Resamples all tracks from the mapped fps to toFps. See TrajectoryUtils.resampleTracks"""
+        return TrajectoryUtils.resampleTracks(tracksDf, self.idCol, self.fps, toFps, frameCol=self.frameCol)
 
     def deriveDisplacementsForOne(self, trackDf: pd.DataFrame):
         xCol = self.xCol
@@ -179,8 +222,9 @@ class TrajectoryTransformer(TrajectoryProcessor):
 
         return (trackDf[self.xCol] - firstX).abs(), (trackDf[self.yCol] - firstY).abs()
 
+    @byTrackChunks(writes=lambda self: [self.displacementXCol, self.displacementYCol])
     def deriveDisplacements(self,
-            tracksDf:pd.DataFrame,
+            tracksDf: Union[pd.DataFrame, TrackStore],
             localAxis=False
         ):
         """
@@ -209,24 +253,17 @@ class TrajectoryTransformer(TrajectoryProcessor):
         #     axis=1
         # )
 
-        allTrackIds = tracksDf[self.idCol].unique()
-
-        dXSeres = []
-        dYSeres = []
+        store = self.getTrackStore(tracksDf)
+        X = store.column(xCol)
+        Y = store.column(yCol)
 
-        for trackId in allTrackIds:
-            trackDf = tracksDf[tracksDf[self.idCol] == trackId]
-            X, Y = self.deriveDisplacementsForOne(trackDf)
-            dXSeres.append(X)
-            dYSeres.append(Y)
-        
+        dX = np.abs(X - store.broadcast(store.first(xCol)))
+        dY = np.abs(Y - store.broadcast(store.first(yCol)))
 
-        tracksDf[self.displacementXCol] = pd.concat(dXSeres)
-        tracksDf[self.displacementYCol] = pd.concat(dYSeres)
+        self.__validateDisplacement(store, dX, dY)
 
-        for trackId in allTrackIds:
-            trackDf = tracksDf[tracksDf[self.idCol] == trackId]
-            self.__validateDisplacement(trackDf)
+        self.setColumn(tracksDf, store, self.displacementXCol, dX)
+        self.setColumn(tracksDf, store, self.displacementYCol, dY)
 
     
     def deriveDisplacementsInLC(self,
@@ -244,11 +281,14 @@ class TrajectoryTransformer(TrajectoryProcessor):
 
 
         
-    def __validateDisplacement(self, trackDf: pd.DataFrame):
+    def __validateDisplacement(self, store: TrackStore, dX: np.ndarray, dY: np.ndarray):
         
-        firstRow = trackDf.iloc[0]
-        if firstRow[self.displacementXCol] != 0.0 or firstRow[self.displacementYCol] != 0.0:
-            raise Exception(f"track {firstRow[self.idCol]} has incorrect local source displacement {firstRow[self.displacementXCol]}, {firstRow[self.displacementYCol]}")
+        firstX = dX[store.starts]
+        firstY = dY[store.starts]
+        invalid = np.flatnonzero((firstX != 0.0) | (firstY != 0.0))
+        if len(invalid) > 0:
+            i = invalid[0]
+            raise Exception(f"track {store.ids[i]} has incorrect local source displacement {firstX[i]}, {firstY[i]}")
         
         
 
@@ -297,33 +337,73 @@ class TrajectoryTransformer(TrajectoryProcessor):
 
 
     # region direction transfomations
+    @byTrackChunks(serialIf="inplace")
     def convertTracksToNorth(self,
             tracksDf:pd.DataFrame,
             xCol: str,
             yCol: str,
             tracksMeta: pd.DataFrame = None,
+            inplace: bool = False
         ) -> Tuple[List[int], pd.DataFrame]:
+        """Rotates SOUTH tracks by 180 degrees so that all tracks go NORTH.
+
+        Returns:
+            Tuple[List[int], pd.DataFrame]: rotated track ids and the tracks
+        """
+        return self.rotateTracksByDirection(tracksDf, xCol, yCol, self.verticalDirectionCol, TrackDirection.SOUTH, tracksMeta, inplace)
+
+    @byTrackChunks(serialIf="inplace")
+    def convertTracksToEast(self,
+            tracksDf:pd.DataFrame,
+            xCol: str,
+            yCol: str,
+            tracksMeta: pd.DataFrame = None,
+            inplace: bool = False
+        ) -> Tuple[List[int], pd.DataFrame]:
+        """Rotates WEST tracks by 180 degrees so that all tracks go EAST.
+
+        Returns:
+            Tuple[List[int], pd.DataFrame]: rotated track ids and the tracks
+        """
+        return self.rotateTracksByDirection(tracksDf, xCol, yCol, self.horizontalDirectionCol, TrackDirection.WEST, tracksMeta, inplace)
+
+    def rotateTracksByDirection(self,
+            tracksDf:pd.DataFrame,
+            xCol: str,
+            yCol: str,
+            directionCol: str,
+            direction: TrackDirection,
+            tracksMeta: pd.DataFrame = None,
+            inplace: bool = False
+        ) -> Tuple[List[int], pd.DataFrame]:
+        """Rotates by 180 degrees all the tracks whose meta direction is the given one. The meta direction is joined onto the rows and the coordinates are multiplied by a +-1 sign vector.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            directionCol (str): direction column in the meta
+            direction (TrackDirection): direction of the tracks to rotate
+            tracksMeta (pd.DataFrame, optional): built from tracksDf if None. Defaults to None.
+            inplace (bool, optional): updates tracksDf instead of a copy. Defaults to False.
+
+        Returns:
+            Tuple[List[int], pd.DataFrame]: rotated track ids and the tracks
+        """
         
         if tracksMeta is None:
             metaBuilder = TrajectoryMetaBuilder(self.colMapper)
             tracksMeta = metaBuilder.build([tracksDf], xCol, yCol)
 
-        copiedDf = tracksDf.copy()
-        allPedIds = self.getIds(copiedDf)
-
-        southIds = []
-        for pedId in allPedIds:
-            trackDf = copiedDf[copiedDf[self.idCol] == pedId]
-            trackMeta = self.getMeta(tracksMeta, pedId)
-            # print(trackMeta[self.verticalDirectionCol])
-            if trackMeta[self.verticalDirectionCol] == "SOUTH":
-                southIds.append(pedId)
-                # print(trackMeta[self.idCol])
-                X, Y = self.rotate180(trackDf, xCol=xCol, yCol=yCol)
-                copiedDf.loc[copiedDf[self.idCol] == pedId, xCol] = X
-                copiedDf.loc[copiedDf[self.idCol] == pedId, yCol] = Y
-        
-        return southIds, copiedDf
+        # the first meta row of a track, same as getMeta
+        trackDirections = tracksMeta.drop_duplicates(self.idCol).set_index(self.idCol)[directionCol]
+        rotate = (tracksDf[self.idCol].map(trackDirections) == direction.value).to_numpy()
+        sign = np.where(rotate, -1, 1).astype(np.int8) # keeps the dtype of the coordinates, e.g., float32 of a compact table
+
+        convertedDf = tracksDf if inplace else tracksDf.copy()
+        convertedDf[xCol] = convertedDf[xCol] * sign
+        convertedDf[yCol] = convertedDf[yCol] * sign
+
+        rotatedIds = list(pd.unique(tracksDf[self.idCol].to_numpy()[rotate]))
+        return rotatedIds, convertedDf
     # endregion
 
     
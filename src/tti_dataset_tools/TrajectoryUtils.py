@@ -1,6 +1,8 @@
 from shapely.geometry import LineString, box, Point, Polygon
 from shapely.affinity import rotate, translate, affine_transform
+from shapely.strtree import STRtree
 from .TrackDirection import TrackDirection
+from .TrackStore import TrackStore
 
 from tqdm import tqdm
 import pandas as pd
@@ -25,26 +27,92 @@ class TrajectoryUtils:
         Arguments:
           minLen: minimum spline size
         """
-        splinePoints = []
-        prev = None
-        last = None
-        for idx, row in trajectoryDf.iterrows():
-            last = (row[xCol], row[yCol])
-            if prev is None:
-                prev = last
+        return LineString(TrajectoryUtils.splineCoords(
+            trajectoryDf[xCol].to_numpy(dtype=float),
+            trajectoryDf[yCol].to_numpy(dtype=float),
+            minLen
+        ))
+
+    @staticmethod
+    def splineCoords(X: np.ndarray, Y: np.ndarray, minLen=0.5) -> np.ndarray:
+        """Spline points of a single track as an (n, 2) array. A point is kept when it is at least minLen away from the previously kept point. The last point is always added.
+
+        Args:
+            X (np.ndarray): x coordinates of a single track in order
+            Y (np.ndarray): y coordinates of a single track in order
+            minLen (float, optional): minimum spline size. Defaults to 0.5.
+
+        Returns:
+            np.ndarray: spline points
+        """
+        n = len(X)
+        if n == 0:
+            raise ValueError("splineCoords: empty trajectory")
+
+        # each kept point depends on the previous one, so we jump from anchor to anchor and search a window of the following points at once.
+        anchors = [0]
+        anchor = 0
+        searchFrom = 1
+        window = 64
+        while searchFrom < n:
+            searchTo = min(n, searchFrom + window)
+            dX = X[searchFrom:searchTo] - X[anchor]
+            dY = Y[searchFrom:searchTo] - Y[anchor]
+            hits = np.flatnonzero(np.sqrt(dX ** 2 + dY ** 2) >= minLen)
+            if len(hits) == 0:
+                searchFrom = searchTo
+                window *= 2
                 continue
+            
+            jump = searchFrom + hits[0] - anchor
+            anchor = anchor + jump
+            anchors.append(anchor)
+            searchFrom = anchor + 1
+            window = max(16, 2 * jump)
+
+        anchors.append(n - 1)
+        return np.column_stack((X[anchors], Y[anchors]))
+
+    @staticmethod
+    def getTrackOffsets(ids) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Groups the rows by track id in one pass. Tracks are in the order of appearance (same as unique()) and rows keep their order inside a track.
+
+        Args:
+            ids: track id of every row
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: unique ids, row positions grouped by track, start and end (exclusive) of every track in the grouped positions
+        """
+        codes, uniqueIds = pd.factorize(np.asarray(ids))
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes, minlength=len(uniqueIds))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        return np.asarray(uniqueIds), order, starts, ends
+
+    @staticmethod
+    def dfToSplinesForAll(tracksDf: pd.DataFrame, idCol, xCol, yCol, minLen=0.5, asCoords=False) -> pd.Series:
+        """Builds the splines of all the tracks in one pass over the coordinate arrays.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            idCol (str): track id column
+            minLen (float, optional): minimum spline size. Defaults to 0.5.
+            asCoords (bool, optional): return (n, 2) coordinate arrays instead of LineStrings. Defaults to False.
 
-            distance = sqrt((last[0] - prev[0]) ** 2 +
-                            (last[1] - prev[1]) ** 2)
-            if distance >= minLen:
-                splinePoints.append(prev)
-                prev = last
+        Returns:
+            pd.Series: spline of every track indexed by track id
+        """
+        ids, order, starts, ends = TrajectoryUtils.getTrackOffsets(tracksDf[idCol])
+        X = tracksDf[xCol].to_numpy(dtype=float)[order]
+        Y = tracksDf[yCol].to_numpy(dtype=float)[order]
 
-        # add the last points
-        splinePoints.append(prev)
-        splinePoints.append(last)
+        splines = []
+        for start, end in zip(starts, ends):
+            coords = TrajectoryUtils.splineCoords(X[start:end], Y[start:end], minLen)
+            splines.append(coords if asCoords else LineString(coords))
 
-        return LineString(splinePoints)
+        return pd.Series(splines, index=pd.Index(ids, name=idCol), dtype=object)
 
     @staticmethod
     def scenePolygon(sceneConfig, boxWidth, boxHeight) -> box:
@@ -73,6 +141,92 @@ class TrajectoryUtils:
             return df
         return None
 
+    @staticmethod
+    def containsXY(polygon: Polygon, X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """Vectorized polygon.contains for convex polygons like the rotated scene rectangles. Points on the boundary are not contained.
+
+        Args:
+            polygon (Polygon): a convex polygon
+            X (np.ndarray): x coordinates
+            Y (np.ndarray): y coordinates
+
+        Returns:
+            np.ndarray: boolean mask, True if the point is inside
+        """
+        coords = np.asarray(polygon.exterior.coords)
+        edgeX = np.diff(coords[:, 0])
+        edgeY = np.diff(coords[:, 1])
+        nonZero = (edgeX != 0) | (edgeY != 0)
+        originX = coords[:-1, 0][nonZero]
+        originY = coords[:-1, 1][nonZero]
+        edgeX = edgeX[nonZero]
+        edgeY = edgeY[nonZero]
+
+        X = np.asarray(X, dtype=float)[:, None]
+        Y = np.asarray(Y, dtype=float)[:, None]
+        cross = edgeX * (Y - originY) - edgeY * (X - originX)
+        # inside if on the same side of every edge, whatever the winding order is
+        return np.all(cross > 0, axis=1) | np.all(cross < 0, axis=1)
+
+    @staticmethod
+    def getInsideRuns(inside: np.ndarray, trackStarts: np.ndarray = None, trackEnds: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Run-length encodes an inside mask. Runs never cross track boundaries.
+
+        Args:
+            inside (np.ndarray): boolean mask of rows grouped by track
+            trackStarts (np.ndarray, optional): start of every track. Defaults to a single track.
+            trackEnds (np.ndarray, optional): end (exclusive) of every track. Defaults to a single track.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: start and end (exclusive) positions of the runs of inside rows
+        """
+        n = len(inside)
+        isFirst = np.zeros(n, dtype=bool)
+        isLast = np.zeros(n, dtype=bool)
+        if trackStarts is None:
+            trackStarts = np.array([0])
+            trackEnds = np.array([n])
+        isFirst[trackStarts[trackEnds > trackStarts]] = True
+        isLast[trackEnds[trackEnds > trackStarts] - 1] = True
+
+        prevInside = np.concatenate(([False], inside[:-1])) & ~isFirst
+        nextInside = np.concatenate((inside[1:], [False])) & ~isLast
+
+        runStarts = np.flatnonzero(inside & ~prevInside)
+        runEnds = np.flatnonzero(inside & ~nextInside) + 1
+        return runStarts, runEnds
+
+    @staticmethod
+    def expandRanges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Concatenation of np.arange(start, end) for all the ranges without a python loop"""
+        lengths = ends - starts
+        total = lengths.sum()
+        offsets = np.cumsum(lengths) - lengths
+        return np.arange(total) - np.repeat(offsets - starts, lengths)
+
+    @staticmethod
+    def queryTree(tree: STRtree, geoms: List) -> Tuple[np.ndarray, np.ndarray]:
+        """Bounding box query of many geometries against an STRtree. Works with both shapely 1.8 and 2.
+
+        Args:
+            tree (STRtree): tree built on a list of geometries
+            geoms (List): query geometries
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (query index, tree index) of every candidate pair
+        """
+        if not hasattr(tree, "query_items"): # shapely 2 does bulk queries
+            pairs = tree.query(np.asarray(geoms, dtype=object))
+            return pairs[0].astype(int), pairs[1].astype(int)
+
+        queryIdx = []
+        treeIdx = []
+        for i, geom in enumerate(geoms):
+            items = list(tree.query_items(geom))
+            queryIdx.extend([i] * len(items))
+            treeIdx.extend(items)
+        return np.asarray(queryIdx, dtype=int), np.asarray(treeIdx, dtype=int)
+
     @staticmethod
     def clip(pedDf, xCol, yCol, frameCol, sceneConfig, boxWidth, boxHeight) -> pd.DataFrame:
         """ Clip the trajectory with 150% rect clipping. """
@@ -83,22 +237,21 @@ class TrajectoryUtils:
         entryFrame = -inf
         exitFrame = inf
 
-        for idx, row in pedDf.iterrows():
-            if entryFrame == -inf:
-                # check if this row is an entry point
-                if rect.contains(Point(row[xCol], row[yCol])):
-                    entryFrame = row[frameCol]
-                    continue
+        inside = TrajectoryUtils.containsXY(rect, pedDf[xCol].to_numpy(), pedDf[yCol].to_numpy())
+        frames = pedDf[frameCol].to_numpy()
 
-            if entryFrame > 0 and exitFrame == inf:
-                # check if this row is an exit point
-                if not rect.contains(Point(row[xCol], row[yCol])):
-                    exitFrame = row[frameCol]
-                    break
+        entries = np.flatnonzero(inside)
+        if len(entries) > 0:
+            entry = entries[0]
+            entryFrame = frames[entry]
+            if entryFrame > 0:
+                exits = np.flatnonzero(~inside[entry + 1:])
+                if len(exits) > 0:
+                    exitFrame = frames[entry + 1 + exits[0]]
 
         # sometimes there are no exit frame. use the last frame
         if exitFrame == inf:
-            exitFrame = row[frameCol]
+            exitFrame = frames[-1]
 
         return pedDf[(pedDf[frameCol] >= entryFrame) & (pedDf[frameCol] <= exitFrame)]
 
@@ -107,99 +260,84 @@ class TrajectoryUtils:
         """ Clip the trajectory with 150% rect clipping. Returns how many times the trajectory exitted the scene """
 
         # find entry and exit point frame number, keep all the points in between and disregard others. A trajectory may enter several times, but we don't need them.
+        # Rows must be ordered by frame.
 
-        # assert len(pedDf) > 1
-
-        entryFrame = -inf
-        exitFrame = inf
-
-        exitCount = 0
-
-        for idx, row in pedDf.iterrows():
-
-            insideRect = rect.contains(Point(row[xCol], row[yCol]))
-            if entryFrame == -inf:
-                # check if this row is an entry point
-                if insideRect:
-                    entryFrame = row[frameCol]
-                    continue
-
-            if entryFrame >= 0:
-                if not insideRect:
-                    if exitFrame == inf:
-                        # check if this row is an exit point
-                        # Naive method as the ped can enter again
-                        exitFrame = row[frameCol]
-                        exitCount += 1
-                        # break
-                else: # we keep looking for more
-                    exitFrame = inf #entered again, so we keep looking
+        inside = TrajectoryUtils.containsXY(rect, pedDf[xCol].to_numpy(), pedDf[yCol].to_numpy())
+        runStarts, runEnds = TrajectoryUtils.getInsideRuns(inside)
         
-        if entryFrame == -inf:
+        if len(runStarts) == 0:
             logging.warn(f"{pedDf.iloc[0]['uniqueTrackId']} has no entry frame in {rect}")
             return None, 0
 
-        # sometimes there are no exit frame. use the last frame
-        if entryFrame >= 0 and exitFrame == inf:
-            exitFrame = row[frameCol]
-            exitCount += 1
+        # every run of inside rows ends with an exit, the last one may exit at the last frame. The first row after the last run is the exit frame.
+        exitCount = len(runStarts)
+        end = min(runEnds[-1] + 1, len(pedDf))
         
-        df = pedDf[(pedDf[frameCol] >= entryFrame) & (pedDf[frameCol] <= exitFrame)].copy()
-        df.reset_index(drop=True)
+        df = pedDf.iloc[runStarts[0]:end].copy()
         return df, exitCount
 
     @staticmethod
     def clipByRectWithSplits(trackDf, xCol, yCol, frameCol, rect) -> List[pd.DataFrame]:
         """ For multiple entries, we return a list"""
 
-        # find entry and exit point frame number, keep all the points in between and disregard others. A trajectory may enter several times, but we don't need them.
+        # every entry makes a new track from the entry frame to the exit frame (inclusive). Rows must be ordered by frame.
 
-        # assert len(pedDf) > 1
+        inside = TrajectoryUtils.containsXY(rect, trackDf[xCol].to_numpy(), trackDf[yCol].to_numpy())
+        runStarts, runEnds = TrajectoryUtils.getInsideRuns(inside)
 
         brokenTracks = []
+        for start, end in zip(runStarts, runEnds):
+            brokenTracks.append(trackDf.iloc[start:min(end + 1, len(trackDf))].copy())
+        
+        return brokenTracks
 
-        entryFrame = -inf
-        exitFrame = inf
-        exitCount = 0
-
-
-        for idx, row in trackDf.iterrows():
+    @staticmethod
+    def clipAllByRect(tracksDf: pd.DataFrame, idCol, xCol, yCol, rect, withSplits=False, segmentCol="segmentId", exitCountCol="exitCount") -> pd.DataFrame:
+        """Clips all the tracks in one call. Same clipping as clipByRect, or clipByRectWithSplits if withSplits is True. Rows of a track must be ordered by frame.
 
-            insideRect = rect.contains(Point(row[xCol], row[yCol]))
-            # print("insideRect", insideRect)
-            # print("entryFrame", entryFrame)
-            # print("exitFrame", exitFrame)
-            if entryFrame == -inf:
-                # check if this row is an entry point
-                if insideRect:
-                    entryFrame = row[frameCol]
-                    continue
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            idCol (str): track id column
+            rect (Polygon): the scene rectangle
+            withSplits (bool, optional): every entry makes a new segment. Defaults to False.
+            segmentCol (str, optional): segment id of the row in its track. Defaults to "segmentId".
+            exitCountCol (str, optional): how many times the track exitted the scene. Defaults to "exitCount".
 
-            if entryFrame >= 0: # check for exit frame
-                if not insideRect:
-                    exitFrame = row[frameCol]
-                    choppedDf = trackDf[(trackDf[frameCol] >= entryFrame) & (trackDf[frameCol] <= exitFrame)].copy()
-                    brokenTracks.append(choppedDf)
-                    exitCount += 1
+        Returns:
+            pd.DataFrame: clipped rows grouped by track with the original index. Tracks which never enter the scene are dropped.
+        """
+        ids, order, starts, ends = TrajectoryUtils.getTrackOffsets(tracksDf[idCol])
+        X = tracksDf[xCol].to_numpy()[order]
+        Y = tracksDf[yCol].to_numpy()[order]
+
+        inside = TrajectoryUtils.containsXY(rect, X, Y)
+        runStarts, runEnds = TrajectoryUtils.getInsideRuns(inside, starts, ends)
+
+        # track of each run
+        runTracks = np.searchsorted(starts, runStarts, side="right") - 1
+        exitCounts = np.bincount(runTracks, minlength=len(ids))
+        runNumbers = np.arange(len(runStarts)) - np.repeat(np.cumsum(exitCounts) - exitCounts, exitCounts)
+
+        if withSplits:
+            segStarts = runStarts
+            segEnds = np.minimum(runEnds + 1, ends[runTracks])
+            segTracks = runTracks
+            segIds = runNumbers
+        else:
+            firstRun = runNumbers == 0
+            lastRun = np.append(runTracks[1:] != runTracks[:-1], True) if len(runTracks) > 0 else firstRun
+            segStarts = runStarts[firstRun]
+            segTracks = runTracks[firstRun]
+            segEnds = np.minimum(runEnds[lastRun] + 1, ends[segTracks])
+            segIds = np.zeros(len(segStarts), dtype=int)
 
-                    # reset
-                    entryFrame = -inf
-                    exitFrame = inf
+        positions = TrajectoryUtils.expandRanges(segStarts, segEnds)
+        lengths = segEnds - segStarts
 
-        
-        # sometimes there are no exit frame. use the last frame
-        # print("entryFrame", entryFrame)
-        # print("exitFrame", exitFrame)
-        if entryFrame >= 0 and exitFrame == inf:
-            exitFrame = row[frameCol]
-            # print("row", row)
-            # print("entryFrame", entryFrame)
-            # print("exitFrame", exitFrame)
-            choppedDf = trackDf[(trackDf[frameCol] >= entryFrame) & (trackDf[frameCol] <= exitFrame)].copy()
-            choppedDf.reset_index(drop=True)
-            brokenTracks.append(choppedDf)
-        
-        return brokenTracks
+        clippedDf = tracksDf.iloc[order[positions]].copy()
+        clippedDf[segmentCol] = np.repeat(segIds, lengths)
+        clippedDf[exitCountCol] = np.repeat(exitCounts[segTracks], lengths)
+        return clippedDf
 
     @staticmethod
     def getTranslationMatrix(localCenterPosition: Point) -> List[float]:
@@ -337,7 +475,9 @@ class TrajectoryUtils:
     # endregion
 
     @staticmethod
-    def downSample(traj: pd.DataFrame, fromFPS: float, toFPS: float):
+    def downSample(traj: pd.DataFrame, fromFPS: float, toFPS: float, idCol=None):
+        """Keeps every (fromFPS // toFPS)th row. Rows are counted per track if idCol is given, otherwise over the whole frame. Dtypes are kept.
+        """
         if fromFPS < toFPS:
             raise Exception(
                 f"downSample: Up sampling not supported for frames")
@@ -346,15 +486,12 @@ class TrajectoryUtils:
 
         keepInterval = fromFPS // toFPS
 
-        downTraj = []
-        count = 0
-        for _, row in tqdm(traj.iterrows(), desc=f"downsampling", total=len(traj)):
-            if count % keepInterval == 0:
-                # if row["trackLifetime"] % keepInterval == 0: # a little error will break it
-                downTraj.append(row)
-            count += 1
+        if idCol is None:
+            count = np.arange(len(traj))
+        else:
+            count = traj.groupby(idCol, sort=False).cumcount().to_numpy()
 
-        return pd.DataFrame(downTraj).convert_dtypes()
+        return traj[count % keepInterval == 0]
 
     @staticmethod
     def downSampleByTrackLifeTime(traj: pd.DataFrame, fromFPS: float, toFPS: float):
@@ -366,13 +503,72 @@ class TrajectoryUtils:
 
         keepInterval = fromFPS // toFPS
 
-        downTraj = []
-        for _, row in tqdm(traj.iterrows(), desc=f"downsampling", total=len(traj)):
-            # for _, row in traj.iterrows():
-            if row["trackLifetime"] % keepInterval == 0:  # a little error will break it
-                downTraj.append(row)
+        # a little error will break it
+        return traj[traj["trackLifetime"] % keepInterval == 0]
 
-        return pd.DataFrame(downTraj).convert_dtypes()
+    @staticmethod
+    def resampleTracks(tracksDf: pd.DataFrame, idCol, fromFPS: float, toFPS: float, frameCol="frame") -> pd.DataFrame:
+        """Resamples every track from fromFPS to toFPS. Rows of a track are ordered by frameCol first, and the result is grouped by track and ordered by frame.
+        For an integer ratio, every ratio-th row of each track is kept, counted from its first frame. Otherwise samples are taken every fromFPS / toFPS frames from the first frame of each track: float columns are linearly interpolated in time between the rows around the sample, so missing frames are respected, and other columns (ids, classes) take the value of the previous row. Dtypes are kept, except frameCol which holds the sample time in frames of fromFPS as float.
+
+        Args:
+            tracksDf (pd.DataFrame): multiple tracks
+            idCol (str): track id column
+            fromFPS (float): current fps
+            toFPS (float): target fps
+            frameCol (str, optional): time axis of the tracks in frames. Rows are taken as consecutive frames if the column is missing. Defaults to "frame".
+
+        Returns:
+            pd.DataFrame: resampled tracks. Kept rows keep their index, interpolated samples get a new range index.
+        """
+        if fromFPS < toFPS:
+            raise Exception(
+                f"resampleTracks: Up sampling not supported for frames")
+        if fromFPS == toFPS:
+            return tracksDf
+
+        store = TrackStore(tracksDf, idCol, frameCol)
+        rowInTrack = np.arange(store.numRows()) - np.repeat(store.starts, store.sizes)
+
+        ratio = fromFPS / toFPS
+        if abs(ratio - round(ratio)) < 1e-9:
+            return store.df[rowInTrack % int(round(ratio)) == 0]
+
+        if frameCol in store.df:
+            frames = store.column(frameCol).astype(float)
+        else:
+            frames = rowInTrack.astype(float)
+        firstFrames = frames[store.starts]
+        elapsed = frames - np.repeat(firstFrames, store.sizes) # time since the start of the track, increasing within a track
+
+        # new samples of a track are at k * ratio frames from its first frame
+        numSamples = np.floor(elapsed[store.ends - 1] / ratio + 1e-9).astype(np.int64) + 1
+        codes = np.repeat(np.arange(len(store)), numSamples)
+        sampleElapsed = TrajectoryUtils.expandRanges(np.zeros(len(store), dtype=np.int64), numSamples) * ratio
+
+        # one sorted key over all the tracks, so the row before every sample is a single searchsorted
+        span = (elapsed.max() if len(elapsed) > 0 else 0) + ratio + 1
+        rowKeys = store.codes * span + elapsed
+        sampleKeys = codes * span + sampleElapsed
+        lower = np.searchsorted(rowKeys, sampleKeys + 1e-9, side="right") - 1
+        lower = np.clip(lower, store.starts[codes], store.ends[codes] - 1)
+        upper = np.minimum(lower + 1, store.ends[codes] - 1)
+
+        gap = elapsed[upper] - elapsed[lower]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.where(gap > 0, (sampleElapsed - elapsed[lower]) / gap, 0)
+        fraction = np.clip(fraction, 0, 1)
+
+        resampledDf = store.df.iloc[lower].reset_index(drop=True)
+        for col in resampledDf.columns:
+            if col == frameCol:
+                resampledDf[col] = firstFrames[codes] + sampleElapsed
+            elif pd.api.types.is_float_dtype(resampledDf[col].dtype):
+                values = store.df[col].to_numpy()
+                interpolated = values[lower] + fraction * (values[upper] - values[lower])
+                resampledDf[col] = interpolated.astype(resampledDf[col].dtype)
+
+        return resampledDf
 
     @staticmethod
     def getTrack_VH_Directions(trackDf: pd.DataFrame, xCol, yCol) -> Tuple[TrackDirection, TrackDirection]:
@@ -398,60 +594,126 @@ class TrajectoryUtils:
 
         return verticalDirection, horizontalDirection
 
+    @staticmethod
+    def getRollingMean(values: np.ndarray, trackStarts: np.ndarray, trackEnds: np.ndarray, window: int) -> np.ndarray:
+        """Centered rolling mean of every track from prefix sums, same as rolling(window, min_periods=1, center=True).mean() on each track. nan values are skipped, nan if a window has no value.
+
+        Args:
+            values (np.ndarray): values of all the tracks, grouped by track
+            trackStarts (np.ndarray): start of every track
+            trackEnds (np.ndarray): end (exclusive) of every track
+            window (int): window size in rows
+
+        Returns:
+            np.ndarray: rolling means
+        """
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        if window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+
+        valid = ~np.isnan(values)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0))))
+        counts = np.concatenate(([0], np.cumsum(valid)))
+
+        sizes = np.asarray(trackEnds) - np.asarray(trackStarts)
+        rowStarts = np.repeat(trackStarts, sizes)
+        rowEnds = np.repeat(trackEnds, sizes)
+        rows = np.arange(n)
+        lows = np.maximum(rows - window // 2, rowStarts)
+        highs = np.minimum(rows + (window - 1) - window // 2 + 1, rowEnds) # exclusive
+
+        windowCounts = counts[highs] - counts[lows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(windowCounts > 0, (sums[highs] - sums[lows]) / windowCounts, np.nan)
+
+    @staticmethod
+    def getTimeDerivative(values: np.ndarray, trackStarts: np.ndarray, trackEnds: np.ndarray, fps, scheme="backward", period=None) -> np.ndarray:
+        """Finite-difference time derivative of all the tracks in one pass. Differences never cross track boundaries.
+
+        Args:
+            values (np.ndarray): values of all rows grouped by track and ordered by frame
+            trackStarts (np.ndarray): start of every track
+            trackEnds (np.ndarray): end (exclusive) of every track
+            fps (float): frames per second
+            scheme (str, optional): "backward" (current - previous), "forward" (next - current) or "central" ((next - previous) / 2). Defaults to "backward".
+            period (float, optional): wraps the differences into [-period/2, period/2), e.g. 360 for headings in degree. Defaults to None.
+
+        Returns:
+            np.ndarray: derivative of every row. The end of a track where the scheme has no neighbour uses the one-sided difference next to it. Single row tracks are nan.
+        """
+        if scheme not in ("backward", "forward", "central"):
+            raise ValueError(f"getTimeDerivative: unknown scheme {scheme}")
+
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        derivative = np.full(n, np.nan)
+        if n < 2:
+            return derivative
+
+        def wrap(diff):
+            if period is None:
+                return diff
+            return (diff + period / 2) % period - period / 2
+
+        # backwardDiff[i] = values[i] - values[i - 1]
+        backwardDiff = np.empty(n)
+        backwardDiff[0] = np.nan
+        backwardDiff[1:] = wrap(values[1:] - values[:-1]) / (1 / fps)
+
+        valid = (trackEnds - trackStarts) > 1
+        firsts = trackStarts[valid]
+        lasts = trackEnds[valid] - 1
+
+        if scheme == "backward":
+            derivative[:] = backwardDiff
+        elif scheme == "forward":
+            derivative[:-1] = backwardDiff[1:]
+        else:
+            derivative[1:-1] = wrap(values[2:] - values[:-2]) / (2 / fps)
+
+        # one-sided differences at the track ends
+        derivative[firsts] = backwardDiff[firsts + 1]
+        derivative[lasts] = backwardDiff[lasts]
+        derivative[trackStarts[~valid]] = np.nan
+        return derivative
+
     @staticmethod
     def getTimeDerivativeForOne(aTrack: pd.DataFrame, onCol, fps):
-        derivativeSeries = aTrack[onCol].rolling(window=2).apply(
-            lambda values: (values.iloc[0] - values.iloc[1]) / (1 / fps))
+        # previous - current, kept for backward compatibility
+        derivativeSeries = (aTrack[onCol].shift(1) - aTrack[onCol]) / (1 / fps)
         derivativeSeries.iloc[0] = derivativeSeries.iloc[1]
         return derivativeSeries
 
     @staticmethod
     def getVelocitySeriesForOne(aTrack: pd.DataFrame, onCol, fps):
         return TrajectoryUtils.getTimeDerivativeForOne(aTrack, onCol, fps)
-        # seriesVelo = aTrack[onCol].rolling(window=2).apply(
-        #     lambda values: (values.iloc[0] - values.iloc[1]) / (1 / fps))
-        # seriesVelo.iloc[0] = seriesVelo.iloc[1]
-        # return seriesVelo
 
     @staticmethod
-    def getVelocitySeriesForAll(tracksDf: pd.DataFrame, onCol, fps):
-        individualSeres = []
-        # for trackId in tqdm(tracksDf["uniqueTrackId"].unique(), desc=f"deriving velocity on {onCol} at fps {fps}", position=0):
-        for trackId in tracksDf["uniqueTrackId"].unique():
-            aTrack = tracksDf[tracksDf["uniqueTrackId"] == trackId]
-            individualSeres.append(
-                TrajectoryUtils.getTimeDerivativeForOne(aTrack, onCol, fps))
+    def getTimeDerivativeSeriesForAll(tracksDf: pd.DataFrame, onCol, fps, idCol="uniqueTrackId", frameCol="frame") -> pd.Series:
+        """Same as getTimeDerivativeForOne on every track (previous - current), without the per track loop. Rows are grouped by track like the concatenated per track results."""
+        store = TrackStore(tracksDf, idCol, frameCol)
+        derivative = -TrajectoryUtils.getTimeDerivative(store.column(onCol), store.starts, store.ends, fps)
+        return store.toSeries(derivative, name=onCol)
 
-        velSeries = pd.concat(individualSeres)
-        return velSeries
+    @staticmethod
+    def getVelocitySeriesForAll(tracksDf: pd.DataFrame, onCol, fps):
+        return TrajectoryUtils.getTimeDerivativeSeriesForAll(tracksDf, onCol, fps)
 
     @staticmethod
     def getAccelerationSeriesForAll(tracksDf: pd.DataFrame, onCol, fps):
-        individualSeres = []
-        # for trackId in tqdm(tracksDf["uniqueTrackId"].unique(), desc=f"deriving acceleration on {onCol} at fps {fps}", position=0):
-        for trackId in tracksDf["uniqueTrackId"].unique():
-            aTrack = tracksDf[tracksDf["uniqueTrackId"] == trackId]
-            individualSeres.append(
-                TrajectoryUtils.getTimeDerivativeForOne(aTrack, onCol, fps))
-
-        accSeries = pd.concat(individualSeres)
-        return accSeries
+        return TrajectoryUtils.getTimeDerivativeSeriesForAll(tracksDf, onCol, fps)
 
     @staticmethod
     def getAccelerationSerieFromVelocityForOne(velocitySeries: pd.Series, fps):
-        seriesAcc = velocitySeries.rolling(window=2).apply(
-            lambda values: (values.iloc[0] - values.iloc[1]) / (1 / fps))
+        seriesAcc = (velocitySeries.shift(1) - velocitySeries) / (1 / fps)
         seriesAcc.iloc[0] = seriesAcc.iloc[1]
         return seriesAcc
 
-        pass
-
     @staticmethod
     def trimHeadAndTailForAll(tracksDf: pd.DataFrame):
         trimmedTracks = []
-        # for trackId in tqdm(tracksDf["uniqueTrackId"].unique(), desc=f"trimming trajectories"):
-        for trackId in tracksDf["uniqueTrackId"].unique():
-            aTrack = tracksDf[tracksDf["uniqueTrackId"] == trackId]
+        for trackId, aTrack in TrackStore(tracksDf, "uniqueTrackId", "frame").iterTracks():
             trimmedTrack = aTrack.iloc[2: len(aTrack) - 2, :].copy()
             trimmedTrack.reset_index(drop=True)
             trimmedTracks.append(trimmedTrack) # 4 frames to exclude invalid acceleration and velocities
@@ -552,4 +814,118 @@ class TrajectoryUtils:
         else:
             midX = max(candidatesForX)
         
-        return midX
\ No newline at end of file
+        return midX
+
+    @staticmethod
+    def getExtremeXAtYBreakpointsForAll(tracksDf: Union[pd.DataFrame, TrackStore], idCol: str, xCol: str, yCol: str, yBreakpoints: List[float], yTolerance: float, frameCol: str = "frame") -> pd.DataFrame:
+        """getExtremeXAtYBreakpoint for every track and breakpoint at once, without slicing the tracks.
+
+        Args:
+            tracksDf (Union[pd.DataFrame, TrackStore]): multiple tracks
+            idCol (str): track id column
+            xCol (str): _description_
+            yCol (str): _description_
+            yBreakpoints (List[float]): _description_
+            yTolerance (float): _description_
+
+        Returns:
+            pd.DataFrame: extreme x indexed by track id with one column per breakpoint, nan if the track has no point near the breakpoint
+        """
+        store = tracksDf if isinstance(tracksDf, TrackStore) else TrackStore(tracksDf, idCol, frameCol)
+        X = store.column(xCol).astype(float)
+        Y = store.column(yCol).astype(float)
+
+        extremes = {}
+        for yBreakpoint in yBreakpoints:
+            yMin = yBreakpoint - yTolerance
+            yMax = yBreakpoint + yTolerance
+            nearby = (Y >= yMin) & (Y <= yMax)
+
+            counts = np.bincount(store.codes, weights=nearby, minlength=len(store))
+            sums = np.bincount(store.codes, weights=np.where(nearby, X, 0), minlength=len(store))
+            mins = np.minimum.reduceat(np.where(nearby, X, np.inf), store.starts) if len(store) > 0 else np.empty(0)
+            maxs = np.maximum.reduceat(np.where(nearby, X, -np.inf), store.starts) if len(store) > 0 else np.empty(0)
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = sums / counts
+            extreme = np.where(means < 0, mins, maxs)
+            extreme[counts == 0] = np.nan
+            extremes[yBreakpoint] = extreme
+
+        return pd.DataFrame(extremes, index=pd.Index(store.ids, name=idCol), columns=list(yBreakpoints))
+
+    @staticmethod
+    def getYCrossingsForAll(tracksDf: Union[pd.DataFrame, TrackStore], idCol: str, xCol: str, yCol: str, yBreakpoints: List[float], frameCol: str = "frame", fps: float = None) -> pd.DataFrame:
+        """Every crossing of every y breakpoint by every track. A crossing is a sign change of (y - yBreakpoint) between two consecutive samples of a track, so crossings that fall between samples are found without a tolerance window. x and frame are linearly interpolated between the two samples.
+
+        Args:
+            tracksDf (Union[pd.DataFrame, TrackStore]): multiple tracks
+            idCol (str): track id column
+            xCol (str): _description_
+            yCol (str): _description_
+            yBreakpoints (List[float]): _description_
+            frameCol (str, optional): rows of a track are ordered by this column. Defaults to "frame".
+            fps (float, optional): adds the time of the crossing (frame / fps) if given. Defaults to None.
+
+        Returns:
+            pd.DataFrame: one row per crossing with idCol, yBreakpoint, x, frame, (time), direction (1 if y increases, -1 otherwise), ordered by track, breakpoint and frame
+        """
+        store = tracksDf if isinstance(tracksDf, TrackStore) else TrackStore(tracksDf, idCol, frameCol)
+        X = store.column(xCol).astype(float)
+        Y = store.column(yCol).astype(float)
+        if frameCol in store.df:
+            F = store.column(frameCol).astype(float)
+        else:
+            F = (np.arange(store.numRows()) - store.broadcast(store.starts)).astype(float)
+
+        sameTrack = store.codes[1:] == store.codes[:-1] # segment i goes from row i to row i + 1
+
+        segments = []
+        breakpointNos = []
+        for breakpointNo, yBreakpoint in enumerate(yBreakpoints):
+            above = Y >= yBreakpoint
+            crossing = np.flatnonzero(sameTrack & (above[1:] != above[:-1]))
+            segments.append(crossing)
+            breakpointNos.append(np.full(len(crossing), breakpointNo))
+
+        segments = np.concatenate(segments) if len(segments) > 0 else np.empty(0, dtype=int)
+        breakpointNos = np.concatenate(breakpointNos) if len(breakpointNos) > 0 else np.empty(0, dtype=int)
+        order = np.lexsort((segments, breakpointNos, store.codes[segments]))
+        segments = segments[order]
+        breakpointNos = breakpointNos[order]
+
+        breakpoints = np.asarray(yBreakpoints, dtype=float)[breakpointNos]
+        y0 = Y[segments]
+        y1 = Y[segments + 1]
+        t = (breakpoints - y0) / (y1 - y0) # y0 != y1 as the sign changed
+
+        crossings = pd.DataFrame({
+            idCol: store.ids[store.codes[segments]],
+            "yBreakpoint": breakpoints,
+            "x": X[segments] + t * (X[segments + 1] - X[segments]),
+            "frame": F[segments] + t * (F[segments + 1] - F[segments]),
+        })
+        if fps is not None:
+            crossings["time"] = crossings["frame"] / fps
+        crossings["direction"] = np.where(y1 > y0, 1, -1)
+        return crossings
+
+    @staticmethod
+    def getExtremeXAtYCrossingsForAll(tracksDf: Union[pd.DataFrame, TrackStore], idCol: str, xCol: str, yCol: str, yBreakpoints: List[float], frameCol: str = "frame") -> pd.DataFrame:
+        """Same layout as getExtremeXAtYBreakpointsForAll, with the interpolated crossings as candidates instead of the points within a tolerance. If a track crosses a breakpoint more than once, the extreme is chosen the same way.
+
+        Returns:
+            pd.DataFrame: extreme x indexed by track id with one column per breakpoint, nan if the track never crosses the breakpoint
+        """
+        store = tracksDf if isinstance(tracksDf, TrackStore) else TrackStore(tracksDf, idCol, frameCol)
+        crossings = TrajectoryUtils.getYCrossingsForAll(store, idCol, xCol, yCol, yBreakpoints, frameCol)
+
+        candidates = crossings.groupby([idCol, "yBreakpoint"], sort=False)["x"]
+        extremes = candidates.max().where(candidates.mean() >= 0, candidates.min())
+
+        extremes = extremes.unstack("yBreakpoint")
+        extremes = extremes.reindex(index=store.ids, columns=np.asarray(yBreakpoints, dtype=float))
+        extremes.index.name = idCol
+        extremes.columns = list(yBreakpoints)
+        extremes.columns.name = None
+        return extremes
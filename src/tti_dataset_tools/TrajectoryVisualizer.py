@@ -4,6 +4,7 @@ import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+from .TrackStore import TrackStore
 
 class TrajectoryVisualizer:
 
@@ -12,11 +13,12 @@ class TrajectoryVisualizer:
         
         fig = plt.figure(figsize=(10, 10))
         ax = fig.add_subplot()
+        store = TrackStore(df, idCol)
         if trackIds is None:
-            trackIds = df[idCol].unique()
+            trackIds = store.ids
 
         for trackId in trackIds:
-            trackDf = df[df[idCol] == trackId]
+            trackDf = store.getTrack(trackId)
             if colorCol is None:
                 plt.plot(trackDf[xCol], trackDf[yCol])
             else:
@@ -36,11 +38,12 @@ class TrajectoryVisualizer:
         fig = plt.figure(figsize=(10, 10))
 
         plot_axis = plt.axes (projection = '3d')
+        store = TrackStore(df, idCol)
         if trackIds is None:
-            trackIds = df[idCol].unique()
+            trackIds = store.ids
 
         for trackId in trackIds:
-            trackDf = df[df[idCol] == trackId]
+            trackDf = store.getTrack(trackId)
             timeSpace = np.linspace(0, len(trackDf), len(trackDf))
             if colorCol is None:
                 plot_axis.plot3D(trackDf[xCol], trackDf[yCol], timeSpace)
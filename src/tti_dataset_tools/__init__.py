@@ -1,9 +1,23 @@
 from .ColMapper import ColMapper
+from .TrackStore import TrackStore
+from .TrackParallel import runByTrackChunks, byTrackChunks
+from .SharedTrackTable import SharedTrackTable
+from .MappedTrackStore import MappedTrackStore
 from .TrajectoryProcessor import TrajectoryProcessor
 from .TrajectoryTransformer import TrajectoryTransformer
-from .InfluenceAnalyzer import InfluenceAnalyzer
+from .TrajectoryPipeline import TrajectoryPipeline, PipelineStage
+from .InfluenceAnalyzer import InfluenceAnalyzer, InfluenceAccumulator
 from .models.CrosswalkModel import CrosswalkModel
+from .models.LocalYIndex import LocalYIndex
 from .TrajectoryMetaBuilder import TrajectoryMetaBuilder
 from .TrajectoryUtils import TrajectoryUtils
+from .SceneAssigner import SceneAssigner
+from .InteractionFinder import InteractionFinder
+from .SpatioTemporalIndex import SpatioTemporalIndex
+from .TrajectoryCache import TrajectoryCache
+from .QuantileSketch import QuantileSketch
+from .SyntheticTrackGenerator import SyntheticTrackGenerator
+from .TrajectoryProfiler import TrajectoryProfiler
+from .TrackSchema import TrackSchema
 
 from .patterns.RegularKnotsModel import RegularKnotsModel
\ No newline at end of file
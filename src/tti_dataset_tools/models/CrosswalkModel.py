@@ -6,6 +6,7 @@ from itertools import product
 from typing import *
 from ..ColMapper import ColMapper
 from ..TrajectoryProcessor import TrajectoryProcessor
+from .LocalYIndex import LocalYIndex
 
 
 
@@ -17,6 +18,16 @@ class CrosswalkModel(TrajectoryProcessor):
         
         super().__init__(colMapper)
 
+    def getLocalYIndex(
+            self,
+            tracksDf: Union[pd.DataFrame, LocalYIndex]
+        ) -> LocalYIndex:
+        """
+        The localY index of the tracks. A frame gets a new index on every call, so build it once and pass it to the breakpoint queries to reuse it, e.g., for polygon generations with different intervals. Rebuild it after changing localY or localX.
+        """
+        if isinstance(tracksDf, LocalYIndex):
+            return tracksDf
+        return LocalYIndex(tracksDf, self.localYCol, self.localXCol)
 
     def generateLocalPolygon(
             self,
@@ -152,15 +163,16 @@ class CrosswalkModel(TrajectoryProcessor):
 
     def getAllLocalXAtLocalYBreakpoints(
             self,
-            tracksDf: pd.DataFrame,
+            tracksDf: Union[pd.DataFrame, LocalYIndex],
             yBreakpoints: List[float],
             yTolerance: float
         ) -> Optional[List[float]]:
 
         print(yBreakpoints)
+        index = self.getLocalYIndex(tracksDf)
         breakpointXVals = defaultdict(lambda : [])
         for yBreakpoint in yBreakpoints:
-            xVals = self.getAllLocalXAtLocalYBreakpoint(tracksDf, yBreakpoint, yTolerance)
+            xVals = self.getAllLocalXAtLocalYBreakpoint(index, yBreakpoint, yTolerance)
             if xVals is None:
                 raise Exception(f"no point at y-breakpoint {yBreakpoint}")
             breakpointXVals[yBreakpoint].extend(xVals)
@@ -170,7 +182,7 @@ class CrosswalkModel(TrajectoryProcessor):
 
     def getAllLocalXAtLocalYBreakpoint(
             self,
-            tracksDf: pd.DataFrame,
+            tracksDf: Union[pd.DataFrame, LocalYIndex],
             yBreakpoint: float, 
             yTolerance: float
         ) -> Optional[List[float]]:
@@ -180,14 +192,15 @@ class CrosswalkModel(TrajectoryProcessor):
         yMin = yBreakpoint - yTolerance
         yMax = yBreakpoint + yTolerance
         
-        criterion = tracksDf[self.localYCol].map(
-            lambda y: y >= yMin and y <= yMax
-        )
-        nearbyRows = tracksDf[criterion]
-        if len(nearbyRows) == 0:
+        if isinstance(tracksDf, LocalYIndex):
+            xVals = tracksDf.getXInWindow(yMin, yMax)
+        else: # one window, a scan is cheaper than sorting the frame
+            Y = tracksDf[self.localYCol].to_numpy(dtype=float)
+            xVals = tracksDf[self.localXCol].to_numpy()[(Y >= yMin) & (Y <= yMax)]
+        if len(xVals) == 0:
             return None
         
-        return nearbyRows[self.localXCol].tolist()
+        return xVals.tolist()
 
     def generateScenePolygon(
             self,
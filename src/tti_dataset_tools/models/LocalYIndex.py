@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from typing import *
+
+
+class LocalYIndex:
+    """Rows of a frame sorted once by localY, so the rows within a y window are a searchsorted range instead of a scan over the whole frame. Built once per dataset and reused for any number of breakpoints, tolerances and intervals.
+
+    The index is a snapshot and keeps no reference to the source frame: if localY or localX of the frame are changed in place, build a new one.
+    """
+
+    def __init__(self,
+            tracksDf: pd.DataFrame,
+            localYCol: str,
+            localXCol: str
+        ):
+        self.localYCol = localYCol
+        self.localXCol = localXCol
+
+        Y = tracksDf[localYCol].to_numpy(dtype=float)
+        positions = np.flatnonzero(~np.isnan(Y)) # nan is never within a window
+        order = np.argsort(Y[positions], kind="stable")
+
+        self.positions = positions[order] # row position in the source frame of every sorted y
+        self.Y = Y[self.positions]
+        self.X = tracksDf[localXCol].to_numpy()[self.positions]
+
+    def __len__(self) -> int:
+        return len(self.Y)
+
+    def getRange(self, yMin: float, yMax: float) -> Tuple[int, int]:
+        """start and end in sorted order of the rows with yMin <= y <= yMax"""
+        return np.searchsorted(self.Y, yMin, side="left"), np.searchsorted(self.Y, yMax, side="right")
+
+    def getRanges(self, yBreakpoints: List[float], yTolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """getRange of every breakpoint window at once"""
+        yBreakpoints = np.asarray(yBreakpoints, dtype=float)
+        starts = np.searchsorted(self.Y, yBreakpoints - yTolerance, side="left")
+        ends = np.searchsorted(self.Y, yBreakpoints + yTolerance, side="right")
+        return starts, ends
+
+    def getPositionsInWindow(self, yMin: float, yMax: float) -> np.ndarray:
+        """row positions in the source frame within the window, in row order"""
+        start, end = self.getRange(yMin, yMax)
+        return np.sort(self.positions[start:end])
+
+    def getXInWindow(self, yMin: float, yMax: float) -> np.ndarray:
+        """x of the rows within the window, in row order"""
+        start, end = self.getRange(yMin, yMax)
+        order = np.argsort(self.positions[start:end], kind="stable")
+        return self.X[start:end][order]
@@ -7,6 +7,7 @@ from typing import *
 from ..ColMapper import ColMapper
 from ..TrajectoryProcessor import TrajectoryProcessor
 from ..TrajectoryUtils import TrajectoryUtils
+from ..TrackParallel import byTrackChunks
 import logging
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -20,7 +21,26 @@ class RegularKnotsModel(TrajectoryProcessor):
         ):
         super().__init__(colMapper)
     
-    def getSingleKnotData(self, pedSource: pd.DataFrame, midY: float, midYTolerance: float, plot=True, ignoreBads=False, debug=False) -> pd.DataFrame:
+    def getLogSlopes(self, yDiff: np.ndarray, xDiff: np.ndarray) -> np.ndarray:
+        """log of the slope, negated for negative slopes"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = yDiff / xDiff
+            return np.where(slope > 0, np.log(np.abs(slope)), -np.log(np.abs(slope)))
+
+    def warnLowDiffs(self, diffs: np.ndarray, name: str):
+        numLow = np.count_nonzero(np.abs(diffs) < 0.000001)
+        if numLow > 0:
+            logging.warn(f"{name} is very low for {numLow} segments")
+
+    def getBreakpointXs(self, store, yBreakpoints: List[float], yTolerance: float, byCrossing: bool) -> np.ndarray:
+        """extreme x of every track (rows) at every breakpoint (columns), nan for bads"""
+        if byCrossing:
+            extremes = TrajectoryUtils.getExtremeXAtYCrossingsForAll(store, self.idCol, self.localXCol, self.localYCol, yBreakpoints, self.frameCol)
+        else:
+            extremes = TrajectoryUtils.getExtremeXAtYBreakpointsForAll(store, self.idCol, self.localXCol, self.localYCol, yBreakpoints, yTolerance, self.frameCol)
+        return extremes.to_numpy()
+
+    def getSingleKnotData(self, pedSource: pd.DataFrame, midY: float, midYTolerance: float, plot=True, ignoreBads=False, debug=False, byCrossing=False) -> pd.DataFrame:
         """
         Get the data for a single knot from the dataframe of all pedestrians.
 
@@ -28,167 +48,135 @@ class RegularKnotsModel(TrajectoryProcessor):
             pedSource (pd.DataFrame): _description_
             midY (float): _description_
             midYTolerance (float): _description_
-            plot (bool, optional): _description_. Defaults to True.
+            plot (bool, optional): calls plotSingleKnotData. Defaults to True.
             ignoreBads (bool, optional): _description_. Defaults to False.
+            byCrossing (bool, optional): midX is interpolated where the track crosses midY instead of taken from the points within midYTolerance, so tracks sampled across the breakpoint are not bad. Defaults to False.
 
         Returns:
             pd.DataFrame: _description_
         """
-        pedIds = pedSource[self.idCol].unique()
-        rows = []
-        badTrajectories = []
-        for pedId in pedIds:
-            # print(pedId)
-            pedDf = pedSource[pedSource[self.idCol] == pedId]
-            # print(pedDf.head())
-            
-            midX = TrajectoryUtils.getExtremeXAtYBreakpoint(pedDf, self.localXCol, self.localYCol, midY, midYTolerance)
-            if midX is None:
-                badTrajectories.append(pedId)
-                if debug:
-                    logging.warn(f"midX is None for pedId {pedId}")
-                if ignoreBads:
-                    continue
-                else:
-                    return None
-            # print(midX, candidatesForX)
-            
-            finalX, finalY = pedDf.iloc[-1][self.localXCol], pedDf.iloc[-1][self.localYCol]
-            
-            slope1 = midY / midX
-            if slope1 > 0:
-                slope1 = np.log(slope1)
-            else:
-                slope1 = -np.log(abs(slope1))
-            
-            finalYDiff = (finalY - midY)
-
-            if abs(finalYDiff) < 0.000001:
-                logging.warn(f"finalYDiff is very low {finalYDiff}")
-                # finalYDiff = 0.000001
-            finalXDiff = (finalX - midX)
-            if abs(finalXDiff) < 0.000001:
-                logging.warn(f"finalXDiff is very low {finalXDiff}")
-                # finalXDiff = 0.000001
-
-            slope2 = (finalY - midY) / (finalX - midX)
-
-            if slope2 > 0:
-                slope2 = np.log(slope2)
-            else:
-                slope2 = -np.log(abs(slope2))
-                
-            rows.append((pedId, midX, midY, finalX, finalY, slope1, slope2))
-            if plot:
-                plt.plot([0, midX, finalX], [0, midY, finalY], zorder=1)
-
-        # print(rows)
-            
-        df = pd.DataFrame(rows, columns=[self.idCol, "midX", "midY", "finalX", "finalY", "log-slope1", "log-slope2"])
-
-        if plot:
-            plt.scatter(df["midX"], df["midY"], zorder = 2)
-            plt.scatter(df["finalX"], df["finalY"], zorder = 2)
-            # plt.ylim(-0.2, midY * 2 + 0.2)
-            plt.show()
-
-            sns.displot(df, x="log-slope1", y="log-slope2")
-            # plt.ylim(-0.2, midY * 2 + 0.2)
+        df = self.getSingleKnotTable(pedSource, midY, midYTolerance, ignoreBads, debug, byCrossing)
+        if df is not None and plot:
+            self.plotSingleKnotData(df)
+        return df
+
+    @byTrackChunks(rowwise=False)
+    def getSingleKnotTable(self, pedSource: pd.DataFrame, midY: float, midYTolerance: float, ignoreBads=False, debug=False, byCrossing=False) -> pd.DataFrame:
+        """getSingleKnotData without the plots. Runs by track chunks if nJobs > 1."""
+        store = self.getTrackStore(pedSource)
+        midXs = self.getBreakpointXs(store, [midY], midYTolerance, byCrossing)[:, 0]
+
+        bads = np.isnan(midXs)
+        badTrajectories = store.ids[bads]
+        if debug:
+            for pedId in badTrajectories:
+                logging.warn(f"midX is None for pedId {pedId}")
+        if len(badTrajectories) > 0 and not ignoreBads:
+            return None
+        
+        valid = ~bads
+        midX = midXs[valid]
+        finalX = store.last(self.localXCol)[valid]
+        finalY = store.last(self.localYCol)[valid]
+
+        self.warnLowDiffs(finalY - midY, "finalYDiff")
+        self.warnLowDiffs(finalX - midX, "finalXDiff")
+
+        df = pd.DataFrame({
+            self.idCol: store.ids[valid],
+            "midX": midX,
+            "midY": np.full(len(midX), midY),
+            "finalX": finalX,
+            "finalY": finalY,
+            "log-slope1": self.getLogSlopes(midY, midX),
+            "log-slope2": self.getLogSlopes(finalY - midY, finalX - midX),
+        })
         
         if len(badTrajectories) > 0:
             logging.warn(f"Bad trajectories: {len(badTrajectories)}. \nSet debug=True to see the errors.")
         return df
 
-    def getKnotData(self, pedSource: pd.DataFrame, yBreakpoints: List[float], yTolerance: float, plot=True, addFinal=True, ignoreBads=False, debug=False) -> pd.DataFrame:
-        """Assumes origin is at (0, 0)
+    def plotSingleKnotData(self, df: pd.DataFrame):
+        for _, row in df.iterrows():
+            plt.plot([0, row["midX"], row["finalX"]], [0, row["midY"], row["finalY"]], zorder=1)
+        
+        plt.scatter(df["midX"], df["midY"], zorder = 2)
+        plt.scatter(df["finalX"], df["finalY"], zorder = 2)
+        # plt.ylim(-0.2, midY * 2 + 0.2)
+        plt.show()
+
+        sns.displot(df, x="log-slope1", y="log-slope2")
+
+    def getKnotData(self, pedSource: pd.DataFrame, yBreakpoints: List[float], yTolerance: float, plot=True, addFinal=True, ignoreBads=False, debug=False, byCrossing=False) -> pd.DataFrame:
+        """Assumes origin is at (0, 0). Knots of all pedestrians and breakpoints are extracted at once.
 
         Args:
             pedSource (pd.DataFrame): _description_
             yBreakpoints (List[float]): _description_
             yTolerance (float): _description_
-            plot (bool, optional): _description_. Defaults to True.
+            plot (bool, optional): calls plotKnotData. Defaults to True.
             addFinal (bool, optional): _description_. Defaults to True.
+            byCrossing (bool, optional): x is interpolated where the track crosses each breakpoint instead of taken from the points within yTolerance. yTolerance is not used. Defaults to False.
 
         Returns:
             pd.DataFrame: _description_
         """
         
-        pedIds = pedSource[self.idCol].unique()
         nSlopePoints = len(yBreakpoints)
         if addFinal:
             nSlopePoints += 1
-        rows = []
-        badTrajectories = []
-        badTrajectoryErrors = []
-        for pedId in pedIds:
-            pedDf = pedSource[pedSource[self.idCol] == pedId]
-            XY = [(0, 0)]
-            valid = True
-            for y in yBreakpoints:
-                x = TrajectoryUtils.getExtremeXAtYBreakpoint(pedDf, self.localXCol, self.localYCol, y, yTolerance)
-                if x is None:
-                    badTrajectories.append(pedId)
-                    # badTrajectoryErrors.append(f"X is None for pedId {pedId} at y {y} with tolerance {yTolerance}")
-                    if debug:
-                        logging.info(f"X is None for pedId {pedId} at y {y} with tolerance {yTolerance}")
-                    if ignoreBads:
-                        valid = False
-                        break
-                    else:
-                        return None
-                XY.append((x, y))
-            if not valid:
-                continue
-
-            if addFinal:
-                finalX, finalY = pedDf.iloc[-1][self.localXCol], pedDf.iloc[-1][self.localYCol]
-                XY.append((finalX, finalY))
-            
-            slopes = []
-            for i in range(1, len(XY)):
-                yDiff = XY[i][1] - XY[i - 1][1]
-                xDiff = XY[i][0] - XY[i - 1][0]
-
-                if abs(xDiff) < 0.000001:
-                    logging.warn(f"xDiff is very low {xDiff}")
-                    # xDiff = 0.000001
-                if abs(yDiff) < 0.000001:
-                    logging.warn(f"yDiff is very low {yDiff}")
-                    # yDiff = 0.000001
-                slope = yDiff / xDiff
-                if slope > 0:
-                    slope = np.log(slope)
-                else:
-                    slope = -np.log(abs(slope))
-                slopes.append(slope)
-            
-            rowData = [pedId]
-            for i in range(1, len(XY)):
-                rowData += [XY[i][0], XY[i][1], slopes[i - 1]]
-            rows.append(rowData)
-
-            if plot:
-                X = [x for x, y in XY]
-                Y = [y for x, y in XY]
-                plt.plot(X, Y, zorder=1)
-                plt.scatter(X, Y, zorder=2)
-                # plt.ylim(-0.2, max(Y)+0.2)
-
-        colunmNames = [self.idCol]
-        for i in range(nSlopePoints):
-            colunmNames += [f"x{i+1}", f"y{i+1}", f"log-slope{i+1}"]
+
+        df = self.getKnotTable(pedSource, yBreakpoints, yTolerance, addFinal, ignoreBads, debug, byCrossing)
+        if df is not None and plot:
+            self.plotKnotData(df, nSlopePoints)
+        return df
+
+    @byTrackChunks(rowwise=False)
+    def getKnotTable(self, pedSource: pd.DataFrame, yBreakpoints: List[float], yTolerance: float, addFinal=True, ignoreBads=False, debug=False, byCrossing=False) -> pd.DataFrame:
+        """getKnotData without the plots. Runs by track chunks if nJobs > 1."""
+        store = self.getTrackStore(pedSource)
+        breakpointXs = self.getBreakpointXs(store, yBreakpoints, yTolerance, byCrossing)
+
+        bads = np.isnan(breakpointXs).any(axis=1)
+        badTrajectories = store.ids[bads]
+        if debug:
+            for pedId, xs in zip(badTrajectories, breakpointXs[bads]):
+                y = yBreakpoints[np.flatnonzero(np.isnan(xs))[0]]
+                logging.info(f"X is None for pedId {pedId} at y {y} with tolerance {yTolerance}")
+        if len(badTrajectories) > 0 and not ignoreBads:
+            return None
+
+        valid = ~bads
+        numValid = np.count_nonzero(valid)
+        X = [np.zeros(numValid)] + [breakpointXs[valid, i] for i in range(len(yBreakpoints))]
+        Y = [np.zeros(numValid)] + [np.full(numValid, y) for y in yBreakpoints]
+        if addFinal:
+            X.append(store.last(self.localXCol)[valid])
+            Y.append(store.last(self.localYCol)[valid])
+        
+        columns = {self.idCol: store.ids[valid]}
+        for i in range(1, len(X)):
+            xDiff = X[i] - X[i - 1]
+            yDiff = Y[i] - Y[i - 1]
+            self.warnLowDiffs(xDiff, "xDiff")
+            self.warnLowDiffs(yDiff, "yDiff")
+
+            columns[f"x{i}"] = X[i]
+            columns[f"y{i}"] = Y[i]
+            columns[f"log-slope{i}"] = self.getLogSlopes(yDiff, xDiff)
         
-        df = pd.DataFrame(rows, columns=colunmNames)
-        if plot:
-            for i in range(1, nSlopePoints):
-                sns.displot(df, x=f"log-slope{i}", y=f"log-slope{i+1}")
+        df = pd.DataFrame(columns)
         if len(badTrajectories) > 0:
             logging.warn(f"Bad trajectories: {len(badTrajectories)}. \nSet debug=True to see the errors.")
         return df
-            
-
-
-
 
+    def plotKnotData(self, df: pd.DataFrame, nSlopePoints: int):
+        for _, row in df.iterrows():
+            X = [0] + [row[f"x{i+1}"] for i in range(nSlopePoints)]
+            Y = [0] + [row[f"y{i+1}"] for i in range(nSlopePoints)]
+            plt.plot(X, Y, zorder=1)
+            plt.scatter(X, Y, zorder=2)
+            # plt.ylim(-0.2, max(Y)+0.2)
 
-            
+        for i in range(1, nSlopePoints):
+            sns.displot(df, x=f"log-slope{i}", y=f"log-slope{i+1}")
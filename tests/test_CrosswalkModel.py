@@ -0,0 +1,22 @@
+import pandas as pd
+from tti_dataset_tools import ColMapper, CrosswalkModel
+
+
+def test_breakpoint_queries_see_in_place_updates():
+    colMapper = ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+    model = CrosswalkModel(colMapper)
+    tracksDf = pd.DataFrame({
+        "localX": [1, 2, 3, 4, 5, 6],
+        "localY": [1.0, 2.0, 3.0, 11.0, 12.0, 1.02],
+    })
+
+    assert dict(model.getAllLocalXAtLocalYBreakpoints(tracksDf, [1.0], 0.05)) == {1.0: [1, 6]}
+    assert model.getAllLocalXAtLocalYBreakpoint(tracksDf, 1.0, 0.05) == [1, 6]
+
+    tracksDf["localY"] += 10
+    assert dict(model.getAllLocalXAtLocalYBreakpoints(tracksDf, [11.0, 12.0], 0.05)) == {11.0: [1, 6], 12.0: [2]}
+    assert model.getAllLocalXAtLocalYBreakpoint(tracksDf, 1.0, 0.05) is None
+
+    index = model.getLocalYIndex(tracksDf)
+    assert model.getLocalYIndex(index) is index
+    assert dict(model.getAllLocalXAtLocalYBreakpoints(index, [11.0, 13.0], 0.05)) == {11.0: [1, 6], 13.0: [3]}
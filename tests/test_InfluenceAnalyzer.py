@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, InfluenceAnalyzer, InfluenceAccumulator
+
+
+def test_checkpoints_resume_per_key_and_settings(tmp_path):
+    colMapper = ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+    analyzer = InfluenceAnalyzer(colMapper)
+    rng = np.random.default_rng(0)
+    recordings = {
+        key: pd.DataFrame({"localX": rng.uniform(-3, 3, 200), "localY": rng.uniform(0, 8, 200)})
+        for key in ["a/b", "a_b"]
+    }
+    size = (8, 10)
+    checkpointDir = str(tmp_path)
+
+    assert InfluenceAccumulator.getCheckpointPath(checkpointDir, "a/b") != InfluenceAccumulator.getCheckpointPath(checkpointDir, "a_b")
+
+    expected = analyzer.accumulateRecordings(recordings, size, checkpointDir=checkpointDir)
+    assert sorted(os.listdir(checkpointDir)) == sorted(os.path.basename(InfluenceAccumulator.getCheckpointPath(checkpointDir, key)) for key in recordings)
+
+    resumed = analyzer.accumulateRecordings({key: None for key in recordings}, size, checkpointDir=checkpointDir)
+    np.testing.assert_array_equal(resumed.grid, expected.grid)
+    assert resumed.keys == {"a/b", "a_b"}
+
+    analyzer.unitMultiplier = 5
+    rebuilt = analyzer.accumulateRecordings(recordings, size, checkpointDir=checkpointDir)
+    np.testing.assert_array_equal(rebuilt.grid, analyzer.accumulateRecordings(recordings, size).grid)
+    assert rebuilt.grid.shape != expected.grid.shape
+
+
+def getBruteForceGrid(analyzer: InfluenceAnalyzer, tracksDf: pd.DataFrame, size) -> np.ndarray:
+    """every row spreads its points over every cell of every disk, influence outside the grid is dropped"""
+    grid = analyzer.generateGrid(size)
+    w, h = grid.shape
+    for _, row in tracksDf.iterrows():
+        x, y = analyzer.getGridCoordinates(grid, row)
+        if 0 <= x < w and 0 <= y < h:
+            grid[x, y] += analyzer.influencePoints[0.5]
+        for k, point in analyzer.influencePoints.items():
+            radius = int(k * analyzer.unitMultiplier)
+            for i in range(-radius, radius + 1):
+                for j in range(-radius, radius + 1):
+                    if i**2 + j**2 <= radius**2 and 0 <= x + i < w and 0 <= y + j < h:
+                        grid[x + i, y + j] += point
+    return grid
+
+
+def test_stencils_equal_the_row_by_row_influence():
+    analyzer = InfluenceAnalyzer(ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25))
+    size = (6, 8)
+    rng = np.random.default_rng(1)
+
+    # far from the edges the per row update needs no bounds
+    innerDf = pd.DataFrame({"localX": rng.uniform(-3.5, 3.5, 60), "localY": rng.uniform(2.5, 5.5, 60)})
+    expected = analyzer.generateGrid(size)
+    for _, row in innerDf.iterrows():
+        analyzer.updateInfluencePoints(row, expected, analyzer.influencePoints)
+    grid, X, Y = analyzer.getInfluenceGrid(innerDf, size)
+    np.testing.assert_array_equal(grid, expected)
+
+    # points near, on and beyond the edges, with negative coordinates truncating towards zero
+    edgeDf = pd.DataFrame({
+        "localX": np.concatenate([rng.uniform(-7, 7, 60), [-6, 5.99, -0.05, 0.05, np.nan]]),
+        "localY": np.concatenate([rng.uniform(-1.5, 9.5, 60), [0, 7.99, -0.05, 8.5, 1]]),
+    })
+    expected = getBruteForceGrid(analyzer, edgeDf.dropna(), size)
+    heatMap = analyzer.getInfluenceHeatMap(edgeDf, size)
+    np.testing.assert_array_equal(heatMap.to_numpy().T, expected)
+    np.testing.assert_array_equal(heatMap.columns, np.arange(-60, 60))
+    np.testing.assert_array_equal(heatMap.index, np.arange(0, 80))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tti_dataset_tools import ColMapper, InteractionFinder, TrajectoryUtils
+
+
+def getTracks(numTracks: int, seed: int, firstId: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(5, 60, numTracks)
+    ids = np.repeat(np.arange(firstId, firstId + numTracks), sizes)
+    starts = rng.uniform(-20, 20, (numTracks, 2))
+    initialFrames = rng.integers(0, 200, numTracks)
+    tracksDf = pd.DataFrame({
+        "uniqueTrackId": ids,
+        "frame": np.concatenate([initialFrame + np.arange(size) for initialFrame, size in zip(initialFrames, sizes)]),
+        "x": starts[ids - firstId, 0] + rng.normal(0, 0.6, sizes.sum()).cumsum(),
+        "y": starts[ids - firstId, 1] + rng.normal(0, 0.6, sizes.sum()).cumsum(),
+    })
+    return tracksDf.sample(frac=1, random_state=seed) # rows in any order
+
+
+def getBruteForcePairs(tracksDf: pd.DataFrame, otherDf: pd.DataFrame, maxDistance: float, timeOverlap: bool) -> pd.DataFrame:
+    """doPathsIntersect and minPathDistance on every pair of tracks"""
+    tracks = {trackId: df.sort_values("frame") for trackId, df in tracksDf.groupby("uniqueTrackId")}
+    others = tracks if otherDf is None else {trackId: df.sort_values("frame") for trackId, df in otherDf.groupby("uniqueTrackId")}
+    pairs = []
+    for trackId1, traj1 in tracks.items():
+        for trackId2, traj2 in others.items():
+            if otherDf is None and trackId1 >= trackId2:
+                continue
+            overlapStart = max(traj1["frame"].min(), traj2["frame"].min())
+            overlapEnd = min(traj1["frame"].max(), traj2["frame"].max())
+            if timeOverlap and overlapStart > overlapEnd:
+                continue
+            intersects = TrajectoryUtils.doPathsIntersect(traj1, traj2, "x", "y")
+            distance = 0 if intersects else TrajectoryUtils.minPathDistance(traj1, traj2, "x", "y")
+            if distance <= maxDistance:
+                pairs.append((trackId1, trackId2, overlapStart, overlapEnd, intersects, distance))
+    return pd.DataFrame(pairs, columns=["trackId1", "trackId2", "overlapStart", "overlapEnd", "intersects", "distance"])
+
+
+@pytest.mark.parametrize("withOther, maxDistance, timeOverlap", [
+    (False, 0, True),
+    (False, 1.5, False),
+    (True, 0, False),
+    (True, 3, True),
+])
+def test_interactions_equal_the_pairwise_tests(withOther, maxDistance, timeOverlap):
+    finder = InteractionFinder(ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25))
+    tracksDf = getTracks(60, 5)
+    otherDf = getTracks(40, 6, firstId=1000) if withOther else None
+
+    expected = getBruteForcePairs(tracksDf, otherDf, maxDistance, timeOverlap)
+    pairs = finder.getPathInteractions(tracksDf, otherDf, maxDistance=maxDistance, timeOverlap=timeOverlap)
+
+    if not withOther: # unordered pairs, the finder takes them in order of appearance
+        swapped = pairs["trackId1"] > pairs["trackId2"]
+        pairs.loc[swapped, ["trackId1", "trackId2"]] = pairs.loc[swapped, ["trackId2", "trackId1"]].to_numpy()
+    pairs = pairs.sort_values(["trackId1", "trackId2"]).reset_index(drop=True)
+
+    assert 0 < len(expected) < len(tracksDf["uniqueTrackId"].unique()) ** 2 / 2 # the pruning drops pairs
+    pd.testing.assert_frame_equal(pairs, expected, check_dtype=False)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, MappedTrackStore, TrackStore, TrajectoryTransformer
+
+
+colMapper = ColMapper("id", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+
+
+def getRecording(firstId: int, numTracks: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(3, 30, numTracks)
+    tracksDf = pd.DataFrame({
+        "id": np.repeat([f"ped{firstId + i}" for i in range(numTracks)], sizes),
+        "frame": np.concatenate([np.arange(size) for size in sizes]).astype(np.int32),
+        "x": rng.normal(size=sizes.sum()),
+        "y": rng.normal(size=sizes.sum()).astype(np.float32),
+        "class": "pedestrian",
+    })
+    return tracksDf.sample(frac=1, random_state=seed) # rows of a track are not contiguous
+
+
+def test_append_then_read_chunks_and_apply(tmp_path):
+    recordings = [getRecording(0, 20, 1), getRecording(20, 15, 2)]
+    MappedTrackStore.fromDfs(str(tmp_path), recordings, "id", "frame")
+
+    store = MappedTrackStore(str(tmp_path)) # reopened from disk
+    expected = TrackStore(pd.concat(recordings), "id", "frame")
+    assert store.ids.dtype == object
+    assert store.ids.tolist() == expected.ids.tolist() # tracks in order of appearance
+    assert store.columns == ["frame", "x", "y"] # class is not numeric
+    assert store.dtypes["y"] == np.float32 and store.dtypes["frame"] == np.int32
+
+    trackDf = store.getTrack("ped21")
+    pd.testing.assert_frame_equal(trackDf.reset_index(drop=True), expected.getTrack("ped21")[["id", "frame", "x", "y"]].reset_index(drop=True))
+
+    chunks = list(store.iterChunks(maxRows=100))
+    assert len(chunks) > 1
+    chunkedDf = pd.concat(chunks)
+    assert chunkedDf.index.tolist() == list(range(store.numRows()))
+    pd.testing.assert_frame_equal(chunkedDf.reset_index(drop=True), expected.df[["id", "frame", "x", "y"]].reset_index(drop=True))
+
+    transformer = TrajectoryTransformer(colMapper)
+    def deriveVelocities(chunk):
+        transformer.deriveAxisVelocities(chunk)
+    store.apply(deriveVelocities, ["xVelocity", "yVelocity"], maxRows=100)
+
+    expectedDf = expected.df.copy()
+    transformer.deriveAxisVelocities(expectedDf)
+    reopened = MappedTrackStore(str(tmp_path), mode="r")
+    np.testing.assert_allclose(reopened.column("xVelocity"), expectedDf["xVelocity"])
+    np.testing.assert_allclose(reopened.column("yVelocity"), expectedDf["yVelocity"])
+
+
+def test_empty_store_ids_have_a_dtype(tmp_path):
+    store = MappedTrackStore.create(str(tmp_path / "numeric"), "id", "frame", idDtype=np.int64)
+    assert MappedTrackStore(store.directory).ids.dtype == np.int64
+    store.append(pd.DataFrame({"id": [4, 4, 9], "frame": [1, 0, 0], "x": [1.0, 0, 2]}))
+    reopened = MappedTrackStore(store.directory)
+    assert reopened.ids.dtype == np.int64 and reopened.ids.tolist() == [4, 9]
+    assert reopened.getTrack(4)["x"].tolist() == [0, 1]
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from tti_dataset_tools import QuantileSketch
+
+
+def test_merged_sketches_are_within_the_rank_error():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=100_000)
+    sketch = QuantileSketch(200, seed=0)
+    for chunk in np.array_split(data, 10):
+        sketch.merge(QuantileSketch(200, seed=1).update(chunk))
+
+    qs = np.linspace(0.01, 0.99, 99)
+    ranks = np.searchsorted(np.sort(data), sketch.quantiles(qs), side="right") / len(data)
+    assert np.abs(ranks - qs).max() < 3.5 / 200
+    assert sketch.count == len(data)
+
+
+def test_merge_rejects_another_k():
+    with pytest.raises(ValueError):
+        QuantileSketch(200).merge(QuantileSketch(100).update([1.0, 2.0]))
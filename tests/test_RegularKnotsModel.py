@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, RegularKnotsModel, TrajectoryUtils
+
+
+def getPedestrians() -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    tracks = []
+    for pedId in range(12):
+        y = np.arange(0, 10.05, 0.05)
+        x = np.cumsum(rng.normal(0, 0.02, len(y))) + rng.uniform(-1, 1) * y / 10
+        tracks.append(pd.DataFrame({"pedId": pedId, "frame": np.arange(len(y)), "localX": x, "localY": y}))
+    return pd.concat(tracks, ignore_index=True)
+
+
+def getPerTrackKnots(pedSource: pd.DataFrame, yBreakpoints, yTolerance) -> pd.DataFrame:
+    """the per track loop the batched extraction replaced"""
+    rows = []
+    for pedId in pedSource["pedId"].unique():
+        pedDf = pedSource[pedSource["pedId"] == pedId]
+        XY = [(0, 0)] + [(TrajectoryUtils.getExtremeXAtYBreakpoint(pedDf, "localX", "localY", y, yTolerance), y) for y in yBreakpoints]
+        XY.append((pedDf.iloc[-1]["localX"], pedDf.iloc[-1]["localY"]))
+        row = [pedId]
+        for i in range(1, len(XY)):
+            slope = (XY[i][1] - XY[i - 1][1]) / (XY[i][0] - XY[i - 1][0])
+            row += [XY[i][0], XY[i][1], np.log(slope) if slope > 0 else -np.log(abs(slope))]
+        rows.append(row)
+    columns = ["pedId"] + [f"{name}{i + 1}" for i in range(len(yBreakpoints) + 1) for name in ("x", "y", "log-slope")]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def test_batched_knots_equal_the_per_track_loop():
+    model = RegularKnotsModel(ColMapper("pedId", "x", "y", "xVelocity", "yVelocity", "speed", 25))
+    pedSource = getPedestrians()
+
+    knotsDf = model.getKnotData(pedSource, [2.5, 5, 7.5], 0.05, plot=False)
+    pd.testing.assert_frame_equal(knotsDf, getPerTrackKnots(pedSource, [2.5, 5, 7.5], 0.05), check_dtype=False)
+
+    shortDf = pd.DataFrame({"pedId": 99, "frame": np.arange(81), "localX": 0.1, "localY": np.arange(81) * 0.05}) # stops at y = 4, bad for 5 and 7.5
+    withBadDf = pd.concat([shortDf, pedSource], ignore_index=True)
+    assert model.getKnotData(withBadDf, [2.5, 5, 7.5], 0.05, plot=False) is None
+    pd.testing.assert_frame_equal(model.getKnotData(withBadDf, [2.5, 5, 7.5], 0.05, plot=False, ignoreBads=True), knotsDf)
+
+    singleDf = model.getSingleKnotData(pedSource, 5, 0.05, plot=False)
+    expected = getPerTrackKnots(pedSource, [5], 0.05)
+    np.testing.assert_allclose(singleDf["midX"], expected["x1"])
+    np.testing.assert_allclose(singleDf["finalX"], expected["x2"])
+    np.testing.assert_allclose(singleDf["log-slope1"], expected["log-slope1"])
+    np.testing.assert_allclose(singleDf["log-slope2"], expected["log-slope2"])
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, SceneAssigner, TrajectoryUtils
+
+
+def getTracks(numTracks: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 100, numTracks)
+    ids = np.repeat(np.arange(numTracks), sizes)
+    starts = rng.uniform(-60, 60, (numTracks, 2)) # tracks spread over the scenes
+    return pd.DataFrame({
+        "uniqueTrackId": ids,
+        "frame": np.concatenate([np.arange(size) for size in sizes]),
+        "x": starts[ids, 0] + rng.normal(0, 0.5, sizes.sum()).cumsum(),
+        "y": starts[ids, 1] + rng.normal(0, 0.5, sizes.sum()).cumsum(),
+    })
+
+
+def test_assign_equals_the_pairwise_intersection_test():
+    sceneConfigs = {
+        f"scene{i}": {"centerX": centerX, "centerY": centerY, "angle": angle, "roadWidth": 5 + i}
+        for i, (centerX, centerY, angle) in enumerate([(-30, -30, 0), (0, 0, 30), (12, 4, 75), (40, 40, -45), (-40, 35, 120)])
+    }
+    boxWidth, boxHeight = 20, 12
+    tracksDf = getTracks(300, 3)
+    assigner = SceneAssigner(ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25), sceneConfigs, boxWidth, boxHeight)
+
+    expected = [] # every (scene, track) pair, the way the assignment was done before
+    for sceneId, sceneConfig in sceneConfigs.items():
+        scenePolygon = TrajectoryUtils.scenePolygon(sceneConfig, boxWidth, boxHeight)
+        for _, trackDf in tracksDf.groupby("uniqueTrackId"):
+            df = TrajectoryUtils.getDfIfDfIntersect(sceneId, sceneConfig, scenePolygon, trackDf, "x", "y")
+            if df is not None:
+                expected.append(df)
+    expectedDf = pd.concat(expected, ignore_index=True)
+
+    assignedDf = assigner.assign(tracksDf)
+    assert len(expectedDf) > 0 and expectedDf["uniqueTrackId"].nunique() < tracksDf["uniqueTrackId"].nunique()
+    assert expectedDf.duplicated(["uniqueTrackId", "frame"]).any() # some tracks are in several scenes
+
+    byRow = ["sceneId", "uniqueTrackId", "frame"]
+    pd.testing.assert_frame_equal(
+        assignedDf.sort_values(byRow).reset_index(drop=True),
+        expectedDf.sort_values(byRow).reset_index(drop=True),
+        check_dtype=False
+    )
+
+    mapping = assigner.getSceneMapping(tracksDf)
+    expectedMapping = expectedDf.drop_duplicates(["sceneId", "uniqueTrackId"])
+    assert list(mapping["sceneId"]) == sorted(mapping["sceneId"], key=list(sceneConfigs).index) # ordered by scene
+    assert set(zip(mapping["sceneId"], mapping["uniqueTrackId"])) == set(zip(expectedMapping["sceneId"], expectedMapping["uniqueTrackId"]))
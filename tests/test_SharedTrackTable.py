@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from multiprocessing import shared_memory
+from tti_dataset_tools import SharedTrackTable, TrackStore
+
+
+def computeSpeed(table: SharedTrackTable, firstTrack: int, lastTrack: int) -> int:
+    """speed of the rows of the tracks, one value per track for the row count"""
+    rows = table.getTrackRows(firstTrack, lastTrack)
+    X = table.column("x")[rows]
+    Y = table.column("y")[rows]
+    speed = np.zeros(len(X))
+    speed[1:] = np.hypot(np.diff(X), np.diff(Y))
+    starts = table.starts[firstTrack:lastTrack] - rows.start
+    speed[starts] = 0 # no difference across tracks
+    table.column("speed")[rows] = speed
+    table.column("numRows")[firstTrack:lastTrack] = table.ends[firstTrack:lastTrack] - table.starts[firstTrack:lastTrack]
+    return lastTrack - firstTrack
+
+
+def getTracks() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(2, 40, 60)
+    tracksDf = pd.DataFrame({
+        "id": np.repeat([f"t{i}" for i in range(60)], sizes),
+        "frame": np.concatenate([np.arange(size) for size in sizes]),
+        "x": rng.normal(size=sizes.sum()),
+        "y": rng.normal(size=sizes.sum()),
+    })
+    return tracksDf.sample(frac=1, random_state=0)
+
+
+@pytest.mark.parametrize("nJobs", [1, 3])
+def test_map_and_collect_equal_a_serial_run(nJobs):
+    tracksDf = getTracks()
+    expected = TrackStore(tracksDf, "id", "frame")
+    speed = np.zeros(expected.numRows())
+    speed[1:] = np.hypot(np.diff(expected.column("x")), np.diff(expected.column("y")))
+    speed[expected.starts] = 0
+
+    with SharedTrackTable.publish(tracksDf, "id", ["x", "y"], "frame") as table:
+        blockNames = [blockName for blockName, _, _ in table.getSpec()["arrays"].values()]
+        table.addOutput("speed")
+        numRows = table.addOutput("numRows", dtype=np.int64, fill=0, shape=(len(table),))
+        counts = table.map(computeSpeed, nJobs=nJobs, numChunks=7)
+
+        assert sum(counts) == len(table) == len(expected)
+        assert table.ids.tolist() == expected.ids.tolist()
+        np.testing.assert_array_equal(numRows, expected.sizes)
+        pd.testing.assert_frame_equal(table.toDataFrame(columns=["frame", "x", "y"]).reset_index(drop=True), expected.df.reset_index(drop=True))
+
+        outputDf = tracksDf.copy()
+        table.collectOutputs(outputDf)
+        assert "numRows" not in outputDf # one value per track, not collected
+        np.testing.assert_allclose(outputDf["speed"], expected.toOriginalOrder(speed))
+        blockNames += [blockName for blockName, _, _ in table.getSpec()["arrays"].values()]
+
+    for blockName in set(blockNames): # the owner freed every block
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=blockName)
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, SpatioTemporalIndex
+
+
+def test_k_nearest_equals_brute_force_inside_and_outside_the_grid():
+    colMapper = ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+    rng = np.random.default_rng(0)
+    tracksDf = pd.DataFrame({
+        "uniqueTrackId": np.arange(5000),
+        "frame": rng.integers(0, 2, 5000),
+        "x": rng.uniform(0, 20, 5000),
+        "y": rng.uniform(0, 20, 5000),
+    })
+    index = SpatioTemporalIndex(colMapper, tracksDf, cellSize=2)
+
+    frames = np.array([0, 0, 1, 1])
+    X = np.array([10.0, 500.0, -30.0, 19.9])
+    Y = np.array([10.0, 500.0, 7.0, 0.1])
+    probes, positions, distances = index.queryKNearest(frames, X, Y, k=3)
+
+    for probe in range(len(frames)):
+        frameDf = tracksDf[tracksDf["frame"] == frames[probe]]
+        expected = np.sort(np.hypot(frameDf["x"] - X[probe], frameDf["y"] - Y[probe]).to_numpy())[:3]
+        np.testing.assert_allclose(distances[probes == probe], expected)
+        np.testing.assert_allclose(
+            np.hypot(tracksDf["x"].to_numpy()[positions[probes == probe]] - X[probe], tracksDf["y"].to_numpy()[positions[probes == probe]] - Y[probe]),
+            expected
+        )
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tti_dataset_tools import ColMapper, TrajectoryTransformer, TrajectoryMetaBuilder, SyntheticTrackGenerator
+from tti_dataset_tools.patterns.RegularKnotsModel import RegularKnotsModel
+
+
+NJOBS = 3
+
+
+@pytest.fixture(scope="module")
+def colMapper():
+    return ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+
+
+@pytest.fixture(scope="module")
+def tracksDf(colMapper):
+    """interleaved rows with a non default index, so chunking has to reorder"""
+    tracksDf = SyntheticTrackGenerator(colMapper, seed=1).generate(60, fps=5)
+    tracksDf = tracksDf.sample(frac=1, random_state=0)
+    tracksDf.index = tracksDf.index + 1000
+    TrajectoryTransformer(colMapper).translateAllToLocalSource(tracksDf)
+    return tracksDf
+
+
+def getProcessors(cls, colMapper):
+    serial = cls(colMapper)
+    parallel = cls(colMapper).setNJobs(NJOBS, minParallelRows=10)
+    return serial, parallel
+
+
+def assertSame(serialResult, parallelResult):
+    if isinstance(serialResult, tuple):
+        assert len(serialResult) == len(parallelResult)
+        for serialItem, parallelItem in zip(serialResult, parallelResult):
+            assertSame(serialItem, parallelItem)
+    elif isinstance(serialResult, pd.DataFrame):
+        pd.testing.assert_frame_equal(serialResult, parallelResult)
+    elif isinstance(serialResult, pd.Series):
+        pd.testing.assert_series_equal(serialResult, parallelResult)
+    else:
+        assert list(serialResult) == list(parallelResult)
+
+
+@pytest.mark.parametrize("methodName, args, kwargs", [
+    ("translateAllToLocalSource", (), {}),
+    ("deriveAxisVelocities", (), {}),
+    ("deriveKinematics", (), {}),
+    ("deriveDisplacements", (), {"localAxis": True}),
+    ("trimHeadAndTailForAll", (), {}),
+    ("convertTracksToNorth", ("localX", "localY"), {}),
+    ("convertTracksToEast", ("localX", "localY"), {}),
+    ("convertTracksToNorth", ("localX", "localY"), {"inplace": True}),
+    ("convertTracksToEast", ("localX", "localY"), {"inplace": True}),
+])
+def test_transformer_serial_equals_parallel(colMapper, tracksDf, methodName, args, kwargs):
+    serial, parallel = getProcessors(TrajectoryTransformer, colMapper)
+    serialDf = tracksDf.copy()
+    parallelDf = tracksDf.copy()
+
+    serialResult = getattr(serial, methodName)(serialDf, *args, **kwargs)
+    parallelResult = getattr(parallel, methodName)(parallelDf, *args, **kwargs)
+
+    if serialResult is not None:
+        assertSame(serialResult, parallelResult)
+    pd.testing.assert_frame_equal(serialDf, parallelDf)
+
+
+def test_speed_serial_equals_parallel(colMapper, tracksDf):
+    serial, parallel = getProcessors(TrajectoryTransformer, colMapper)
+    serialDf = tracksDf.copy()
+    parallelDf = tracksDf.copy()
+    for processor, df in [(serial, serialDf), (parallel, parallelDf)]:
+        processor.deriveAxisVelocities(df)
+        processor.deriveSpeed(df)
+        processor.smoothenSpeed(df)
+    pd.testing.assert_frame_equal(serialDf, parallelDf)
+
+
+def test_rerun_after_editing_some_tracks(colMapper, tracksDf):
+    """columns that change only in some chunks are written back for all the rows"""
+    serial, parallel = getProcessors(TrajectoryTransformer, colMapper)
+    serialDf = tracksDf.copy()
+    parallelDf = tracksDf.copy()
+    edited = tracksDf["uniqueTrackId"].unique()[:5]
+    for processor, df in [(serial, serialDf), (parallel, parallelDf)]:
+        processor.deriveAxisVelocities(df)
+        df.loc[df["uniqueTrackId"].isin(edited), "x"] += 1.5
+        df.loc[df["uniqueTrackId"].isin(edited), "x"] *= 1.1
+        processor.deriveAxisVelocities(df)
+
+    assert not parallelDf["xVelocity"].isna().any()
+    pd.testing.assert_frame_equal(serialDf, parallelDf)
+
+
+def test_meta_serial_equals_parallel(colMapper, tracksDf):
+    serial, parallel = getProcessors(TrajectoryMetaBuilder, colMapper)
+    assertSame(serial.getMetaDf(tracksDf, "x", "y"), parallel.getMetaDf(tracksDf, "x", "y"))
+    assertSame(serial.build([tracksDf, tracksDf], "x", "y", nJobs=2), parallel.build([tracksDf, tracksDf], "x", "y", nJobs=2))
+
+
+def test_knots_serial_equals_parallel(colMapper, tracksDf):
+    pedDf = tracksDf[tracksDf["class"] == "pedestrian"].copy()
+    _, pedDf = TrajectoryTransformer(colMapper).convertTracksToNorth(pedDf, "localX", "localY")
+    serial, parallel = getProcessors(RegularKnotsModel, colMapper)
+
+    assertSame(
+        serial.getSingleKnotTable(pedDf, 5, 0.5, ignoreBads=True),
+        parallel.getSingleKnotTable(pedDf, 5, 0.5, ignoreBads=True)
+    )
+    assertSame(
+        serial.getKnotTable(pedDf, [2.5, 5, 7.5], 0.5, ignoreBads=True),
+        parallel.getKnotTable(pedDf, [2.5, 5, 7.5], 0.5, ignoreBads=True)
+    )
+    assertSame(
+        serial.getKnotTable(pedDf, [2.5, 5, 7.5], 0.5, byCrossing=True, ignoreBads=True),
+        parallel.getKnotTable(pedDf, [2.5, 5, 7.5], 0.5, byCrossing=True, ignoreBads=True)
+    )
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, TrackSchema
+
+
+def getColMapper() -> ColMapper:
+    return ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+
+
+def getTables():
+    rng = np.random.default_rng(0)
+    ids = np.repeat(["rec1_7", "rec1_3", "rec2_7"], 4)
+    tracksDf = pd.DataFrame({
+        "uniqueTrackId": ids,
+        "frame": np.tile(np.arange(4), 3),
+        "x": rng.uniform(-50, 50, 12),
+        "y": rng.uniform(-50, 50, 12),
+        "localX": 1e7 + rng.uniform(0, 1, 12), # float32 is off by more than the tolerance
+        "class": np.repeat(["car", "pedestrian", "car"], 4),
+        "verticalDirection": np.repeat(["NORTH", "SOUTH", "NORTH"], 4),
+    })
+    tracksMeta = pd.DataFrame({
+        "uniqueTrackId": ["rec2_7", "rec3_1", "rec1_7"], # a new id and another order
+        "speed": [1.5, np.nan, 0.25],
+        "class": ["car", "bicycle", "car"],
+    })
+    return tracksDf, tracksMeta
+
+
+def test_compact_and_restore_round_trip(tmp_path):
+    tracksDf, tracksMeta = getTables()
+    originalDf = tracksDf.copy()
+    schema = TrackSchema(getColMapper())
+
+    compactDf = schema.compact(tracksDf)
+    compactMeta = schema.compact(tracksMeta)
+    pd.testing.assert_frame_equal(tracksDf, originalDf) # not changed in place
+
+    assert compactDf["uniqueTrackId"].dtype == np.int32
+    assert isinstance(compactDf["class"].dtype, pd.CategoricalDtype)
+    assert isinstance(compactDf["verticalDirection"].dtype, pd.CategoricalDtype)
+    assert compactDf["x"].dtype == np.float32 and compactDf["localX"].dtype == np.float64
+    assert compactMeta["speed"].dtype == np.float32
+    assert schema.getSavedBytes() >= 0
+
+    # both tables share the codes
+    assert schema.encodeId("rec2_7") == compactDf["uniqueTrackId"].iloc[-1] == compactMeta["uniqueTrackId"].iloc[0]
+    np.testing.assert_array_equal(schema.decodeIds(compactMeta["uniqueTrackId"]), tracksMeta["uniqueTrackId"])
+
+    def assertRestored(schema: TrackSchema):
+        pd.testing.assert_frame_equal(schema.restore(compactDf), tracksDf, check_exact=False, rtol=0, atol=schema.tolerance)
+        pd.testing.assert_frame_equal(schema.restore(compactMeta), tracksMeta, check_exact=False, rtol=0, atol=schema.tolerance)
+
+    assertRestored(schema)
+    restoredDf = schema.restore(compactDf)
+    pd.testing.assert_series_equal(restoredDf["localX"], tracksDf["localX"]) # kept columns are exact
+    assert restoredDf["x"].dtype == np.float64 and restoredDf["uniqueTrackId"].tolist() == tracksDf["uniqueTrackId"].tolist()
+
+    # another session restores with the saved schema
+    path = str(tmp_path / "schema.json")
+    schema.save(path)
+    assertRestored(TrackSchema(getColMapper()).load(path))
+
+    csvPath = str(tmp_path / "tracks.csv")
+    schema.toCsv(compactDf, csvPath)
+    pd.testing.assert_frame_equal(pd.read_csv(csvPath), restoredDf, check_dtype=False)
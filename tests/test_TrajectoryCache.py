@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, TrajectoryCache
+
+
+def test_cache_hits_until_the_source_changes(tmp_path):
+    csvPath = str(tmp_path / "tracks.csv")
+    tracksDf = pd.DataFrame({
+        "uniqueTrackId": np.repeat([3, 1, 2], 4),
+        "frame": np.tile(np.arange(4), 3),
+        "x": np.linspace(0, 1, 12),
+        "class": pd.Categorical(np.repeat(["car", "pedestrian", "car"], 4)),
+    })
+    tracksDf.to_csv(csvPath, index=False)
+
+    cache = TrajectoryCache(str(tmp_path / "cache"), ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25), fmt="npz")
+    calls = []
+    def compute():
+        calls.append(1)
+        df = pd.read_csv(csvPath)
+        df["class"] = df["class"].astype("category")
+        return df
+
+    first = cache.getOrCompute("tracks", compute, sources=[csvPath], params={"fps": 25})
+    second = cache.getOrCompute("tracks", compute, sources=[csvPath], params={"fps": 25})
+    assert len(calls) == 1 # hit
+    pd.testing.assert_frame_equal(second, first)
+    pd.testing.assert_frame_equal(second, tracksDf)
+
+    onlyX = cache.getOrCompute("tracks", compute, sources=[csvPath], params={"fps": 25}, columns=["frame", "x"])
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(onlyX, tracksDf[["frame", "x"]])
+
+    cache.getOrCompute("tracks", compute, sources=[csvPath], params={"fps": 30})
+    assert len(calls) == 2 # other params miss
+
+    stat = os.stat(csvPath)
+    os.utime(csvPath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9)) # same content, new mtime
+    cache.getOrCompute("tracks", compute, sources=[csvPath], params={"fps": 25})
+    assert len(calls) == 3
+    cache.getOrCompute("tracks", compute, sources=[csvPath], params={"fps": 25})
+    assert len(calls) == 3
+
+    assert len(os.listdir(cache.cacheDir)) == 3
+    cache.clear("tracks")
+    assert len(os.listdir(cache.cacheDir)) == 0
+
+
+def test_read_csv_loads_only_the_requested_columns(tmp_path):
+    csvPath = str(tmp_path / "recording 01.csv")
+    pd.DataFrame({"frame": [0, 1, 2], "x": [0.5, 1.5, 2.5], "y": [1.0, 2.0, 3.0]}).to_csv(csvPath, index=False)
+    cache = TrajectoryCache(str(tmp_path / "cache"), fmt="npz")
+
+    full = cache.readCsv(csvPath)
+    key = cache.getKey("recording 01", [csvPath], {"readCsv": {}})
+    assert cache.has(key) and os.path.basename(cache.getPath(key)).startswith("recording_01-")
+
+    pd.testing.assert_frame_equal(cache.readCsv(csvPath, columns=["y", "frame"]), full[["y", "frame"]])
+    pd.testing.assert_frame_equal(cache.load(key), full)
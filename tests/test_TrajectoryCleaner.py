@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+from tti_dataset_tools import ColMapper
+from tti_dataset_tools.TrajectoryCleaner import CleaningCriterion, TrajectoryCleaner
+
+
+def getCleaner() -> TrajectoryCleaner:
+    colMapper = ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+    return TrajectoryCleaner(colMapper, minSpeed=0, maxSpeed=3, minYDisplacement=1, maxXDisplacement=2)
+
+
+def test_no_criteria_reject_nothing():
+    cleaner = getCleaner()
+    tracksDf = pd.DataFrame({"uniqueTrackId": [1, 1, 2], "speed": [1.0, 5.0, 2.0]})
+
+    rejections = cleaner.getRejections(tracksDf, [])
+    assert len(rejections) == 0
+    assert list(rejections.columns) == list(cleaner.getRejections(tracksDf, [CleaningCriterion("speed", "speed", upper=3)]).columns)
+
+    cleanedDf, rejections = cleaner.cleanByCriteria(tracksDf, [])
+    pd.testing.assert_frame_equal(cleanedDf, tracksDf)
+
+
+def test_duplicate_criterion_names_are_rejected():
+    cleaner = getCleaner()
+    tracksDf = pd.DataFrame({"uniqueTrackId": [1, 1, 2], "speed": [1.0, 5.0, 2.0]})
+    criteria = [CleaningCriterion("speed", "speed", upper=3), CleaningCriterion("speed", "speed", "mean", upper=2)]
+    with pytest.raises(ValueError):
+        cleaner.getRejections(tracksDf, criteria)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from tti_dataset_tools import ColMapper, SyntheticTrackGenerator, TrackStore, TrajectoryPipeline, TrajectoryTransformer
+from tti_dataset_tools.TrajectoryCleaner import CleaningCriterion, TrajectoryCleaner
+
+
+colMapper = ColMapper("uniqueTrackId", "x", "y", "xVelocity", "yVelocity", "speed", 25)
+
+
+def getTracks() -> pd.DataFrame:
+    tracksDf = SyntheticTrackGenerator(colMapper, seed=1).generate(40, fps=5)
+    tracksDf["verticalDirection"] = np.where(tracksDf.groupby("uniqueTrackId")["y"].transform(lambda y: y.iloc[-1] < y.iloc[0]), "SOUTH", "NORTH")
+    return tracksDf.sample(frac=1, random_state=0)
+
+
+def getPipeline(maxSpeed: float) -> TrajectoryPipeline:
+    pipeline = TrajectoryPipeline(colMapper)
+    pipeline.translateToLocalSource().deriveAxisVelocities().deriveSpeed().smoothenSpeed().deriveDisplacements()
+    return pipeline.clean(maxSpeed=maxSpeed).convertToNorth()
+
+
+def runOneByOne(tracksDf: pd.DataFrame, maxSpeed: float) -> pd.DataFrame:
+    transformer = TrajectoryTransformer(colMapper)
+    tracksDf = TrackStore(tracksDf, "uniqueTrackId", "frame").df.copy() # the pipeline groups tracks in order of appearance
+    transformer.translateAllToLocalSource(tracksDf)
+    transformer.deriveAxisVelocities(tracksDf)
+    transformer.deriveSpeed(tracksDf)
+    transformer.smoothenSpeed(tracksDf)
+    transformer.deriveDisplacements(tracksDf)
+    cleaner = TrajectoryCleaner(colMapper, None, maxSpeed, None, None)
+    tracksDf, _ = cleaner.cleanByCriteria(tracksDf, [CleaningCriterion("speed", "speed", "max", upper=maxSpeed)])
+    _, tracksDf = transformer.convertTracksToNorth(tracksDf, "localX", "localY")
+    return tracksDf
+
+
+def test_pipeline_equals_the_stages_one_by_one_and_reruns_only_later_stages():
+    tracksDf = getTracks()
+    original = tracksDf.copy()
+    pipeline = getPipeline(maxSpeed=12)
+
+    ran = []
+    runStage, runFusedStage = pipeline.runStage, pipeline.runFusedStage
+    pipeline.runStage = lambda stage, df: ran.append(stage.name) or runStage(stage, df)
+    pipeline.runFusedStage = lambda stage, store: ran.append(stage.name) or runFusedStage(stage, store)
+
+    outputDf = pipeline.run(tracksDf)
+    pd.testing.assert_frame_equal(outputDf, runOneByOne(tracksDf, 12))
+    pd.testing.assert_frame_equal(tracksDf, original)
+    assert len(ran) == 7
+
+    ran.clear()
+    pipeline.setParams("clean", maxSpeed=9)
+    outputDf = pipeline.run(tracksDf)
+    assert ran == ["clean", "convertToNorth"]
+    pd.testing.assert_frame_equal(outputDf, runOneByOne(tracksDf, 9))
+    assert outputDf["uniqueTrackId"].nunique() < runOneByOne(tracksDf, 12)["uniqueTrackId"].nunique()
+
+    ran.clear()
+    outputDf["localY"] = 0.0
+    outputDf["speed"] += 1 # changes to the output do not reach the memo
+    pd.testing.assert_frame_equal(pipeline.run(tracksDf), runOneByOne(tracksDf, 9))
+    assert ran == []
+
+
+def test_pipeline_reruns_after_in_place_edits():
+    tracksDf = getTracks()
+    pipeline = getPipeline(maxSpeed=12)
+    pipeline.run(tracksDf)
+
+    tracksDf["x"] *= 2 # faster tracks
+    pd.testing.assert_frame_equal(pipeline.run(tracksDf), runOneByOne(tracksDf, 12))
+
+    tracksDf["x"] /= 2
+    pipeline.run(tracksDf, inputKey="recording-1")
+    tracksDf["x"] *= 2
+    pd.testing.assert_frame_equal(pipeline.run(tracksDf, inputKey="recording-2"), runOneByOne(tracksDf, 12))
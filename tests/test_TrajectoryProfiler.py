@@ -0,0 +1,76 @@
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+from tti_dataset_tools import ColMapper, TrajectoryProfiler, TrajectoryTransformer, TrajectoryUtils
+
+
+def getTracks() -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": np.repeat([1, 2, 3], 5),
+        "frame": np.tile(np.arange(5), 3),
+        "x": np.arange(15, dtype=float),
+        "y": np.zeros(15),
+    })
+
+
+def getAttributes(profiler: TrajectoryProfiler) -> dict:
+    attributes = {
+        (cls, name): attribute
+        for cls in profiler.getInstrumentedClasses()
+        for name, attribute in vars(cls).items()
+    }
+    attributes[(pd.DataFrame, "copy")] = pd.DataFrame.copy
+    return attributes
+
+
+def test_profiler_records_calls_and_restores_the_methods():
+    transformer = TrajectoryTransformer(ColMapper("id", "x", "y", "vx", "vy", "v", 1))
+    tracksDf = getTracks()
+    profiler = TrajectoryProfiler()
+    original = getAttributes(profiler)
+    assert not tracemalloc.is_tracing()
+
+    with profiler:
+        assert vars(TrajectoryUtils)["getTimeDerivative"] is not original[(TrajectoryUtils, "getTimeDerivative")]
+        assert pd.DataFrame.copy is not original[(pd.DataFrame, "copy")]
+        with profiler.stage("kinematics"):
+            transformer.deriveAxisVelocities(tracksDf)
+            transformer.deriveSpeed(tracksDf)
+        tracksDf.copy()
+
+    assert getAttributes(profiler) == original # the same objects, nothing left wrapped
+    assert not tracemalloc.is_tracing()
+    assert TrajectoryProfiler._active is None
+
+    calls = profiler.getCalls()
+    velocities = calls[calls["method"] == "TrajectoryTransformer.deriveAxisVelocities"].iloc[0]
+    assert velocities["stage"] == "kinematics" and velocities["depth"] == 1
+    assert velocities["rows"] == 15 and velocities["tracks"] == 3
+    assert (calls["method"] == "TrajectoryUtils.getTimeDerivative").sum() == 2 # nested calls are recorded
+    stage = calls[calls["method"] == "stage:kinematics"].iloc[0]
+    assert stage["depth"] == 0 and stage["seconds"] >= velocities["seconds"]
+
+    report = profiler.getReport()
+    assert set(report["method"]) == set(calls["method"])
+    np.testing.assert_allclose(tracksDf["v"], 1) # the wrapped methods still compute the same
+
+    TrajectoryUtils.getTimeDerivative(tracksDf["x"].to_numpy(), np.array([0]), np.array([15]), 1)
+    assert len(profiler.getCalls()) == len(calls) # nothing is recorded after exit
+
+
+def test_profiler_restores_the_methods_after_an_error():
+    profiler = TrajectoryProfiler(traceMemory=False)
+    original = getAttributes(profiler)
+
+    with pytest.raises(ZeroDivisionError):
+        with profiler:
+            with pytest.raises(RuntimeError): # one profiler at a time
+                TrajectoryProfiler().start()
+            1 / 0
+
+    assert getAttributes(profiler) == original
+    assert TrajectoryProfiler._active is None
+    with TrajectoryProfiler(traceMemory=False): # can run again
+        pass
+    assert getAttributes(profiler) == original
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tti_dataset_tools import ColMapper, TrackStore, TrajectoryTransformer
+
+
+def getTracks() -> pd.DataFrame:
+    # track 1 speeds up along x, track 2 drives west zigzagging around heading 180
+    return pd.DataFrame({
+        "id": [1, 1, 1, 1, 2, 2, 2, 2],
+        "frame": [0, 1, 2, 3, 0, 1, 2, 3],
+        "x": [0.0, 1, 3, 6, 10, 9, 8, 7],
+        "y": [0.0, 0, 0, 0, 0, 0.01, 0, 0.01],
+    })
+
+
+def getTransformer() -> TrajectoryTransformer:
+    return TrajectoryTransformer(ColMapper("id", "x", "y", "vx", "vy", "v", 1))
+
+
+h = np.degrees(np.arctan2(0.01, -1)) # just below 180
+turn = 360 - 2 * h # turning through 180 from h to -h is +turn, not -2h
+
+
+@pytest.mark.parametrize("scheme, xVel, yVel2, yawRate2", [
+    ("backward", [1, 1, 2, 3, -1, -1, -1, -1], [0.01, 0.01, -0.01, 0.01], [0, 0, turn, -turn]),
+    ("forward", [1, 2, 3, 3, -1, -1, -1, -1], [0.01, -0.01, 0.01, 0.01], [turn, -turn, 0, 0]),
+    ("central", [1, 1.5, 2.5, 3, -1, -1, -1, -1], [0.01, 0, 0, 0.01], [180 - h, (180 - h) / 2, (h - 180) / 2, h - 180]),
+])
+def test_kinematics_match_hand_computed_tracks(scheme, xVel, yVel2, yawRate2):
+    transformer = getTransformer()
+    tracksDf = getTracks()
+    transformer.deriveKinematics(tracksDf, scheme=scheme)
+
+    np.testing.assert_allclose(tracksDf["vx"], xVel) # the first row of track 2 does not difference against track 1
+    np.testing.assert_allclose(tracksDf["vy"], [0, 0, 0, 0] + yVel2, atol=1e-12)
+    np.testing.assert_allclose(tracksDf["v"], np.hypot(tracksDf["vx"], tracksDf["vy"]))
+    np.testing.assert_allclose(tracksDf["heading"], np.degrees(np.arctan2(tracksDf["vy"], tracksDf["vx"])))
+    np.testing.assert_allclose(tracksDf["yawRate"][:4], 0)
+    np.testing.assert_allclose(tracksDf["yawRate"][4:], yawRate2, atol=1e-9) # headings of track 2 are h, -h or 180, so they wrap
+
+
+def test_velocity_conventions_and_speed_column_agree():
+    transformer = getTransformer()
+    axisDf = getTracks()
+    transformer.deriveAxisVelocities(axisDf)
+    transformer.deriveSpeed(axisDf)
+    kinematicsDf = getTracks()
+    transformer.deriveKinematics(kinematicsDf)
+
+    for col in ["vx", "vy", "v"]:
+        np.testing.assert_allclose(axisDf[col], kinematicsDf[col])
+    assert "speed" not in axisDf and "speed" not in kinematicsDf
+
+    store = TrackStore(getTracks().iloc[::-1], "id", "frame")
+    transformer.deriveKinematics(store)
+    np.testing.assert_allclose(store.column("vx"), kinematicsDf.loc[store.df.index, "vx"])
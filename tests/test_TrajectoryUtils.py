@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from shapely.affinity import rotate
+from shapely.geometry import LineString, Point, box
+from tti_dataset_tools import TrajectoryUtils
+
+
+def getRandomWalks(numTracks: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 200, numTracks)
+    return pd.DataFrame({
+        "id": np.repeat(np.arange(numTracks), sizes),
+        "frame": np.concatenate([np.arange(size) for size in sizes]),
+        "x": np.cumsum(rng.normal(0, 0.3, sizes.sum())),
+        "y": np.cumsum(rng.normal(0.1, 0.3, sizes.sum())),
+    })
+
+
+def getBaselineSpline(trajectoryDf: pd.DataFrame, xCol, yCol, minLen) -> LineString:
+    """the row by row dfToSplines the vectorized one replaced"""
+    splinePoints = []
+    prev = None
+    last = None
+    for idx, row in trajectoryDf.iterrows():
+        last = (row[xCol], row[yCol])
+        if prev is None:
+            prev = last
+            continue
+        distance = np.sqrt((last[0] - prev[0]) ** 2 + (last[1] - prev[1]) ** 2)
+        if distance >= minLen:
+            splinePoints.append(prev)
+            prev = last
+    splinePoints.append(prev)
+    splinePoints.append(last)
+    return LineString(splinePoints)
+
+
+def test_splines_equal_the_row_by_row_baseline():
+    tracksDf = getRandomWalks(30, 0)
+    for minLen in [0.1, 0.5, 3]:
+        splines = TrajectoryUtils.dfToSplinesForAll(tracksDf, "id", "x", "y", minLen)
+        for trackId, trackDf in tracksDf.groupby("id"):
+            expected = np.asarray(getBaselineSpline(trackDf, "x", "y", minLen).coords)
+            np.testing.assert_array_equal(np.asarray(TrajectoryUtils.dfToSplines(trackDf, "x", "y", minLen).coords), expected)
+            np.testing.assert_array_equal(np.asarray(splines[trackId].coords), expected)
+
+
+def test_resample_integer_ratio_keeps_every_nth_frame_of_unsorted_tracks():
+    tracksDf = pd.DataFrame({"id": [1, 1, 1, 1, 2, 2, 2], "frame": [3, 2, 1, 0, 12, 10, 11], "x": [3.0, 2, 1, 0, 2, 0, 1]})
+    resampledDf = TrajectoryUtils.resampleTracks(tracksDf, "id", 30, 15)
+    assert resampledDf["id"].tolist() == [1, 1, 2, 2]
+    assert resampledDf["frame"].tolist() == [0, 2, 10, 12]
+    assert resampledDf["x"].tolist() == [0, 2, 0, 2]
+    assert resampledDf.dtypes.equals(tracksDf.dtypes)
+
+
+def test_resample_interpolates_in_time_across_frame_gaps():
+    tracksDf = pd.DataFrame({
+        "id": [7] * 6,
+        "frame": [0, 1, 2, 4, 5, 6],
+        "x": [0.0, 1, 2, 4, 5, 6],
+        "f32": np.array([0, 10, 20, 40, 50, 60], dtype=np.float32),
+        "n": np.arange(6, dtype=np.int32),
+        "class": ["pedestrian"] * 6,
+    }).sample(frac=1, random_state=0)
+
+    resampledDf = TrajectoryUtils.resampleTracks(tracksDf, "id", 30, 20)
+    np.testing.assert_allclose(resampledDf["frame"], [0, 1.5, 3, 4.5, 6])
+    np.testing.assert_allclose(resampledDf["x"], resampledDf["frame"]) # x is the frame, so every sample lies on the line
+    np.testing.assert_allclose(resampledDf["f32"], [0, 15, 30, 45, 60])
+    assert resampledDf["n"].tolist() == [0, 1, 2, 3, 5] # the previous row
+    assert resampledDf["f32"].dtype == np.float32
+    assert resampledDf["n"].dtype == np.int32
+    assert resampledDf["class"].tolist() == ["pedestrian"] * 5
+
+
+def test_y_crossings_are_interpolated_between_samples():
+    tracksDf = pd.DataFrame({
+        "id": [5, 5, 5, 5, 6, 6],
+        "frame": [13, 11, 10, 12, 1, 0],
+        "x": [5.0, 1, 0, 3, 2, 2],
+        "y": [0.4, 0.8, 0, 1.6, 2.0, 0.5],
+    })
+    crossings = TrajectoryUtils.getYCrossingsForAll(tracksDf, "id", "x", "y", [1.0], fps=10)
+
+    assert crossings["id"].tolist() == [5, 5, 6]
+    # up between (frame 11, y 0.8) and (12, 1.6), down between (12, 1.6) and (13, 0.4), no sample at y = 1
+    np.testing.assert_allclose(crossings["x"], [1.5, 4, 2])
+    np.testing.assert_allclose(crossings["frame"], [11.25, 12.5, 1 / 3])
+    np.testing.assert_allclose(crossings["time"], crossings["frame"] / 10)
+    assert crossings["direction"].tolist() == [1, -1, 1]
+
+    extremes = TrajectoryUtils.getExtremeXAtYCrossingsForAll(tracksDf, "id", "x", "y", [1.0, 3.0])
+    np.testing.assert_allclose(extremes[1.0], [4, 2])
+    assert extremes[3.0].isna().all()
+
+
+def getBaselineClip(pedDf: pd.DataFrame, rect, withSplits: bool):
+    """the row by row clipByRect and clipByRectWithSplits the array based ones replaced"""
+    entryFrame, exitFrame, exitCount = -np.inf, np.inf, 0
+    brokenTracks = []
+    for idx, row in pedDf.iterrows():
+        insideRect = rect.contains(Point(row["x"], row["y"]))
+        if entryFrame == -np.inf:
+            if insideRect:
+                entryFrame = row["frame"]
+                continue
+        if entryFrame >= 0:
+            if withSplits:
+                if not insideRect:
+                    brokenTracks.append(pedDf[(pedDf["frame"] >= entryFrame) & (pedDf["frame"] <= row["frame"])])
+                    entryFrame, exitFrame = -np.inf, np.inf
+            elif not insideRect:
+                if exitFrame == np.inf:
+                    exitFrame = row["frame"]
+                    exitCount += 1
+            else:
+                exitFrame = np.inf
+    if entryFrame >= 0 and exitFrame == np.inf:
+        exitFrame = row["frame"]
+        exitCount += 1
+        if withSplits:
+            brokenTracks.append(pedDf[(pedDf["frame"] >= entryFrame) & (pedDf["frame"] <= exitFrame)])
+    if withSplits:
+        return brokenTracks
+    if entryFrame == -np.inf:
+        return None, 0
+    return pedDf[(pedDf["frame"] >= entryFrame) & (pedDf["frame"] <= exitFrame)], exitCount
+
+
+def test_clipping_equals_the_row_by_row_baseline():
+    tracksDf = getRandomWalks(40, 1).rename(columns={"id": "uniqueTrackId"})
+    tracksDf["x"] = tracksDf["x"] % 12 - 6 # wander in and out of the scene
+    tracksDf["y"] = tracksDf["y"] % 12 - 6
+    rect = rotate(box(-4, -3, 4, 3), 30)
+
+    clippedDf = TrajectoryUtils.clipAllByRect(tracksDf, "uniqueTrackId", "x", "y", rect)
+    splitDf = TrajectoryUtils.clipAllByRect(tracksDf, "uniqueTrackId", "x", "y", rect, withSplits=True)
+    numSplits = 0
+    for trackId, trackDf in tracksDf.groupby("uniqueTrackId"):
+        expectedDf, expectedCount = getBaselineClip(trackDf, rect, withSplits=False)
+        df, exitCount = TrajectoryUtils.clipByRect(trackDf, "x", "y", "frame", rect)
+        if expectedDf is None:
+            assert df is None and trackId not in clippedDf["uniqueTrackId"].values
+            continue
+        pd.testing.assert_frame_equal(df, expectedDf)
+        assert exitCount == expectedCount
+        trackClippedDf = clippedDf[clippedDf["uniqueTrackId"] == trackId]
+        pd.testing.assert_frame_equal(trackClippedDf[tracksDf.columns], expectedDf)
+        assert (trackClippedDf["exitCount"] == expectedCount).all()
+
+        expectedSplits = getBaselineClip(trackDf, rect, withSplits=True)
+        splits = TrajectoryUtils.clipByRectWithSplits(trackDf, "x", "y", "frame", rect)
+        assert len(splits) == len(expectedSplits)
+        for segmentId, (split, expectedSplit) in enumerate(zip(splits, expectedSplits)):
+            pd.testing.assert_frame_equal(split, expectedSplit)
+            segmentDf = splitDf[(splitDf["uniqueTrackId"] == trackId) & (splitDf["segmentId"] == segmentId)]
+            pd.testing.assert_frame_equal(segmentDf[tracksDf.columns], expectedSplit)
+        numSplits += len(splits)
+    assert numSplits > 40 # tracks enter more than once